@@ -0,0 +1,273 @@
+"""
+Server-side aggregation and downsampling of MongoDB history collections.
+
+Two methods are offered for charting long time ranges:
+
+- ``bucket``: an aggregation pipeline groups samples into fixed time buckets and
+  returns min/max/avg/last/count per bucket, so only one row per bucket leaves MongoDB.
+- ``lttb``: Largest-Triangle-Three-Buckets downsampling to a target point count,
+  which keeps the visual shape (peaks and dips) of the raw series.
+
+Query parameters:
+    from, to: Time window, epoch seconds or ISO-8601 (default: the last 24 hours).
+    interval: Bucket size as seconds or with a unit ("30s", "5m", "1h", "1d").
+    points: Target point count, used when no interval is given (default 1000).
+    method: "bucket" (default) or "lttb".
+"""
+import os
+import time
+from dotenv import load_dotenv
+from pymongo import ASCENDING
+
+from .history import HistoryQueryError, parse_time
+from .rollups import ROLLUPS_ENABLED, select_resolution, query_rollups, rollup_collection_name
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Point count returned when neither interval nor points is given
+DEFAULT_POINTS = 1000
+# Largest point count a client may request
+MAX_POINTS = int(os.getenv('AGGREGATION_MAX_POINTS', 10000))
+# Window used when no "from" is given (seconds)
+DEFAULT_WINDOW = 24 * 3600
+# Largest number of raw samples LTTB reads; longer series are pre-averaged in MongoDB first
+LTTB_MAX_SOURCE_POINTS = int(os.getenv('LTTB_MAX_SOURCE_POINTS', 200000))
+
+METHODS = ("bucket", "lttb")
+INTERVAL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_interval(value):
+    """
+    Parse a bucket interval.
+
+    Args:
+        value (str): Seconds ("300") or a number with a unit ("5m").
+
+    Returns:
+        float: Interval in seconds.
+
+    Raises:
+        HistoryQueryError: If the interval is invalid or not positive.
+    """
+    unit = INTERVAL_UNITS.get(value[-1:].lower())
+    number = value[:-1] if unit else value
+    try:
+        seconds = float(number) * (unit or 1)
+    except ValueError:
+        raise HistoryQueryError(f"Invalid interval: {value}")
+    if seconds <= 0:
+        raise HistoryQueryError("'interval' must be positive.")
+    return seconds
+
+
+def parse_aggregation_params(params):
+    """
+    Validate the aggregation query parameters of a request.
+
+    Args:
+        params (QueryDict): request.GET or request.query_params.
+
+    Returns:
+        dict: "start", "end", "interval", "points" and "method".
+
+    Raises:
+        HistoryQueryError: If a parameter is invalid.
+    """
+    end = parse_time(params["to"]) if params.get("to") else time.time()
+    start = parse_time(params["from"]) if params.get("from") else end - DEFAULT_WINDOW
+    if start >= end:
+        raise HistoryQueryError("'from' must be before 'to'.")
+
+    method = params.get("method", "bucket")
+    if method not in METHODS:
+        raise HistoryQueryError(f"'method' must be one of: {', '.join(METHODS)}.")
+
+    try:
+        points = int(params.get("points", DEFAULT_POINTS))
+    except ValueError:
+        raise HistoryQueryError("'points' must be an integer.")
+    if not 3 <= points <= MAX_POINTS:
+        raise HistoryQueryError(f"'points' must be between 3 and {MAX_POINTS}.")
+
+    if params.get("interval"):
+        interval = parse_interval(params["interval"])
+        if (end - start) / interval > MAX_POINTS:
+            raise HistoryQueryError(f"The interval yields more than {MAX_POINTS} buckets.")
+    else:
+        interval = (end - start) / points
+
+    return {"start": start, "end": end, "interval": interval, "points": points, "method": method}
+
+
+def bucket_pipeline(query, value_field, start, end, interval):
+    """
+    Build the aggregation pipeline grouping samples into fixed time buckets.
+
+    Buckets are aligned to multiples of the interval since the epoch, so the same
+    bucket boundaries are returned for overlapping windows.
+
+    Args:
+        query (dict): Base filter, e.g. {"device_id": 1}.
+        value_field (str): Numeric field to aggregate.
+        start (float): Inclusive lower time bound (epoch seconds).
+        end (float): Exclusive upper time bound.
+        interval (float): Bucket size in seconds.
+
+    Returns:
+        list: Pipeline stages.
+    """
+    value = f"${value_field}"
+    return [
+        {"$match": dict(query, timestamp={"$gte": start, "$lt": end})},
+        # Index-ordered input, so $last is the latest sample of each bucket
+        {"$sort": {"timestamp": ASCENDING}},
+        {"$group": {
+            "_id": {"$subtract": ["$timestamp", {"$mod": ["$timestamp", interval]}]},
+            "min": {"$min": value},
+            "max": {"$max": value},
+            "avg": {"$avg": value},
+            "last": {"$last": value},
+            "count": {"$sum": 1},
+        }},
+        {"$sort": {"_id": ASCENDING}},
+        {"$project": {"_id": 0, "t": "$_id", "min": 1, "max": 1, "avg": 1, "last": 1, "count": 1}},
+    ]
+
+
+def aggregate_buckets(collection, query, value_field, params):
+    """
+    Return min/max/avg/last/count per time bucket.
+
+    Args:
+        collection (Collection): History collection.
+        query (dict): Base filter.
+        value_field (str): Numeric field to aggregate.
+        params (dict): Result of parse_aggregation_params().
+
+    Returns:
+        list: One dict per non-empty bucket, with its start time as "t".
+    """
+    pipeline = bucket_pipeline(query, value_field, params["start"], params["end"], params["interval"])
+    return list(collection.aggregate(pipeline, allowDiskUse=True))
+
+
+def lttb(points, threshold):
+    """
+    Downsample a series with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are kept; from each of the threshold - 2 buckets in
+    between, the point forming the largest triangle with the previously kept point
+    and the average of the next bucket is kept.
+
+    Args:
+        points (list): (t, value) pairs sorted by t.
+        threshold (int): Number of points to return.
+
+    Returns:
+        list: At most `threshold` (t, value) pairs.
+    """
+    length = len(points)
+    if threshold >= length or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (length - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, length)
+        if next_start >= next_end:
+            next_start, next_end = length - 1, length
+        count = next_end - next_start
+        avg_t = sum(points[i][0] for i in range(next_start, next_end)) / count
+        avg_v = sum(points[i][1] for i in range(next_start, next_end)) / count
+
+        prev_t, prev_v = points[previous]
+        best_area = -1.0
+        best = start
+        for i in range(start, end):
+            t, v = points[i]
+            # Twice the triangle area; the factor does not change the maximum
+            area = abs((prev_t - avg_t) * (v - prev_v) - (prev_t - t) * (avg_v - prev_v))
+            if area > best_area:
+                best_area = area
+                best = i
+        sampled.append(points[best])
+        previous = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def downsample_lttb(collection, query, value_field, params):
+    """
+    Return the series in the window downsampled to params["points"] with LTTB.
+
+    Up to LTTB_MAX_SOURCE_POINTS raw samples are read with a projection. Longer
+    series are first averaged in MongoDB into that many buckets, so the amount of
+    data read through Django stays bounded for any window.
+
+    Args:
+        collection (Collection): History collection.
+        query (dict): Base filter.
+        value_field (str): Numeric field to downsample.
+        params (dict): Result of parse_aggregation_params().
+
+    Returns:
+        list: Dicts with "t" and "value".
+    """
+    match = dict(query, timestamp={"$gte": params["start"], "$lt": params["end"]})
+    cursor = collection.find(match, {"_id": 0, "timestamp": 1, value_field: 1}) \
+        .sort("timestamp", ASCENDING).limit(LTTB_MAX_SOURCE_POINTS + 1).batch_size(10000)
+    series = [(doc["timestamp"], doc[value_field]) for doc in cursor if doc.get(value_field) is not None]
+
+    if len(series) > LTTB_MAX_SOURCE_POINTS:
+        interval = (params["end"] - params["start"]) / LTTB_MAX_SOURCE_POINTS
+        buckets = aggregate_buckets(collection, query, value_field, dict(params, interval=interval))
+        series = [(bucket["t"], bucket["avg"]) for bucket in buckets]
+
+    return [{"t": t, "value": value} for t, value in lttb(series, params["points"])]
+
+
+def aggregate(collection, query, value_field, params, series=None):
+    """
+    Run the aggregation method selected by params["method"].
+
+    Bucket queries of a series with an interval of at least one minute are routed
+    to the coarsest fitting rollup collection instead of the raw samples.
+
+    Args:
+        collection (Collection): History collection with the raw samples.
+        query (dict): Base filter.
+        value_field (str): Numeric field to aggregate.
+        params (dict): Result of parse_aggregation_params().
+        series (str): Rollup series of the query (rollups.series_key()), or None.
+
+    Returns:
+        dict: The window, interval, method, data source and the resulting points.
+    """
+    source = "raw"
+    if params["method"] == "lttb":
+        points = downsample_lttb(collection, query, value_field, params)
+    else:
+        resolution = select_resolution(params["interval"]) if series and ROLLUPS_ENABLED else None
+        if resolution:
+            source = rollup_collection_name(resolution)
+            points = query_rollups(series, params["start"], params["end"], params["interval"])
+        else:
+            points = aggregate_buckets(collection, query, value_field, params)
+    return {
+        "from": params["start"],
+        "to": params["end"],
+        "interval": params["interval"],
+        "method": params["method"],
+        "source": source,
+        "points": points,
+    }
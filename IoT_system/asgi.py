@@ -14,4 +14,55 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'IoT_system.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from IoT_system.mongo_async import close_async_client, register_server_loop  # noqa: E402
+
+# Host the asyncio MQTT subscriber on the server event loop instead of a thread per worker
+async_subscriber_enabled = os.getenv('MQTT_ASYNC_SUBSCRIBER') == 'True'
+# Create missing MongoDB indexes (IoT_system/mongo_indexes.py) on startup
+ensure_indexes_enabled = os.getenv('MONGO_ENSURE_INDEXES') == 'True'
+# Run the throttled retention compactor (IoT_system/retention.py) in the background
+retention_compactor_enabled = os.getenv('RETENTION_COMPACTOR') == 'True'
+
+
+async def lifespan(receive, send):
+    """
+    Handle ASGI lifespan events: ensure MongoDB indexes, start the retention compactor,
+    start and stop the hosted async MQTT subscriber and close the Motor client of the async views.
+    """
+    import asyncio
+    from mqtt_clients.async_subscriber import start_hosted_subscriber, stop_hosted_subscriber
+    from IoT_system.mongo_indexes import ensure_indexes
+    from IoT_system.retention import get_compactor
+
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                if ensure_indexes_enabled:
+                    await asyncio.get_running_loop().run_in_executor(None, ensure_indexes)
+                if retention_compactor_enabled:
+                    get_compactor().start()
+                if async_subscriber_enabled:
+                    await start_hosted_subscriber()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await stop_hosted_subscriber()
+            close_async_client()
+            if retention_compactor_enabled:
+                await asyncio.get_running_loop().run_in_executor(None, get_compactor().stop)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    # Async views may create their Motor client on this long-lived loop
+    register_server_loop()
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
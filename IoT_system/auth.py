@@ -0,0 +1,37 @@
+import functools
+from django.http import JsonResponse
+from rest_framework.authtoken.models import Token
+
+
+async def is_authenticated(request):
+    """
+    Authenticate an async view request by session or "Authorization: Token <key>",
+    like the DRF authentication classes in settings.
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        return True
+    keyword, _, key = request.headers.get("Authorization", "").partition(" ")
+    if keyword == "Token" and key:
+        return await Token.objects.filter(key=key, user__is_active=True).aexists()
+    return False
+
+
+def async_api_view(methods=("GET",)):
+    """
+    Decorate an async Django view like DRF's @api_view with IsAuthenticated, which does
+    not support async views: other methods get 405 and anonymous requests 401.
+
+    Args:
+        methods (tuple): Allowed HTTP methods.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({"error": "Method not allowed."}, status=405)
+            if not await is_authenticated(request):
+                return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
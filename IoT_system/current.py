@@ -0,0 +1,322 @@
+"""
+Last-value cache: the current value, timestamp and quality of every device and asset.
+
+Writers call ``record_value()`` right after storing a sample. The in-process
+cache is split into LAST_VALUE_SHARDS dicts with one lock each, so writers of
+different series rarely contend and readers copy one shard at a time.
+
+With LAST_VALUE_SHM=True, every update is also written to a shared-memory table,
+so all web workers on the host read the values written by any of them. The table
+is an open-addressing hash table of fixed 72-byte slots (slot = crc32(key) mod
+slots, linear probing). Each slot is guarded by a sequence counter (seqlock):
+the writer makes it odd, writes the fields and makes it even again, and readers
+retry a slot whose counter was odd or changed while they read it. Readers never
+lock; claiming a free slot for a new series takes a file lock, updates do not.
+Each series must be written by one process at a time, as the pollers are.
+
+The segment outlives the processes using it (it is not unlinked on exit, since
+other workers may still read it) and is reused on restart.
+
+Quality is "good", "uncertain" or "bad" as reported by the writer, and "stale"
+when the value is older than LAST_VALUE_STALE_AFTER seconds.
+"""
+import os
+import time
+import zlib
+import fcntl
+import struct
+import logging
+import tempfile
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from dotenv import load_dotenv
+
+from .rollups import series_key
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Number of independently locked shards of the in-process cache
+LAST_VALUE_SHARDS = int(os.getenv('LAST_VALUE_SHARDS', 16))
+# Seconds after which a value is reported as stale
+LAST_VALUE_STALE_AFTER = float(os.getenv('LAST_VALUE_STALE_AFTER', 60))
+# Mirror the cache to a shared-memory table readable by all workers on the host
+LAST_VALUE_SHM = os.getenv('LAST_VALUE_SHM') == 'True'
+# Name and capacity (number of series) of the shared-memory table
+LAST_VALUE_SHM_NAME = os.getenv('LAST_VALUE_SHM_NAME', 'iot_last_values')
+LAST_VALUE_SHM_SLOTS = int(os.getenv('LAST_VALUE_SHM_SLOTS', 16384))
+
+QUALITIES = ("good", "uncertain", "bad")
+
+# Shared-memory layout: header (magic, slot count), then the slots
+_HEADER = struct.Struct("<8sI4x")
+_MAGIC = b"IOTLVC01"
+# Slot: sequence, quality code, key length, value, timestamp, key (UTF-8)
+_SLOT = struct.Struct("<IBB2xdd48s")
+_SEQUENCE = struct.Struct("<I")
+MAX_KEY_LENGTH = 48
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def _split_key(key):
+    source, _, name = key.partition(":")
+    return source, name
+
+
+def _quality(value):
+    """
+    Map a writer-reported quality to one of QUALITIES; unknown ones are "uncertain".
+    """
+    return value if value in QUALITIES else "uncertain"
+
+
+class SharedValueTable:
+    """
+    Seqlock-protected hash table of last values in a named shared-memory segment.
+    """
+
+    def __init__(self, name=LAST_VALUE_SHM_NAME, slots=LAST_VALUE_SHM_SLOTS):
+        size = _HEADER.size + slots * _SLOT.size
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            _HEADER.pack_into(self.shm.buf, 0, _MAGIC, slots)
+        except FileExistsError:
+            self.shm = shared_memory.SharedMemory(name=name)
+            magic, slots = _HEADER.unpack_from(self.shm.buf, 0)
+            if magic != _MAGIC:
+                raise RuntimeError(f"Shared memory segment {name} is not a last-value table")
+        # The segment is shared by all workers, none of them may unlink it on exit
+        resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.slots = slots
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        # key -> slot index, found once per process
+        self._index = {}
+
+    def _offset(self, slot):
+        return _HEADER.size + slot * _SLOT.size
+
+    def _find(self, key, encoded, claim):
+        """
+        Return the slot of a key, claiming a free one under the file lock if allowed.
+        """
+        slot = self._index.get(key)
+        if slot is not None:
+            return slot
+        start = zlib.crc32(encoded) % self.slots
+        for probe in range(self.slots):
+            slot = (start + probe) % self.slots
+            _, _, length, _, _, stored = _SLOT.unpack_from(self.shm.buf, self._offset(slot))
+            if length == 0:
+                if not claim:
+                    return None
+                slot = self._claim(encoded, start)
+                if slot is not None:
+                    self._index[key] = slot
+                return slot
+            if stored[:length] == encoded:
+                self._index[key] = slot
+                return slot
+        return None
+
+    def _claim(self, encoded, start):
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Probe again under the lock, another process may have claimed a slot meanwhile
+            for probe in range(self.slots):
+                slot = (start + probe) % self.slots
+                offset = self._offset(slot)
+                sequence, _, length, _, _, stored = _SLOT.unpack_from(self.shm.buf, offset)
+                if length == 0:
+                    _SLOT.pack_into(self.shm.buf, offset, sequence + 2, 0, len(encoded), float("nan"), 0.0, encoded)
+                    return slot
+                if stored[:length] == encoded:
+                    return slot
+        return None
+
+    def write(self, key, value, timestamp, quality):
+        """
+        Write the last value of a key. Keys longer than MAX_KEY_LENGTH bytes or
+        beyond the table capacity are skipped.
+
+        Returns:
+            bool: True if the value was written.
+        """
+        encoded = key.encode()
+        if len(encoded) > MAX_KEY_LENGTH:
+            return False
+        slot = self._find(key, encoded, claim=True)
+        if slot is None:
+            return False
+        offset = self._offset(slot)
+        buf = self.shm.buf
+        sequence = _SEQUENCE.unpack_from(buf, offset)[0]
+        # Odd sequence: readers retry until the write is complete
+        _SEQUENCE.pack_into(buf, offset, (sequence + 1) & 0xFFFFFFFF)
+        _SLOT.pack_into(buf, offset, (sequence + 1) & 0xFFFFFFFF, QUALITIES.index(quality), len(encoded),
+                        value, timestamp, encoded)
+        _SEQUENCE.pack_into(buf, offset, (sequence + 2) & 0xFFFFFFFF)
+        return True
+
+    def _read_slot(self, offset, retries=1000):
+        buf = self.shm.buf
+        for attempt in range(retries):
+            fields = _SLOT.unpack_from(buf, offset)
+            if fields[0] % 2 == 0 and _SEQUENCE.unpack_from(buf, offset)[0] == fields[0]:
+                return fields
+            if attempt >= 10:
+                # Let the writer finish
+                time.sleep(0)
+        return None
+
+    def read_all(self):
+        """
+        Return a consistent copy of all slots in use.
+
+        Returns:
+            dict: Key -> (value, timestamp, quality).
+        """
+        buf = self.shm.buf
+        # One copy of the whole table, then every slot is validated against its live sequence
+        snapshot = bytes(buf[_HEADER.size:_HEADER.size + self.slots * _SLOT.size])
+        values = {}
+        for slot, fields in enumerate(_SLOT.iter_unpack(snapshot)):
+            sequence, quality, length = fields[0], fields[1], fields[2]
+            if length == 0:
+                continue
+            offset = self._offset(slot)
+            if sequence % 2 or _SEQUENCE.unpack_from(buf, offset)[0] != sequence:
+                fields = self._read_slot(offset)
+                if fields is None:
+                    continue
+                sequence, quality, length = fields[0], fields[1], fields[2]
+            values[fields[5][:length].decode()] = (fields[3], fields[4], QUALITIES[quality])
+        return values
+
+    def close(self):
+        self.shm.close()
+
+
+class LastValueCache:
+    """
+    Sharded in-process cache of last values, optionally mirrored to a SharedValueTable.
+    """
+
+    def __init__(self, shards=LAST_VALUE_SHARDS, shared=None):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self.shared = shared
+        self.metrics = {"updates": 0, "shared_write_errors": 0}
+
+    def update(self, key, value, timestamp, quality="good"):
+        """
+        Set the last value of a series; older timestamps than the cached one are ignored.
+
+        Args:
+            key (str): Series key from rollups.series_key().
+            value (float): Value, or None to keep the previous value and only update the quality.
+            timestamp (float): Sample time, epoch seconds.
+            quality (str): One of QUALITIES.
+        """
+        values, lock = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            current = values.get(key)
+            if current is not None and timestamp < current[1]:
+                return
+            if value is None:
+                value = current[0] if current is not None else float("nan")
+            values[key] = (value, timestamp, quality)
+            self.metrics["updates"] += 1
+        if self.shared is not None:
+            try:
+                if not self.shared.write(key, value, timestamp, quality):
+                    self.metrics["shared_write_errors"] += 1
+            except Exception:
+                self.metrics["shared_write_errors"] += 1
+
+    def snapshot(self):
+        """
+        Return all last values: from shared memory if mirrored, else from this process.
+
+        Returns:
+            dict: Key -> (value, timestamp, quality).
+        """
+        if self.shared is not None:
+            return self.shared.read_all()
+        values = {}
+        for shard, lock in self._shards:
+            with lock:
+                values.update(shard)
+        return values
+
+
+def get_last_value_cache():
+    """
+    Return the process-wide last-value cache, created on first use and again after fork().
+
+    Returns:
+        LastValueCache: The cache.
+    """
+    global _cache, _cache_pid
+    if _cache is not None and _cache_pid == os.getpid():
+        return _cache
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            _cache, _cache_pid = LastValueCache(shared=SharedValueTable() if LAST_VALUE_SHM else None), os.getpid()
+    return _cache
+
+
+def record_value(source, key, value, timestamp, quality="good"):
+    """
+    Update the last value of a device or asset. Never raises, so it is safe in writer loops.
+
+    Args:
+        source (str): "modbus", "mqtt" or "telemetry".
+        key: Device primary key or symbol.
+        value (float): Sample value; None marks a failed read and keeps the previous value.
+        timestamp (float): Sample time, epoch seconds.
+        quality (str): "good", "uncertain" or "bad"; other values are stored as "uncertain".
+    """
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        return
+    try:
+        get_last_value_cache().update(series_key(source, key), None if value is None else float(value),
+                                      timestamp, _quality(quality))
+    except Exception as e:
+        logger.error("Failed to record last value: %s", e)
+
+
+def current_values(source=None, keys=None, now=None):
+    """
+    Return the current values of all series, optionally filtered.
+
+    Args:
+        source (str): Only series of this source, or None for all.
+        keys (set): Only these keys of the source (as strings), or None for all.
+        now (float): Reference time for staleness, defaults to the current time.
+
+    Returns:
+        list: Dicts with "source", "key", "value", "timestamp" and "quality".
+    """
+    now = time.time() if now is None else now
+    result = []
+    for series, (value, timestamp, quality) in get_last_value_cache().snapshot().items():
+        series_source, name = _split_key(series)
+        if source is not None and series_source != source:
+            continue
+        if keys is not None and name not in keys:
+            continue
+        if quality == "good" and now - timestamp > LAST_VALUE_STALE_AFTER:
+            quality = "stale"
+        result.append({
+            "source": series_source,
+            "key": name,
+            "value": None if value != value else value,
+            "timestamp": timestamp,
+            "quality": quality,
+        })
+    return result
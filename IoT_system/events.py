@@ -0,0 +1,234 @@
+"""
+Server-sent events: push of device status and new readings to the dashboards.
+
+Writers (Modbus pollers, the MQTT publisher, the control views) call
+``publish_event()`` from any thread. The process-wide ``EventBroker`` numbers each
+event, serializes it once, keeps the last EVENTS_HISTORY events for replay and
+hands it to every subscribed stream: one ``call_soon_threadsafe`` per event loop,
+which then fans out to the queues of all subscribers on that loop.
+
+``event_stream()`` is the body of the ``api/events/`` endpoint on the ASGI
+application. Event IDs are "<epoch>-<sequence>", where the epoch identifies the
+broker instance. A reconnecting EventSource sends the last ID it received
+(Last-Event-ID), and the stream first replays the missed events of its channels.
+If they are no longer in the history, were sent by another process or the client
+fell behind by more than EVENTS_QUEUE_SIZE events, a "reset" event asks the page
+to reload its state with regular requests instead.
+
+Channels and events:
+    modbus: reading, device_status, server_status
+    mqtt: price, publisher_status, subscriber_status
+"""
+import os
+import uuid
+import asyncio
+import logging
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+from .renderers import dumps
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Server push can be switched off per deployment
+EVENTS_ENABLED = os.getenv('EVENTS_ENABLED', 'True') == 'True'
+# Events kept for replay to reconnecting clients
+EVENTS_HISTORY = int(os.getenv('EVENTS_HISTORY', 1000))
+# Events buffered per client before it is considered lagging and reset
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 500))
+# Seconds between keep-alive comments on idle streams
+EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', 15))
+# Reconnection delay (milliseconds) suggested to EventSource clients
+EVENTS_RETRY_MS = 3000
+
+CHANNELS = ("modbus", "mqtt")
+
+
+class Subscription:
+    """One connected stream: its channels, event queue and lag flag."""
+
+    def __init__(self, channels, loop, queue_size):
+        self.channels = channels
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.lagging = False
+        # Sequence at subscription time, the ID of an initial reset event
+        self.sequence = 0
+
+
+class EventBroker:
+    """
+    Numbers, records and fans out events to the subscribed streams.
+    """
+
+    def __init__(self, history=EVENTS_HISTORY, queue_size=EVENTS_QUEUE_SIZE):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.queue_size = queue_size
+        self._sequence = 0
+        # (sequence, channel, event name, serialized data), oldest first
+        self._history = deque(maxlen=history)
+        # event loop -> subscriptions on that loop
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self.metrics = {"published": 0, "lagging": 0}
+
+    def event_id(self, sequence):
+        return f"{self.epoch}-{sequence}"
+
+    def publish(self, channel, event, data):
+        """
+        Publish an event; safe to call from any thread.
+
+        Args:
+            channel (str): One of CHANNELS.
+            event (str): Event name, e.g. "reading".
+            data: JSON-serializable payload.
+        """
+        payload = dumps(data).decode()
+        with self._lock:
+            self._sequence += 1
+            item = (self._sequence, channel, event, payload)
+            self._history.append(item)
+            self.metrics["published"] += 1
+            targets = [(loop, list(subscriptions)) for loop, subscriptions in self._subscribers.items()]
+        for loop, subscriptions in targets:
+            try:
+                loop.call_soon_threadsafe(self._deliver, subscriptions, item)
+            except RuntimeError:
+                # The loop was closed without unsubscribing its streams
+                with self._lock:
+                    self._subscribers.pop(loop, None)
+
+    def _deliver(self, subscriptions, item):
+        # Runs on the subscribers' event loop
+        for subscription in subscriptions:
+            if item[1] not in subscription.channels or subscription.lagging:
+                continue
+            try:
+                subscription.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                subscription.lagging = True
+                self.metrics["lagging"] += 1
+                # Wake the stream so it sends the reset
+                subscription.queue.get_nowait()
+                subscription.queue.put_nowait(item)
+
+    def subscribe(self, channels, last_event_id=None):
+        """
+        Register a stream on the running event loop.
+
+        Args:
+            channels (set): Channels to receive.
+            last_event_id (str): Last-Event-ID sent by a reconnecting client, or None.
+
+        Returns:
+            tuple: (Subscription, missed events to replay, or None if the client must reset).
+        """
+        subscription = Subscription(channels, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(subscription.loop, set()).add(subscription)
+            subscription.sequence = self._sequence
+            # Computed under the lock, so no event is both replayed and queued, or lost in between
+            backlog = [] if last_event_id is None else self._missed(last_event_id)
+        if backlog:
+            backlog = [item for item in backlog if item[1] in channels]
+        return subscription, backlog
+
+    def _missed(self, last_event_id):
+        epoch, _, sequence = last_event_id.partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        if sequence >= self._sequence:
+            return []
+        if not self._history or self._history[0][0] > sequence + 1:
+            return None
+        return [item for item in self._history if item[0] > sequence]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.loop)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.loop]
+
+    def stats(self):
+        with self._lock:
+            clients = sum(len(subscriptions) for subscriptions in self._subscribers.values())
+            return dict(self.metrics, clients=clients, sequence=self._sequence)
+
+
+_broker = EventBroker()
+
+
+def get_broker():
+    """
+    Return the process-wide event broker.
+    """
+    return _broker
+
+
+def publish_event(channel, event, data):
+    """
+    Publish an event to the dashboards, if enabled. Never raises, so it is safe in writer loops.
+
+    Args:
+        channel (str): "modbus" or "mqtt".
+        event (str): Event name.
+        data: JSON-serializable payload.
+    """
+    if not EVENTS_ENABLED:
+        return
+    try:
+        _broker.publish(channel, event, data)
+    except Exception as e:
+        logger.error("Failed to publish %s event: %s", event, e)
+
+
+def format_event(event_id, event, payload):
+    """
+    Format one event in the text/event-stream format.
+    """
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+
+async def event_stream(channels, last_event_id=None):
+    """
+    Yield the text/event-stream of a client until it disconnects.
+
+    Args:
+        channels (set): Channels to receive.
+        last_event_id (str): Last-Event-ID of a reconnecting client, or None.
+    """
+    broker = _broker
+    subscription, backlog = broker.subscribe(channels, last_event_id)
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        if backlog is None:
+            yield format_event(broker.event_id(subscription.sequence), "reset", "{}")
+        else:
+            for sequence, _, event, payload in backlog:
+                yield format_event(broker.event_id(sequence), event, payload)
+
+        while True:
+            try:
+                sequence, _, event, payload = await asyncio.wait_for(subscription.queue.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if subscription.lagging:
+                # Too far behind: drop the queued events and let the page reload its state
+                while not subscription.queue.empty():
+                    sequence = subscription.queue.get_nowait()[0]
+                subscription.lagging = False
+                yield format_event(broker.event_id(sequence), "reset", "{}")
+                continue
+            yield format_event(broker.event_id(sequence), event, payload)
+    finally:
+        broker.unsubscribe(subscription)
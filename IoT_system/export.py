@@ -0,0 +1,279 @@
+"""
+Streaming bulk export of MongoDB history collections.
+
+An export reads a time window oldest first through one cursor in batches of
+EXPORT_BATCH_SIZE and encodes each batch as soon as it arrives. The encoded
+chunks are yielded to a ``StreamingHttpResponse``, so memory stays constant for
+exports of any size.
+
+Query parameters:
+    from, to: Time window, epoch seconds or ISO-8601 (default: everything).
+    fields: Comma-separated fields to export.
+    output: "ndjson" (default), "csv" or "parquet". Not "format", which DRF reserves
+        for renderer selection.
+    compression: "none" (default), "gzip" or "zstd". NDJSON and CSV are compressed
+        as a whole; Parquet uses it as the column codec (default "snappy").
+
+Parquet export requires ``pyarrow`` and zstd compression of NDJSON/CSV requires
+``zstandard``; both are optional and only imported when requested.
+"""
+import os
+import io
+import csv
+import zlib
+import orjson
+from dotenv import load_dotenv
+from django.http import StreamingHttpResponse
+from pymongo import ASCENDING
+
+from .history import HistoryQueryError, parse_time, history_filter
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Documents fetched from MongoDB per round trip and encoded per chunk
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 5000))
+# Rows per Parquet row group; each row group is flushed to the client when complete
+PARQUET_ROW_GROUP_SIZE = int(os.getenv('PARQUET_ROW_GROUP_SIZE', 50000))
+
+# Export order: oldest first, the declared (…, timestamp, _id) indexes are scanned backwards
+EXPORT_SORT = [("timestamp", ASCENDING), ("_id", ASCENDING)]
+
+OUTPUTS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+COMPRESSIONS = {
+    "none": (None, ""),
+    "gzip": ("application/gzip", ".gz"),
+    "zstd": ("application/zstd", ".zst"),
+}
+
+
+def parse_export_params(params, allowed_fields, default_fields):
+    """
+    Validate the export query parameters of a request.
+
+    Args:
+        params (QueryDict): request.GET or request.query_params.
+        allowed_fields (iterable): Fields a client may select.
+        default_fields (list): Fields exported when "fields" is not given.
+
+    Returns:
+        dict: "start", "end", "fields", "output" and "compression".
+
+    Raises:
+        HistoryQueryError: If a parameter is invalid or its optional dependency is missing.
+    """
+    output = params.get("output", "ndjson")
+    if output not in OUTPUTS:
+        raise HistoryQueryError(f"'output' must be one of: {', '.join(OUTPUTS)}.")
+    compression = params.get("compression", "none")
+    if compression not in COMPRESSIONS:
+        raise HistoryQueryError(f"'compression' must be one of: {', '.join(COMPRESSIONS)}.")
+
+    if output == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HistoryQueryError("Parquet export is not available, pyarrow is not installed.")
+    elif compression == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise HistoryQueryError("zstd compression is not available, zstandard is not installed.")
+
+    fields = list(default_fields)
+    if params.get("fields"):
+        fields = [field.strip() for field in params["fields"].split(",") if field.strip()]
+        unknown = set(fields) - set(allowed_fields)
+        if unknown:
+            raise HistoryQueryError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+
+    start = parse_time(params["from"]) if params.get("from") else None
+    end = parse_time(params["to"]) if params.get("to") else None
+    if start is not None and end is not None and start >= end:
+        raise HistoryQueryError("'from' must be before 'to'.")
+
+    return {"start": start, "end": end, "fields": fields, "output": output, "compression": compression}
+
+
+def iter_batches(collection, query, params):
+    """
+    Read the documents of an export window in batches, oldest first.
+
+    Args:
+        collection (Collection): History collection.
+        query (dict): Base filter.
+        params (dict): Result of parse_export_params().
+
+    Yields:
+        list: Up to EXPORT_BATCH_SIZE rows, as dicts of the requested fields in order.
+            ObjectIds are converted to strings.
+    """
+    fields = params["fields"]
+    projection = dict.fromkeys(fields, 1)
+    if "_id" not in fields:
+        projection["_id"] = 0
+    cursor = collection.find(history_filter(query, params["start"], params["end"]), projection) \
+        .sort(EXPORT_SORT).batch_size(EXPORT_BATCH_SIZE)
+
+    batch = []
+    for document in cursor:
+        row = {field: document.get(field) for field in fields}
+        if "_id" in row:
+            row["_id"] = str(row["_id"])
+        batch.append(row)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def encode_ndjson(batches, fields):
+    """
+    Encode row batches as newline-delimited JSON, one chunk per batch.
+    """
+    for batch in batches:
+        yield b"".join(orjson.dumps(row) + b"\n" for row in batch)
+
+
+def encode_csv(batches, fields):
+    """
+    Encode row batches as CSV with a header line, one chunk per batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for batch in batches:
+        writer.writerows([row[field] for field in fields] for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate(0)
+    # Header of an empty export
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file collecting written bytes until drained. tell() keeps counting
+    across drains, since Parquet footers store absolute offsets.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def encode_parquet(batches, fields, compression="none"):
+    """
+    Encode row batches as a Parquet file, yielding each row group once it is written.
+
+    The schema is inferred from the first batch; later batches are cast to it.
+
+    Args:
+        batches (iterable): Row batches from iter_batches().
+        fields (list): Column names, in order.
+        compression (str): "none", "gzip" or "zstd" column codec; "none" uses snappy.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    rows = []
+
+    def write_row_group(group):
+        nonlocal writer
+        columns = {field: [row[field] for row in group] for field in fields}
+        table = pa.table(columns) if writer is None else pa.table(columns, schema=writer.schema)
+        if writer is None:
+            codec = "snappy" if compression == "none" else compression
+            writer = pq.ParquetWriter(sink, table.schema, compression=codec)
+        writer.write_table(table, row_group_size=PARQUET_ROW_GROUP_SIZE)
+
+    for batch in batches:
+        rows.extend(batch)
+        # Exactly PARQUET_ROW_GROUP_SIZE rows per group, the rest waits for the next batch
+        if len(rows) >= PARQUET_ROW_GROUP_SIZE:
+            while len(rows) >= PARQUET_ROW_GROUP_SIZE:
+                write_row_group(rows[:PARQUET_ROW_GROUP_SIZE])
+                del rows[:PARQUET_ROW_GROUP_SIZE]
+            yield sink.drain()
+    if rows or writer is None:
+        write_row_group(rows)
+    writer.close()
+    yield sink.drain()
+
+
+def compress_chunks(chunks, compression):
+    """
+    Compress a stream of chunks with gzip or zstd, flushing per chunk so the client
+    receives data continuously.
+    """
+    if compression == "gzip":
+        compressor = zlib.compressobj(wbits=31)
+        sync_flush = zlib.Z_SYNC_FLUSH
+    else:
+        import zstandard
+        compressor = zstandard.ZstdCompressor().compressobj()
+        sync_flush = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+    for chunk in chunks:
+        # A sync flush emits everything compressed so far without ending the stream
+        data = compressor.compress(chunk) + compressor.flush(sync_flush)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(collection, query, params, filename):
+    """
+    Build the streaming download response of an export.
+
+    Args:
+        collection (Collection): History collection.
+        query (dict): Base filter.
+        params (dict): Result of parse_export_params().
+        filename (str): Download file name without extension.
+
+    Returns:
+        StreamingHttpResponse: The export, sent as an attachment.
+    """
+    output, compression, fields = params["output"], params["compression"], params["fields"]
+    content_type, extension = OUTPUTS[output]
+    batches = iter_batches(collection, query, params)
+
+    if output == "parquet":
+        chunks = encode_parquet(batches, fields, compression)
+    else:
+        encode = encode_ndjson if output == "ndjson" else encode_csv
+        chunks = encode(batches, fields)
+        if compression != "none":
+            chunks = compress_chunks(chunks, compression)
+            content_type, suffix = COMPRESSIONS[compression]
+            extension += suffix
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{extension}"'
+    return response
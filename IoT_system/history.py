@@ -0,0 +1,220 @@
+"""
+Time-range queries with keyset pagination over MongoDB history collections.
+
+History documents carry an epoch-seconds ``timestamp``. Pages are read newest
+first, ordered by ``(timestamp, _id)``, and the next page starts right after the
+last document of the previous one. The opaque cursor encodes that position, so
+every page is one bounded index scan and deep pages cost the same as the first.
+No ``skip()`` is involved.
+
+Query parameters:
+    from, to: Time window, epoch seconds or ISO-8601; ``from`` is inclusive, ``to`` exclusive.
+    limit: Page size, at most MAX_LIMIT.
+    cursor: Value of the ``X-Next-Cursor`` header of the previous page.
+    fields: Comma-separated fields to return.
+"""
+import os
+import base64
+from datetime import datetime, timezone
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidId
+from dotenv import load_dotenv
+from pymongo import DESCENDING
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Page size when no limit is given, matching the former "latest 20"
+DEFAULT_LIMIT = 20
+# Largest page size a client may request
+MAX_LIMIT = int(os.getenv('HISTORY_MAX_LIMIT', 1000))
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Sort order of history pages; the declared indexes end with these keys
+HISTORY_SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+
+
+class HistoryQueryError(ValueError):
+    """Raised for invalid history query parameters."""
+
+
+def parse_time(value):
+    """
+    Parse a time parameter.
+
+    Args:
+        value (str): Epoch seconds or an ISO-8601 date/time (UTC if no offset is given).
+
+    Returns:
+        float: Epoch seconds.
+
+    Raises:
+        HistoryQueryError: If the value is neither.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HistoryQueryError(f"Invalid time: {value}")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def encode_cursor(document):
+    """
+    Encode the (timestamp, _id) position of a document as an opaque cursor.
+
+    Args:
+        document (dict): Last document of a page.
+
+    Returns:
+        str: URL-safe cursor.
+    """
+    raw = orjson.dumps([document["timestamp"], str(document["_id"])])
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor().
+
+    Args:
+        cursor (str): Cursor from the X-Next-Cursor header.
+
+    Returns:
+        tuple: (timestamp, ObjectId) of the last document of the previous page.
+
+    Raises:
+        HistoryQueryError: If the cursor is malformed.
+    """
+    try:
+        timestamp, object_id = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(timestamp), ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId, orjson.JSONDecodeError):
+        raise HistoryQueryError("Invalid cursor")
+
+
+def parse_history_params(params, allowed_fields, default_fields):
+    """
+    Validate the history query parameters of a request.
+
+    Args:
+        params (QueryDict): request.GET or request.query_params.
+        allowed_fields (iterable): Fields a client may select.
+        default_fields (list): Fields returned when "fields" is not given.
+
+    Returns:
+        dict: "start", "end", "limit", "cursor" and "fields".
+
+    Raises:
+        HistoryQueryError: If a parameter is invalid.
+    """
+    try:
+        limit = int(params.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise HistoryQueryError("'limit' must be an integer.")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise HistoryQueryError(f"'limit' must be between 1 and {MAX_LIMIT}.")
+
+    fields = list(default_fields)
+    if params.get("fields"):
+        fields = [field.strip() for field in params["fields"].split(",") if field.strip()]
+        unknown = set(fields) - set(allowed_fields)
+        if unknown:
+            raise HistoryQueryError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+
+    return {
+        "start": parse_time(params["from"]) if params.get("from") else None,
+        "end": parse_time(params["to"]) if params.get("to") else None,
+        "limit": limit,
+        "cursor": decode_cursor(params["cursor"]) if params.get("cursor") else None,
+        "fields": fields,
+    }
+
+
+def history_filter(query, start=None, end=None, cursor=None):
+    """
+    Build the MongoDB filter of one history page.
+
+    The cursor bounds the timestamp range of the index scan; documents sharing the
+    cursor timestamp are continued by _id.
+
+    Args:
+        query (dict): Base filter, e.g. {"device_id": 1}.
+        start (float): Inclusive lower time bound.
+        end (float): Exclusive upper time bound.
+        cursor (tuple): (timestamp, ObjectId) of the previous page's last document.
+
+    Returns:
+        dict: The filter.
+    """
+    query = dict(query)
+    time_range = {}
+    if start is not None:
+        time_range["$gte"] = start
+    if end is not None:
+        time_range["$lt"] = end
+    if cursor is not None:
+        timestamp, object_id = cursor
+        time_range["$lte"] = timestamp
+        query["$or"] = [{"timestamp": {"$lt": timestamp}}, {"_id": {"$lt": object_id}}]
+    if time_range:
+        query["timestamp"] = time_range
+    return query
+
+
+def page_query(query, params):
+    """
+    Return the filter and projection of one history page.
+
+    Returns:
+        tuple: (filter, projection); the projection adds timestamp and _id for positioning.
+    """
+    projection = dict.fromkeys(params["fields"], 1)
+    projection.update(timestamp=1, _id=1)
+    return history_filter(query, params["start"], params["end"], params["cursor"]), projection
+
+
+def split_page(documents, limit):
+    """
+    Cut the extra document read past a page and return the page with its next cursor.
+    """
+    if len(documents) > limit:
+        documents = documents[:limit]
+        return documents, encode_cursor(documents[-1])
+    return documents, None
+
+
+def fetch_page(collection, query, params):
+    """
+    Read one page of history, newest first.
+
+    Args:
+        collection (Collection): History collection.
+        query (dict): Base filter.
+        params (dict): Result of parse_history_params().
+
+    Returns:
+        tuple: (documents, next cursor or None). Documents contain the requested
+        fields and, for positioning, timestamp and _id.
+    """
+    page_filter, projection = page_query(query, params)
+    documents = list(collection.find(page_filter, projection).sort(HISTORY_SORT).limit(params["limit"] + 1))
+    return split_page(documents, params["limit"])
+
+
+async def afetch_page(collection, query, params):
+    """
+    Async fetch_page() on a collection of IoT_system.mongo_async.
+    """
+    page_filter, projection = page_query(query, params)
+    cursor = collection.find(page_filter, projection).sort(HISTORY_SORT).limit(params["limit"] + 1)
+    return split_page(await cursor.to_list(length=params["limit"] + 1), params["limit"])
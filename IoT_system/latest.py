@@ -0,0 +1,212 @@
+"""
+In-memory ring buffers of the latest samples per device or asset.
+
+Dashboards poll the latest page of every series every few seconds per open tab.
+Writers append each sample to a bounded per-series ring buffer at write time
+(``record_latest()``), and ``fetch_latest_page()`` answers latest-page reads from
+it without touching MongoDB.
+
+A read is served from memory only when the buffer is warm:
+    - the series was written in this process within LATEST_BUFFER_MAX_AGE seconds,
+      so a writer running in another process or a stopped writer never serves stale data;
+    - the buffer holds more samples than the page size, so the next-page cursor is exact;
+    - the request asks for the latest page (no from, to or cursor).
+Otherwise the page is read from MongoDB. A cold buffer of a series written in this
+process, e.g. after a restart, is filled with one read of LATEST_BUFFER_SIZE documents.
+"""
+import os
+import time
+import threading
+from collections import deque
+from itertools import islice
+from dotenv import load_dotenv
+
+from .history import HISTORY_SORT, afetch_page, encode_cursor, fetch_page, history_filter
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Latest-page reads are served from memory when enabled
+LATEST_BUFFER_ENABLED = os.getenv('LATEST_BUFFER_ENABLED', 'True') == 'True'
+# Samples kept per series; pages up to this size minus one are served from memory
+LATEST_BUFFER_SIZE = int(os.getenv('LATEST_BUFFER_SIZE', 100))
+# Seconds after the last local write after which a buffer is considered stale
+LATEST_BUFFER_MAX_AGE = float(os.getenv('LATEST_BUFFER_MAX_AGE', 60))
+
+
+# Marker of a cold buffer to be filled from MongoDB
+SEED = "seed"
+
+
+def _position(document):
+    return document["timestamp"], document["_id"]
+
+
+class LatestBuffer:
+    """
+    Thread-safe ring buffers of the latest samples, keyed by (source, key).
+    """
+
+    def __init__(self, size=LATEST_BUFFER_SIZE, max_age=LATEST_BUFFER_MAX_AGE):
+        self.size = size
+        self.max_age = max_age
+        # (source, key) -> deque of documents, oldest first
+        self._buffers = {}
+        # (source, key) -> monotonic time of the last local write
+        self._written = {}
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0}
+
+    def append(self, source, key, document):
+        """
+        Append a stored sample. The document must carry its _id and timestamp.
+        """
+        with self._lock:
+            buffer = self._buffers.get((source, key))
+            if buffer is None:
+                buffer = self._buffers[(source, key)] = deque(maxlen=self.size)
+            # Samples normally arrive in order; a late one is inserted at its position
+            if buffer and _position(document) < _position(buffer[-1]):
+                documents = sorted([*buffer, document], key=_position)
+                buffer.clear()
+                buffer.extend(documents)
+            else:
+                buffer.append(document)
+            self._written[(source, key)] = time.monotonic()
+
+    def seed(self, source, key, documents):
+        """
+        Merge documents read from MongoDB into a buffer, e.g. after a cold start.
+        Documents already buffered are kept once.
+        """
+        with self._lock:
+            buffer = self._buffers.get((source, key))
+            if buffer is None:
+                buffer = self._buffers[(source, key)] = deque(maxlen=self.size)
+            merged = {document["_id"]: document for document in documents}
+            merged.update((document["_id"], document) for document in buffer)
+            buffer.clear()
+            buffer.extend(sorted(merged.values(), key=_position)[-self.size:])
+
+    def latest(self, source, key, limit):
+        """
+        Return the latest `limit` samples, newest first. Older samples exist, since
+        the buffer must hold more than `limit` samples to answer.
+
+        Returns:
+            list or None: The documents, or None if the buffer cannot answer.
+        """
+        with self._lock:
+            buffer = self._buffers.get((source, key))
+            written = self._written.get((source, key))
+            if (buffer is None or written is None or len(buffer) <= limit
+                    or time.monotonic() - written > self.max_age):
+                self.metrics["misses"] += 1
+                return None
+            self.metrics["hits"] += 1
+            return list(islice(reversed(buffer), limit))
+
+    def is_fresh(self, source, key):
+        """
+        Return whether the series was written in this process within max_age seconds.
+        """
+        with self._lock:
+            written = self._written.get((source, key))
+        return written is not None and time.monotonic() - written <= self.max_age
+
+    def stats(self):
+        with self._lock:
+            return dict(self.metrics, series=len(self._buffers))
+
+
+_buffer = LatestBuffer()
+
+
+def get_latest_buffer():
+    """
+    Return the process-wide latest-sample buffer.
+    """
+    return _buffer
+
+
+def record_latest(source, key, document):
+    """
+    Append a stored sample to the ring buffer of its series, if enabled.
+
+    Args:
+        source (str): "modbus" or "mqtt".
+        key: Device primary key or symbol; None for the feed of all symbols.
+        document (dict): The inserted document, with _id and timestamp.
+    """
+    if LATEST_BUFFER_ENABLED:
+        _buffer.append(source, key, document)
+
+
+def _from_buffer(source, key, params):
+    """
+    Try to answer a read from the ring buffer.
+
+    Returns:
+        tuple or str or None: (documents, next cursor) on a hit; SEED if the series is
+        written in this process but its buffer is cold; None to read the page from MongoDB.
+    """
+    latest_page = params["start"] is None and params["end"] is None and params["cursor"] is None
+    if not (LATEST_BUFFER_ENABLED and latest_page and params["limit"] < LATEST_BUFFER_SIZE):
+        return None
+
+    documents = _buffer.latest(source, key, params["limit"])
+    if documents is not None:
+        return documents, encode_cursor(documents[-1])
+    if not _buffer.is_fresh(source, key):
+        # Not written in this process, the buffer would not stay current
+        return None
+    return SEED
+
+
+def _seeded_page(source, key, documents, limit):
+    # Cold buffer of a locally written series: a full buffer of documents was read once,
+    # so the following reads are served from memory
+    _buffer.seed(source, key, documents)
+    page = documents[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(documents) > limit else None
+    return page, next_cursor
+
+
+def fetch_latest_page(collection, source, key, query, params):
+    """
+    Read one history page like history.fetch_page(), answering latest-page reads
+    from the ring buffer when it is warm.
+
+    Args:
+        collection (Collection): History collection, used on a buffer miss.
+        source (str): Buffer source, "modbus" or "mqtt".
+        key: Buffer key of the series.
+        query (dict): Base filter of the series.
+        params (dict): Result of history.parse_history_params().
+
+    Returns:
+        tuple: (documents, next cursor or None), newest first.
+    """
+    result = _from_buffer(source, key, params)
+    if result is None:
+        return fetch_page(collection, query, params)
+    if result is SEED:
+        documents = list(collection.find(history_filter(query)).sort(HISTORY_SORT).limit(LATEST_BUFFER_SIZE))
+        return _seeded_page(source, key, documents, params["limit"])
+    return result
+
+
+async def afetch_latest_page(collection, source, key, query, params):
+    """
+    Async fetch_latest_page() on a collection of IoT_system.mongo_async; buffer hits
+    are answered without awaiting anything.
+    """
+    result = _from_buffer(source, key, params)
+    if result is None:
+        return await afetch_page(collection, query, params)
+    if result is SEED:
+        cursor = collection.find(history_filter(query)).sort(HISTORY_SORT).limit(LATEST_BUFFER_SIZE)
+        documents = await cursor.to_list(length=LATEST_BUFFER_SIZE)
+        return _seeded_page(source, key, documents, params["limit"])
+    return result
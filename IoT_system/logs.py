@@ -0,0 +1,244 @@
+"""
+Logging subsystem for the IoT_system project.
+
+Log records are handed to a bounded queue by a QueueHandler and formatted and
+written by a QueueListener on a background thread, so that logging never blocks
+MQTT callbacks or Modbus polling. On top of that the module offers:
+
+- lazy structured fields: ``log.info(kv("Value logged", device=name, value=value))``
+  only builds the message if the record is actually emitted,
+- per-logger sampling of high-rate records (DEBUG/INFO only, warnings are never sampled),
+- runtime changes of levels and sampling through ``set_level`` / ``set_sampling``
+  (exposed by the ``api/logging/`` endpoint).
+
+Enabled through ``LOGGING_CONFIG = 'IoT_system.logs.configure_logging'`` in settings.
+"""
+import copy
+import queue
+import atexit
+import logging
+import logging.config
+import logging.handlers
+import threading
+import orjson
+
+
+# Maximum number of records waiting for the listener; further records are dropped
+QUEUE_SIZE = 10000
+
+_listener = None
+_queue_handler = None
+_sampling_filter = None
+
+
+class StructuredMessage:
+    """
+    Log message with structured fields. Formatting is deferred until the record
+    is emitted by the listener thread; formatters can read the raw fields from
+    ``record.msg.fields``.
+    """
+    __slots__ = ("message", "fields")
+
+    def __init__(self, message, fields):
+        self.message = message
+        self.fields = fields
+
+    def __str__(self):
+        if not self.fields:
+            return self.message
+        return f"{self.message} " + " ".join(f"{key}={value}" for key, value in self.fields.items())
+
+
+def kv(message, **fields):
+    """
+    Build a structured log message.
+
+    Args:
+        message (str): Event description.
+        **fields: Structured fields attached to the record.
+
+    Returns:
+        StructuredMessage: Message formatted lazily as "message key=value ...".
+    """
+    return StructuredMessage(message, fields)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including structured fields."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        if isinstance(record.msg, StructuredMessage) and not record.args:
+            entry["message"] = record.msg.message
+            entry.update(record.msg.fields)
+        else:
+            entry["message"] = record.getMessage()
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes only every N-th DEBUG/INFO record of a logger (and its children).
+    Records of level WARNING and above always pass.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def set_rate(self, logger_name, every):
+        """
+        Keep one of every `every` DEBUG/INFO records of a logger; 1 or less disables sampling.
+        """
+        with self._lock:
+            if every and every > 1:
+                self.rates[logger_name] = int(every)
+            else:
+                self.rates.pop(logger_name, None)
+            self._counters.pop(logger_name, None)
+
+    def _rate_for(self, name):
+        while name:
+            rate = self.rates.get(name)
+            if rate:
+                return name, rate
+            name = name.rpartition('.')[0]
+        return None, None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        name, rate = self._rate_for(record.name)
+        if rate is None:
+            return True
+        with self._lock:
+            count = self._counters.get(name, 0)
+            self._counters[name] = count + 1
+        return count % rate == 0
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that defers all formatting to the listener thread and drops
+    records instead of blocking when the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock implementation formats the message here, on the logging thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(config):
+    """
+    Apply a dictConfig logging configuration and move the root handlers behind a
+    QueueHandler/QueueListener pair.
+
+    An optional top-level ``sampling`` key maps logger names to "keep one of every N"
+    rates for DEBUG/INFO records.
+
+    Args:
+        config (dict): Logging configuration (settings.LOGGING).
+    """
+    global _listener, _queue_handler, _sampling_filter
+
+    config = copy.deepcopy(config)
+    sampling = config.pop("sampling", {})
+    logging.config.dictConfig(config)
+
+    if _listener is not None:
+        _listener.stop()
+
+    root = logging.getLogger()
+    handlers = [handler for handler in root.handlers if not isinstance(handler, NonBlockingQueueHandler)]
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    _sampling_filter = SamplingFilter(sampling)
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=QUEUE_SIZE))
+    _queue_handler.addFilter(_sampling_filter)
+    root.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """
+    Stop the listener thread after it has written all queued records.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def set_level(logger_name, level):
+    """
+    Change the level of a logger at runtime.
+
+    Args:
+        logger_name (str): Logger name, "root" or "" for the root logger.
+        level (str or int): Level name such as "DEBUG", or a numeric level.
+
+    Raises:
+        ValueError: If the level is unknown.
+    """
+    if isinstance(level, str):
+        numeric = logging.getLevelName(level.upper())
+        if not isinstance(numeric, int):
+            raise ValueError(f"Unknown log level: {level}")
+        level = numeric
+    logging.getLogger(None if logger_name in ("", "root") else logger_name).setLevel(level)
+
+
+def set_sampling(logger_name, every):
+    """
+    Change the sampling rate of a logger at runtime.
+
+    Args:
+        logger_name (str): Logger name.
+        every (int): Keep one of every `every` DEBUG/INFO records; 1 or 0 disables sampling.
+    """
+    if _sampling_filter is None:
+        raise RuntimeError("Logging is not configured through IoT_system.logs")
+    _sampling_filter.set_rate(logger_name, every)
+
+
+def get_logging_state():
+    """
+    Return the current levels, sampling rates and dropped record count.
+
+    Returns:
+        dict: Levels of the root and all configured loggers, sampling rates and queue statistics.
+    """
+    levels = {"root": logging.getLevelName(logging.getLogger().level)}
+    for name, logger in sorted(logging.Logger.manager.loggerDict.items()):
+        if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET:
+            levels[name] = logging.getLevelName(logger.level)
+    return {
+        "levels": levels,
+        "sampling": dict(_sampling_filter.rates) if _sampling_filter else {},
+        "queued": _queue_handler.queue.qsize() if _queue_handler else 0,
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+    }
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from IoT_system.retention import RetentionCompactor, RETENTION_BATCH_SIZE, RETENTION_BATCH_PAUSE, \
+    RETENTION_MAX_DELETES_PER_PASS
+
+
+class Command(BaseCommand):
+    """
+    Run one retention compactor pass (see IoT_system.retention) and report what it removed.
+    """
+    help = "Delete raw samples older than their retention that TTL indexes do not cover."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE, help="documents per delete")
+        parser.add_argument("--pause", type=float, default=RETENTION_BATCH_PAUSE,
+                            help="seconds to pause after each batch")
+        parser.add_argument("--max-deletes", type=int, default=RETENTION_MAX_DELETES_PER_PASS,
+                            help="documents deleted at most in this run")
+
+    def handle(self, *args, **options):
+        compactor = RetentionCompactor(batch_size=options["batch_size"], batch_pause=options["pause"],
+                                       max_deletes=options["max_deletes"])
+        report = compactor.run_pass()
+        for series, deleted in sorted(report["deleted"].items()):
+            self.stdout.write(f"{series}: {deleted} removed")
+        for series in report["skipped"]:
+            self.stdout.write(self.style.WARNING(f"{series}: skipped, no rollups before the cutoff "
+                                                 f"(run rebuild_rollups first)"))
+        summary = f"Removed {report['total']} samples in {report['seconds']}s."
+        if not report["complete"]:
+            summary += " The deletion budget was reached, run again to continue."
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,59 @@
+import os
+import sys
+from django.core.management.base import BaseCommand, CommandError
+
+from IoT_system.provisioning import PROVISION_BATCH_SIZE, ProvisioningError, import_devices
+from modbus.views import device_importer as modbus_importer
+from mqtt_devices.views import device_importer as mqtt_importer
+
+IMPORTERS = {"mqtt": mqtt_importer, "modbus": modbus_importer}
+
+
+def format_errors(errors):
+    """
+    Format the serializer errors of a row as "field: message, message; field: message".
+    """
+    return "; ".join(
+        f"{field}: {', '.join(map(str, messages)) if isinstance(messages, list) else messages}"
+        for field, messages in errors.items()
+    )
+
+
+class Command(BaseCommand):
+    """
+    Bulk import MQTT or Modbus devices from a CSV or NDJSON file (see IoT_system.provisioning).
+    """
+    help = "Create or update devices in batches from a CSV or NDJSON file and report the errors per row."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(IMPORTERS), help="device model to import")
+        parser.add_argument("path", help="CSV or NDJSON file, '-' for standard input")
+        parser.add_argument("--input", choices=["csv", "ndjson"],
+                            help="file format (default: from the file extension, else ndjson)")
+        parser.add_argument("--upsert", action="store_true",
+                            help="update existing devices (by serial number, or host/port/slave id)")
+        parser.add_argument("--batch-size", type=int, default=PROVISION_BATCH_SIZE, help="rows per batch")
+
+    def handle(self, *args, **options):
+        importer = IMPORTERS[options["kind"]](upsert=options["upsert"], batch_size=options["batch_size"])
+
+        path = options["path"]
+        input_format = options["input"] or ("csv" if path.lower().endswith(".csv") else "ndjson")
+        try:
+            if path == "-":
+                report = import_devices(sys.stdin, input_format, importer)
+            else:
+                if not os.path.exists(path):
+                    raise CommandError(f"File not found: {path}")
+                with open(path, encoding="utf-8-sig", newline="") as lines:
+                    report = import_devices(lines, input_format, importer)
+        except ProvisioningError as e:
+            raise CommandError(str(e))
+
+        for error in report["errors"]:
+            self.stdout.write(self.style.WARNING(f"row {error['row']}: {format_errors(error['errors'])}"))
+        if report["failed"] > len(report["errors"]):
+            self.stdout.write(self.style.WARNING(f"... {report['failed'] - len(report['errors'])} more rows failed"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['rows']} rows: {report['created']} created, {report['updated']} updated, "
+            f"{report['failed']} failed in {report['seconds']}s."))
@@ -0,0 +1,99 @@
+import time
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import BulkWriteError
+from django.core.management.base import BaseCommand, CommandError
+
+from IoT_system.mongo import get_collection
+from IoT_system.timeseries import SERIES_SOURCES, TimeSeriesCollection, ensure_timeseries_collection
+from IoT_system.retention import max_retention_seconds
+
+
+class Command(BaseCommand):
+    """
+    Copy samples from the plain collections into their time-series collections.
+
+    Documents are read in _id order with keyset pagination and written in unordered
+    batches with their _id kept, so history cursors stay valid. The last copied _id
+    is printed after every batch; an interrupted run continues with --after <id>.
+    A failed batch may be partly written, and time-series collections do not enforce
+    unique _ids, so the first batch of every run skips documents already copied.
+    Switch the read and write path with MONGO_TIMESERIES=True once the copy is done.
+    """
+    help = "Copy sample collections into MongoDB time-series collections in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", choices=sorted(SERIES_SOURCES), action="append",
+                            help="source to migrate (repeatable), defaults to all")
+        parser.add_argument("--batch-size", type=int, default=5000, help="documents per insert batch")
+        parser.add_argument("--after", help="resume after this _id (single source only)")
+
+    def handle(self, *args, **options):
+        sources = options["source"] or sorted(SERIES_SOURCES)
+        if options["after"] and len(sources) != 1:
+            raise CommandError("--after requires exactly one --source.")
+        try:
+            after = ObjectId(options["after"]) if options["after"] else None
+        except InvalidId:
+            raise CommandError(f"Invalid _id: {options['after']}")
+
+        for source in sources:
+            collection_name = SERIES_SOURCES[source][0]
+            if not collection_name:
+                self.stdout.write(self.style.WARNING(f"{source}: collection not configured, skipped"))
+                continue
+            ensure_timeseries_collection(source, max_retention_seconds(source))
+            copied = self.migrate(source, get_collection(collection_name), options["batch_size"], after)
+            self.stdout.write(self.style.SUCCESS(f"{source}: copied {copied} documents"))
+
+    def migrate(self, source, plain, batch_size, after):
+        target = TimeSeriesCollection(source)
+        copied = 0
+        started = time.monotonic()
+        # The first batch may have been partly written by an earlier, failed run
+        resuming = True
+        while True:
+            query = {"_id": {"$gt": after}} if after is not None else {}
+            batch = [
+                document for document in plain.find(query).sort("_id", 1).limit(batch_size)
+            ]
+            if not batch:
+                return copied
+            # Documents without a numeric timestamp cannot be stored in a time-series collection
+            valid = [document for document in batch if isinstance(document.get("timestamp"), (int, float))]
+            if resuming:
+                valid = self.skip_copied(target, valid)
+                resuming = False
+            if valid:
+                try:
+                    target.insert_many(valid, ordered=False)
+                except BulkWriteError as e:
+                    errors = e.details.get("writeErrors", [])
+                    message = errors[0].get("errmsg") if errors else e
+                    resume = f"--after {after}" if after is not None else "no --after"
+                    raise CommandError(
+                        f"{source}: {len(valid) - e.details.get('nInserted', 0)} of {len(valid)} documents of the "
+                        f"batch not written ({message}). Fix the cause and resume with {resume}; the documents "
+                        f"of this batch already copied are skipped."
+                    )
+            copied += len(valid)
+            after = batch[-1]["_id"]
+            rate = copied / max(time.monotonic() - started, 1e-9)
+            self.stdout.write(f"{source}: {copied} copied, {len(batch) - len(valid)} skipped in batch, "
+                              f"last _id {after} ({rate:.0f} docs/s)")
+
+    @staticmethod
+    def skip_copied(target, documents):
+        """
+        Return the documents whose _id is not in the target collection yet.
+        """
+        if not documents:
+            return documents
+        timestamps = [document["timestamp"] for document in documents]
+        # The time range lets MongoDB read only the buckets of the batch
+        copied = {document["_id"] for document in target.find(
+            {"_id": {"$in": [document["_id"] for document in documents]},
+             "timestamp": {"$gte": min(timestamps), "$lte": max(timestamps)}},
+            {"_id": 1},
+        )}
+        return [document for document in documents if document["_id"] not in copied]
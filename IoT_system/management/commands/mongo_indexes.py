@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from IoT_system.mongo_indexes import ensure_indexes, missing_indexes, check_queries
+
+
+class Command(BaseCommand):
+    """
+    Create the MongoDB indexes declared in IoT_system.mongo_indexes.INDEXES.
+
+    With --check nothing is created; the command fails if a declared index is
+    missing or if a view query is not answered from an index (checked with explain()).
+    """
+    help = "Create the declared MongoDB indexes, or check them and the view query plans with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="do not create indexes; fail if indexes are missing or view queries are not index-backed",
+        )
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            for collection_name, names in ensure_indexes().items():
+                self.stdout.write(f"{collection_name}: {', '.join(names)}")
+            self.stdout.write(self.style.SUCCESS("Indexes ensured."))
+            return
+
+        failed = False
+        for collection_name, names in missing_indexes().items():
+            failed = True
+            self.stdout.write(self.style.ERROR(f"{collection_name}: missing indexes {', '.join(names)}"))
+
+        for result in check_queries():
+            line = f"{result['query']} on {result['collection']}: {' <- '.join(result['stages'])}"
+            if result["ok"]:
+                self.stdout.write(self.style.SUCCESS(f"OK   {line} (index {result['index']})"))
+            else:
+                failed = True
+                self.stdout.write(self.style.ERROR(f"FAIL {line}"))
+
+        if failed:
+            raise CommandError("MongoDB indexes or query plans do not match the declared index set.")
+        self.stdout.write(self.style.SUCCESS("All view queries are index-backed."))
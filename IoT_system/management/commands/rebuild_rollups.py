@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from IoT_system.history import HistoryQueryError, parse_time
+from IoT_system.rollups import ROLLUP_SOURCES, rebuild_rollups
+from IoT_system.timeseries import SERIES_SOURCES
+
+
+class Command(BaseCommand):
+    """
+    Recompute the minute/hour/day rollups from the raw collections,
+    e.g. for history written before rollups were enabled.
+    """
+    help = "Rebuild rollup collections from raw samples."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", choices=sorted(ROLLUP_SOURCES), action="append",
+                            help="source to rebuild (repeatable), defaults to all")
+        parser.add_argument("--from", dest="start", help="start of the window, epoch seconds or ISO-8601")
+        parser.add_argument("--to", dest="end", help="end of the window (exclusive), epoch seconds or ISO-8601")
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_time(options["start"]) if options["start"] else None
+            end = parse_time(options["end"]) if options["end"] else None
+        except HistoryQueryError as e:
+            raise CommandError(str(e))
+
+        for source in options["source"] or sorted(ROLLUP_SOURCES):
+            if not SERIES_SOURCES[source][0]:
+                self.stdout.write(self.style.WARNING(f"{source}: collection not configured, skipped"))
+                continue
+            rebuild_rollups(source, start, end)
+            self.stdout.write(self.style.SUCCESS(f"{source}: rollups rebuilt"))
@@ -0,0 +1,187 @@
+"""
+Shared MongoDB access for the IoT_system project.
+
+All views and writers get their collections from ``get_collection()``, which
+uses one ``MongoClient`` per process instead of a client per request. A
+MongoClient owns a connection pool and background monitoring threads, so
+creating one per call adds server handshakes to every request and leaks
+sockets until it is garbage collected.
+
+The client is created lazily and re-created after ``fork()``, because
+MongoClient instances must not be shared with forked children (for example
+gunicorn workers forked from a preloaded application). Pool size, timeouts and
+read preference are configured through environment variables, and
+``pool_stats()`` reports connection pool usage gathered by a pool listener.
+"""
+import os
+import threading
+from dotenv import load_dotenv
+from pymongo import MongoClient, monitoring
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+MONGO_URI = os.getenv('MONGO_URI')
+MONGO_DB = os.getenv('MONGO_DB_NAME')
+
+# Connection pool bounds per process
+MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 50))
+MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+# Idle pooled connections are closed after this many milliseconds
+MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 300000))
+# Timeouts (milliseconds), so a MongoDB outage fails requests fast instead of hanging workers
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000))
+SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 10000))
+WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+# Read preference of the shared client: primary, primaryPreferred, secondary, secondaryPreferred or nearest
+READ_PREFERENCE = os.getenv('MONGO_READ_PREFERENCE', 'primary')
+
+_client = None
+_client_pid = None
+_pool_listener = None
+_client_lock = threading.Lock()
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events of the shared client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            "created": 0,
+            "closed": 0,
+            "checked_out": 0,
+            "checked_in": 0,
+            "check_out_failed": 0,
+            "pool_cleared": 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        """
+        Return the event counters with the number of open and in-use connections.
+        """
+        with self._lock:
+            counters = dict(self.counters)
+        counters["open"] = counters["created"] - counters["closed"]
+        counters["in_use"] = counters["checked_out"] - counters["checked_in"]
+        return counters
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count("pool_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._count("created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count("closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._count("check_out_failed")
+
+    def connection_checked_out(self, event):
+        self._count("checked_out")
+
+    def connection_checked_in(self, event):
+        self._count("checked_in")
+
+
+def get_client():
+    """
+    Return the process-wide MongoClient, creating it on first use and again after fork().
+
+    Returns:
+        MongoClient: The shared client.
+    """
+    global _client, _client_pid, _pool_listener
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            # Counters inherited from the parent process describe the parent's pool
+            _pool_listener = PoolStatsListener()
+            _client = MongoClient(
+                MONGO_URI,
+                maxPoolSize=MAX_POOL_SIZE,
+                minPoolSize=MIN_POOL_SIZE,
+                maxIdleTimeMS=MAX_IDLE_TIME_MS,
+                serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=SOCKET_TIMEOUT_MS,
+                waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+                readPreference=READ_PREFERENCE,
+                event_listeners=[_pool_listener],
+                # Connect on first operation, after any fork
+                connect=False,
+            )
+            _client_pid = os.getpid()
+    return _client
+
+
+def get_database():
+    """
+    Return the project database (MONGO_DB_NAME) on the shared client.
+
+    Returns:
+        Database: The project database.
+    """
+    return get_client()[MONGO_DB]
+
+
+def get_collection(name):
+    """
+    Return a collection of the project database on the shared client.
+
+    Args:
+        name (str): Collection name.
+
+    Returns:
+        Collection: The collection.
+    """
+    return get_database()[name]
+
+
+def close_client():
+    """
+    Close the shared client of this process, e.g. on shutdown.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client, _client_pid = None, None
+
+
+def pool_stats():
+    """
+    Return the configuration and connection pool usage of the shared client.
+
+    Returns:
+        dict: Pool settings and connection event counters of this process.
+    """
+    initialized = _client is not None and _client_pid == os.getpid()
+    return {
+        "pid": os.getpid(),
+        "initialized": initialized,
+        "max_pool_size": MAX_POOL_SIZE,
+        "min_pool_size": MIN_POOL_SIZE,
+        "read_preference": READ_PREFERENCE,
+        "connections": _pool_listener.stats() if initialized else None,
+    }
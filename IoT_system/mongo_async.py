@@ -0,0 +1,165 @@
+"""
+Non-blocking MongoDB access for the async views.
+
+Under ASGI, Django runs synchronous views in a single shared thread by default
+(``thread_sensitive``), so every sync view waits for the MongoDB round trips of
+the others. The async views read through Motor, the asyncio driver built on
+pymongo, and await the round trip on the event loop instead, so one worker
+serves many concurrent dashboard requests.
+
+``get_async_client()`` returns one ``AsyncIOMotorClient`` per event loop with the
+pool settings of ``IoT_system.mongo``. Motor clients are bound to the loop they
+were created on, so they are only created on the long-lived loops of the ASGI
+server, which ``IoT_system.asgi`` registers with ``register_server_loop()``, and
+closed on lifespan shutdown or once their loop is found closed. Under WSGI, Django
+runs every async view on a new loop; a client per request would leak its pool and
+monitor threads, so reads there use the shared sync client instead.
+
+``motor`` is optional: without it, with MONGO_ASYNC=False, or off the ASGI server
+loop, ``read_latest_page()`` runs the synchronous read in a thread pool instead of
+the event loop.
+"""
+import os
+import asyncio
+import weakref
+import threading
+from asgiref.sync import sync_to_async
+from dotenv import load_dotenv
+
+from .mongo import (MONGO_URI, MONGO_DB, MAX_POOL_SIZE, MIN_POOL_SIZE, MAX_IDLE_TIME_MS, SERVER_SELECTION_TIMEOUT_MS,
+                    CONNECT_TIMEOUT_MS, SOCKET_TIMEOUT_MS, WAIT_QUEUE_TIMEOUT_MS, READ_PREFERENCE)
+from .timeseries import (SERIES_SOURCES, TIMESERIES_ENABLED, TimeSeriesCollection, TimeSeriesCursor,
+                         get_series_collection, timeseries_collection_name)
+from .latest import afetch_latest_page, fetch_latest_page
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:
+    AsyncIOMotorClient = None
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Read through the async driver in async views (requires motor)
+MONGO_ASYNC = os.getenv('MONGO_ASYNC', 'True') == 'True' and AsyncIOMotorClient is not None
+
+# Event loops of the ASGI server, the only loops Motor clients are created on
+_server_loops = weakref.WeakSet()
+# event loop -> client created on it
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class AsyncTimeSeriesCursor(TimeSeriesCursor):
+    """Wraps a Motor cursor over a time-series collection and returns plain-layout documents."""
+
+    async def to_list(self, length):
+        return [self.layout.from_document(document) for document in await self.cursor.to_list(length=length)]
+
+
+class AsyncTimeSeriesCollection(TimeSeriesCollection):
+    """Plain-layout view of a time-series collection on the async client (reads only)."""
+
+    def find(self, query=None, projection=None):
+        if projection is not None:
+            projection = {self.field(key): value for key, value in projection.items()}
+        return AsyncTimeSeriesCursor(self.collection.find(self.translate_filter(query or {}), projection), self)
+
+
+def register_server_loop():
+    """
+    Mark the running event loop as a long-lived loop of the ASGI server (see IoT_system.asgi).
+    """
+    _server_loops.add(asyncio.get_running_loop())
+
+
+def on_server_loop():
+    """
+    Return True if the running event loop was registered by the ASGI server.
+    """
+    return asyncio.get_running_loop() in _server_loops
+
+
+def get_async_client():
+    """
+    Return the Motor client of the running event loop, creating it on first use.
+
+    Returns:
+        AsyncIOMotorClient: The client.
+
+    Raises:
+        RuntimeError: If the running loop is not a registered ASGI server loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        if loop not in _server_loops:
+            raise RuntimeError("Motor clients are only created on the ASGI server loop")
+        with _clients_lock:
+            # Clients of discarded loops can no longer be used
+            for stale in [stale for stale in _clients if stale.is_closed()]:
+                _clients.pop(stale).close()
+            client = _clients.get(loop)
+            if client is None:
+                client = _clients[loop] = AsyncIOMotorClient(
+                    MONGO_URI,
+                    maxPoolSize=MAX_POOL_SIZE,
+                    minPoolSize=MIN_POOL_SIZE,
+                    maxIdleTimeMS=MAX_IDLE_TIME_MS,
+                    serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+                    connectTimeoutMS=CONNECT_TIMEOUT_MS,
+                    socketTimeoutMS=SOCKET_TIMEOUT_MS,
+                    waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+                    readPreference=READ_PREFERENCE,
+                    io_loop=loop,
+                )
+    return client
+
+
+def close_async_client():
+    """
+    Close the Motor client of the running event loop, if any (called on lifespan shutdown).
+    """
+    with _clients_lock:
+        client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        client.close()
+
+
+def get_async_series_collection(source):
+    """
+    Return the sample collection of a source on the async client, in the configured layout.
+
+    Args:
+        source (str): Key of SERIES_SOURCES.
+
+    Returns:
+        AsyncIOMotorCollection or AsyncTimeSeriesCollection: Collection accepting plain-layout queries.
+    """
+    database = get_async_client()[MONGO_DB]
+    if TIMESERIES_ENABLED:
+        return AsyncTimeSeriesCollection(source, database[timeseries_collection_name(source)])
+    return database[SERIES_SOURCES[source][0]]
+
+
+async def read_latest_page(source, key, query, params):
+    """
+    Read one history page without blocking the event loop, see latest.fetch_latest_page().
+
+    Args:
+        source (str): "modbus" or "mqtt".
+        key: Buffer key of the series.
+        query (dict): Base filter of the series.
+        params (dict): Result of history.parse_history_params().
+
+    Returns:
+        tuple: (documents, next cursor or None), newest first.
+    """
+    if MONGO_ASYNC and on_server_loop():
+        return await afetch_latest_page(get_async_series_collection(source), source, key, query, params)
+    # Not in the shared sync thread, so concurrent reads still overlap
+    return await sync_to_async(
+        lambda: fetch_latest_page(get_series_collection(source), source, key, query, params),
+        thread_sensitive=False,
+    )()
@@ -0,0 +1,229 @@
+"""
+Declarative MongoDB index set of the IoT_system project.
+
+``INDEXES`` lists the indexes every collection must have, ``ensure_indexes()``
+creates missing ones (createIndexes is a no-op for existing identical indexes),
+and ``check_queries()`` runs ``explain()`` on the queries issued by the views to
+verify that each one is answered from an index, without a collection scan or an
+in-memory sort.
+
+TTL indexes (retention.py) are declared here as well; a changed expireAfterSeconds
+is applied to the existing index with collMod.
+
+Applied by ``python manage.py mongo_indexes`` and, with MONGO_ENSURE_INDEXES=True,
+on ASGI startup.
+"""
+import os
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from .mongo import get_collection, get_database
+from .history import HISTORY_SORT, history_filter
+from .rollups import RESOLUTIONS, rollup_collection_name
+from .timeseries import (TIMESERIES_ENABLED, SERIES_SOURCES, TIME_FIELD, META_FIELD, timeseries_collection_name,
+                         ensure_timeseries_collection)
+from .retention import ROLLUP_RETENTION_DAYS, EXPIRE_FIELD, max_retention_seconds
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+MQTT_COLLECTION_NAME = os.getenv('MQTT_COLLECTION_NAME')
+MODBUS_COLLECTION_NAME = os.getenv('MODBUS_COLLECTION_NAME')
+TELEMETRY_COLLECTION_NAME = os.getenv('MQTT_TELEMETRY_COLLECTION_NAME', 'mqtt_telemetry')
+
+# Collection name -> indexes it must have
+INDEXES = {
+    # fetch_device_logs: latest values of one Modbus device
+    MODBUS_COLLECTION_NAME: [
+        IndexModel([("device_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="device_id_timestamp_id"),
+    ],
+    # MQTTDataMongoView: latest prices overall and per symbol
+    MQTT_COLLECTION_NAME: [
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id"),
+        IndexModel([("symbol", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="symbol_timestamp_id"),
+    ],
+    # Telemetry ingested from device status topics, read per device
+    TELEMETRY_COLLECTION_NAME: [
+        IndexModel([("device_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="device_id_timestamp_id"),
+        IndexModel([("serial_number", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="serial_number_timestamp_id"),
+    ],
+}
+# Rollups: one document per series and bucket, upserted by that key
+INDEXES.update({
+    rollup_collection_name(resolution): [
+        IndexModel([("series", ASCENDING), ("start", ASCENDING)], name="series_start", unique=True),
+    ]
+    for resolution in RESOLUTIONS
+})
+# Rollup retention: expire buckets by their start date
+INDEXES.update({
+    rollup_collection_name(resolution): INDEXES[rollup_collection_name(resolution)] + [
+        IndexModel([("start", ASCENDING)], name="start_ttl", expireAfterSeconds=int(days * 86400)),
+    ]
+    for resolution, days in ROLLUP_RETENTION_DAYS.items() if resolution in RESOLUTIONS
+})
+# Raw retention: writers set expire_at per series; time-series collections expire by collection TTL instead
+if not TIMESERIES_ENABLED:
+    for source, (collection_name, _) in SERIES_SOURCES.items():
+        if collection_name:
+            INDEXES[collection_name] = INDEXES[collection_name] + [
+                IndexModel([(EXPIRE_FIELD, ASCENDING)], name=f"{EXPIRE_FIELD}_ttl", expireAfterSeconds=0),
+            ]
+# Time-series collections: secondary indexes on the metadata key and time
+if TIMESERIES_ENABLED:
+    INDEXES.update({
+        timeseries_collection_name(source): [
+            IndexModel([(f"{META_FIELD}.{meta_fields[0]}", ASCENDING), (TIME_FIELD, DESCENDING)],
+                       name=f"{meta_fields[0]}_{TIME_FIELD}"),
+        ]
+        for source, (collection_name, meta_fields) in SERIES_SOURCES.items() if collection_name
+    })
+
+# A keyset position and time window used to explain paginated history queries
+_SAMPLE_CURSOR = (1700000000.0, ObjectId("655e0f00" + "0" * 16))
+_SAMPLE_WINDOW = {"start": 1690000000.0, "end": 1710000000.0}
+
+# Queries issued by the views: (description, collection name, filter, sort, limit)
+QUERY_CHECKS = [
+    ("fetch_device_logs", MODBUS_COLLECTION_NAME, history_filter({"device_id": 1}), HISTORY_SORT, 21),
+    ("fetch_device_logs next page", MODBUS_COLLECTION_NAME,
+     history_filter({"device_id": 1}, cursor=_SAMPLE_CURSOR, **_SAMPLE_WINDOW), HISTORY_SORT, 21),
+    ("MQTTDataMongoView", MQTT_COLLECTION_NAME, history_filter({}), HISTORY_SORT, 21),
+    ("MQTTDataMongoView next page", MQTT_COLLECTION_NAME,
+     history_filter({}, cursor=_SAMPLE_CURSOR, **_SAMPLE_WINDOW), HISTORY_SORT, 21),
+    ("MQTTDataMongoView by symbol", MQTT_COLLECTION_NAME, history_filter({"symbol": "BTC"}), HISTORY_SORT, 21),
+    ("telemetry by device", TELEMETRY_COLLECTION_NAME, history_filter({"device_id": 1}), HISTORY_SORT, 21),
+]
+
+# Plan stages meaning a query is not served by an index
+UNINDEXED_STAGES = {"COLLSCAN", "SORT"}
+
+
+def ensure_indexes():
+    """
+    Create the indexes of INDEXES that do not exist yet.
+    Collections whose name is not configured are skipped. With MONGO_TIMESERIES=True
+    the time-series collections are created first, since creating an index on a
+    missing collection would create a plain one.
+
+    Returns:
+        dict: Collection name -> names of the ensured indexes.
+    """
+    if TIMESERIES_ENABLED:
+        for source, (collection_name, _) in SERIES_SOURCES.items():
+            if collection_name:
+                ensure_timeseries_collection(source, max_retention_seconds(source))
+
+    ensured = {}
+    for collection_name, indexes in INDEXES.items():
+        if not collection_name:
+            continue
+        collection = get_collection(collection_name)
+        ensured[collection_name] = []
+        for index in indexes:
+            try:
+                ensured[collection_name].extend(collection.create_indexes([index]))
+            except OperationFailure as e:
+                # IndexOptionsConflict: a TTL index whose expireAfterSeconds changed
+                if e.code != 85 or "expireAfterSeconds" not in index.document:
+                    raise
+                get_database().command("collMod", collection_name, index={
+                    "name": index.document["name"],
+                    "expireAfterSeconds": index.document["expireAfterSeconds"],
+                })
+                ensured[collection_name].append(index.document["name"])
+    return ensured
+
+
+def missing_indexes():
+    """
+    Compare the declared indexes with those present in MongoDB.
+
+    Returns:
+        dict: Collection name -> names of declared indexes that do not exist.
+    """
+    missing = {}
+    for collection_name, indexes in INDEXES.items():
+        if not collection_name:
+            continue
+        existing = set(get_collection(collection_name).index_information())
+        names = [index.document["name"] for index in indexes if index.document["name"] not in existing]
+        if names:
+            missing[collection_name] = names
+    return missing
+
+
+def plan_stages(plan):
+    """
+    Collect the stage names of an explain() plan tree.
+
+    Args:
+        plan (dict): A winning plan, or any part of an explain() result.
+
+    Returns:
+        list: Stage names, from the root down.
+    """
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for key in ("queryPlan", "inputStage", "inputStages", "innerStage", "outerStage"):
+            if key in plan:
+                stages.extend(plan_stages(plan[key]))
+    elif isinstance(plan, list):
+        for child in plan:
+            stages.extend(plan_stages(child))
+    return stages
+
+
+def check_queries():
+    """
+    Explain the QUERY_CHECKS queries and report whether each one uses an index.
+
+    Returns:
+        list: Dicts with "query", "collection", "stages", "index" and "ok" for each check.
+    """
+    results = []
+    for description, collection_name, query, sort, limit in QUERY_CHECKS:
+        if not collection_name:
+            continue
+        explain = get_collection(collection_name).find(query).sort(sort).limit(limit).explain()
+        stages = plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        index = _index_name(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        results.append({
+            "query": description,
+            "collection": collection_name,
+            "stages": stages,
+            "index": index,
+            "ok": "IXSCAN" in stages and not UNINDEXED_STAGES.intersection(stages),
+        })
+    return results
+
+
+def _index_name(plan):
+    """
+    Return the name of the index scanned in a plan tree, if any.
+    """
+    if isinstance(plan, list):
+        for child in plan:
+            name = _index_name(child)
+            if name:
+                return name
+        return None
+    if not isinstance(plan, dict):
+        return None
+    if plan.get("stage") == "IXSCAN":
+        return plan.get("indexName")
+    for key in ("queryPlan", "inputStage", "inputStages", "innerStage", "outerStage"):
+        if key in plan:
+            name = _index_name(plan[key])
+            if name:
+                return name
+    return None
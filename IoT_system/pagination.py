@@ -0,0 +1,105 @@
+"""
+Cursor pagination, filtering and search of the device listings.
+
+Device lists are read one page at a time, ordered by primary key: the cursor
+encodes the last id of the previous page, so every page is one index range scan
+of ``limit`` rows however many devices exist, and no ``OFFSET`` is involved.
+
+Query parameters:
+    limit: Page size, at most DEVICE_MAX_PAGE_SIZE.
+    cursor: Taken from the "next" or "previous" link of the previous page.
+    is_active: "true" or "false".
+    search: Case-insensitive prefix of the view's search fields, e.g. name or host;
+        served by the functional Upper(...) text_pattern_ops indexes of the models.
+
+Responses are ``{"next": url, "previous": url, "results": [...]}``.
+"""
+import os
+from types import SimpleNamespace
+from dotenv import load_dotenv
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, SearchFilter
+from rest_framework.pagination import CursorPagination
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Devices per page when no limit is given
+DEVICE_PAGE_SIZE = int(os.getenv('DEVICE_PAGE_SIZE', 100))
+# Largest page size a client may request
+DEVICE_MAX_PAGE_SIZE = int(os.getenv('DEVICE_MAX_PAGE_SIZE', 1000))
+
+BOOLEAN_VALUES = {"true": True, "1": True, "false": False, "0": False}
+
+
+class DeviceCursorPagination(CursorPagination):
+    """Keyset pagination of device lists by primary key."""
+    page_size = DEVICE_PAGE_SIZE
+    max_page_size = DEVICE_MAX_PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = 'id'
+
+
+class ActiveStateFilter(BaseFilterBackend):
+    """Filters devices on ?is_active=true|false."""
+
+    @staticmethod
+    def parse(request):
+        """
+        Return the requested active state, or None if not filtered.
+
+        Raises:
+            ValidationError: If the value is not a boolean.
+        """
+        value = request.query_params.get('is_active')
+        if not value:
+            return None
+        if value.lower() not in BOOLEAN_VALUES:
+            raise ValidationError({"is_active": "Must be 'true' or 'false'."})
+        return BOOLEAN_VALUES[value.lower()]
+
+    def filter_queryset(self, request, queryset, view):
+        is_active = self.parse(request)
+        return queryset if is_active is None else queryset.filter(is_active=is_active)
+
+
+# Search fields are declared with the "^" (istartswith) prefix, which the prefix indexes serve
+DEVICE_FILTER_BACKENDS = [ActiveStateFilter, SearchFilter]
+
+
+def paginate_devices(request, queryset, search_fields, paginator=None):
+    """
+    Filter, search and paginate a device queryset in a function view, as the viewsets do.
+
+    Args:
+        request (Request): DRF request with the listing query parameters.
+        queryset (QuerySet): Devices, usually a values() projection including "id".
+        search_fields (list): Fields matched by the search parameter, e.g. ["^name", "^host"].
+        paginator (DeviceCursorPagination): Paginator to use, a new one by default.
+
+    Returns:
+        tuple: (rows of the page, paginator holding the next and previous links).
+    """
+    view = SimpleNamespace(search_fields=search_fields)
+    for backend in DEVICE_FILTER_BACKENDS:
+        queryset = backend().filter_queryset(request, queryset, view)
+    paginator = paginator or DeviceCursorPagination()
+    return paginator.paginate_queryset(queryset, request, view), paginator
+
+
+def validate_device_listing(request, paginator=None):
+    """
+    Check the listing query parameters without querying the database, e.g. before
+    computing an ETag.
+
+    Args:
+        request (Request): DRF request with the listing query parameters.
+        paginator (DeviceCursorPagination): Paginator whose cursor is checked, a new one by default.
+
+    Raises:
+        ValidationError: If is_active is invalid.
+        NotFound: If the cursor is invalid.
+    """
+    ActiveStateFilter.parse(request)
+    (paginator or DeviceCursorPagination()).decode_cursor(request)
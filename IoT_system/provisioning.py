@@ -0,0 +1,244 @@
+"""
+Bulk import of device metadata from CSV or NDJSON streams.
+
+The rows of an import are read one at a time from the stream and processed in
+batches of PROVISION_BATCH_SIZE:
+
+- every row is validated with the import serializer of the model, a
+  ModelSerializer without unique validators, so validation runs no queries;
+- the existing devices of the batch are looked up with one query on the key
+  fields (serial number for MQTT devices, host/port/slave id for Modbus devices);
+- new devices are inserted with one ``bulk_create``; existing ones are updated
+  with ``bulk_update`` of the provided columns when upserting, or reported as
+  errors otherwise. Hooks such as topic generation run on the whole batch first,
+  since the bulk methods skip ``save()`` and model signals.
+
+Each batch is written in its own transaction. The report counts created and
+updated devices and lists the errors per row (CSV line or NDJSON line number).
+
+CSV files start with a header row of field names; empty cells take the model
+default. NDJSON files hold one JSON object per line.
+"""
+import os
+import csv
+import time
+import codecs
+import orjson
+from dotenv import load_dotenv
+from django.db import IntegrityError, transaction
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Rows validated and written per batch (one lookup query and one bulk_create each)
+PROVISION_BATCH_SIZE = int(os.getenv('PROVISION_BATCH_SIZE', 1000))
+# Row errors listed in a report; further errors are only counted
+PROVISION_MAX_ERRORS = int(os.getenv('PROVISION_MAX_ERRORS', 1000))
+
+INPUTS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+class ProvisioningError(ValueError):
+    """Raised for an unreadable import stream or invalid import options."""
+
+
+def iter_rows(lines, input_format):
+    """
+    Parse an import stream into rows.
+
+    Args:
+        lines (iterable): Text lines of the stream.
+        input_format (str): "csv" or "ndjson".
+
+    Yields:
+        tuple: (line number, row dict or None, parse error or None).
+    """
+    if input_format not in ("csv", "ndjson"):
+        raise ProvisioningError(f"Unknown input format '{input_format}', use csv or ndjson.")
+    number = 0
+    try:
+        if input_format == "csv":
+            reader = csv.DictReader(lines)
+            for row in reader:
+                number = reader.line_num
+                if None in row:
+                    yield number, None, "More values than header fields."
+                    continue
+                yield number, {field: value for field, value in row.items() if value not in ("", None)}, None
+        else:
+            for number, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = orjson.loads(line)
+                except orjson.JSONDecodeError as e:
+                    yield number, None, f"Invalid JSON: {e}"
+                    continue
+                if not isinstance(row, dict):
+                    yield number, None, "Expected a JSON object."
+                    continue
+                yield number, row, None
+    except (csv.Error, UnicodeDecodeError) as e:
+        # The rest of the stream cannot be read; the rows before it are imported
+        yield number + 1, None, f"Unreadable input, import stopped: {e}"
+
+
+class DeviceImporter:
+    """
+    Validates and writes device rows in batches, creating or updating by key fields.
+    """
+
+    def __init__(self, serializer_class, key_fields, upsert=False, batch_size=PROVISION_BATCH_SIZE,
+                 prepare=None, after_write=None):
+        """
+        Args:
+            serializer_class: ModelSerializer validating a row, without unique validators.
+            key_fields (tuple): Fields identifying an existing device.
+            upsert (bool): Update existing devices instead of reporting them as errors.
+            batch_size (int): Rows per batch.
+            prepare (callable): Called with the model instances of a batch before they are written.
+            after_write (callable): Called once after the import if any device was written.
+        """
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+        self.key_fields = tuple(key_fields)
+        self.upsert = upsert
+        self.batch_size = batch_size
+        self.prepare = prepare
+        self.after_write = after_write
+        self.report = {"rows": 0, "created": 0, "updated": 0, "failed": 0, "errors": []}
+
+    def _error(self, number, errors):
+        self.report["failed"] += 1
+        if len(self.report["errors"]) < PROVISION_MAX_ERRORS:
+            self.report["errors"].append({"row": number, "errors": errors})
+
+    def _key(self, data):
+        # Key fields left out of a row take the model default, as the device would
+        return tuple(data[field] if field in data else self.model._meta.get_field(field).get_default()
+                     for field in self.key_fields)
+
+    def run(self, rows):
+        """
+        Import rows.
+
+        Args:
+            rows (iterable): (line number, row, parse error) tuples from iter_rows().
+
+        Returns:
+            dict: rows, created, updated, failed, errors (per row) and seconds.
+        """
+        started = time.monotonic()
+        batch = []
+        for number, row, error in rows:
+            self.report["rows"] += 1
+            if error:
+                self._error(number, {"non_field_errors": [error]})
+                continue
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch)
+                batch = []
+        if batch:
+            self._import_batch(batch)
+
+        if self.after_write and (self.report["created"] or self.report["updated"]):
+            self.after_write()
+        self.report["seconds"] = round(time.monotonic() - started, 3)
+        return self.report
+
+    def _import_batch(self, batch):
+        # Field validation only: no unique validators, so no query per row
+        valid = {}
+        for number, row in batch:
+            serializer = self.serializer_class(data=row)
+            if not serializer.is_valid():
+                self._error(number, serializer.errors)
+                continue
+            key = self._key(serializer.validated_data)
+            if key in valid:
+                self._error(number, {"non_field_errors": [f"Duplicate of row {valid[key][0]}."]})
+                continue
+            valid[key] = (number, serializer.validated_data)
+        if not valid:
+            return
+
+        # One query for the existing devices of the batch
+        first_field = self.key_fields[0]
+        existing = {
+            tuple(values): pk for pk, *values in self.model.objects.filter(
+                **{f"{first_field}__in": {key[0] for key in valid}}).values_list("pk", *self.key_fields)
+        }
+
+        new, updates, written = [], {}, []
+        for key, (number, data) in valid.items():
+            if key not in existing:
+                new.append(self.model(**data))
+            elif self.upsert:
+                # Rows with the same columns are updated together
+                updates.setdefault(tuple(sorted(data)), []).append(self.model(pk=existing[key], **data))
+            else:
+                self._error(number, {"non_field_errors": ["Device already exists."]})
+                continue
+            written.append(number)
+        if self.prepare:
+            self.prepare(new + [device for devices in updates.values() for device in devices])
+
+        try:
+            with transaction.atomic():
+                if new:
+                    self.model.objects.bulk_create(new, batch_size=self.batch_size)
+                for fields, devices in updates.items():
+                    update_fields = [field for field in fields if field not in self.key_fields]
+                    if update_fields:
+                        self.model.objects.bulk_update(devices, update_fields, batch_size=self.batch_size)
+        except IntegrityError as e:
+            # E.g. a concurrent import created the same serial numbers: report the rows of the batch write
+            for number in written:
+                self._error(number, {"non_field_errors": [f"Batch not written: {e}"]})
+            return
+        self.report["created"] += len(new)
+        self.report["updated"] += sum(len(devices) for devices in updates.values())
+
+
+def import_devices(lines, input_format, importer):
+    """
+    Import a device stream.
+
+    Args:
+        lines (iterable): Text lines of the stream.
+        input_format (str): "csv" or "ndjson".
+        importer (DeviceImporter): Importer of the device model.
+
+    Returns:
+        dict: Import report.
+    """
+    return importer.run(iter_rows(lines, input_format))
+
+
+def request_lines(request):
+    """
+    Return the body of a DRF request as text lines, read as a stream rather than
+    loaded into memory at once. The request parsers are bypassed.
+
+    Args:
+        request (Request): DRF request with a CSV or NDJSON body.
+
+    Returns:
+        tuple: (input format, iterator of lines).
+
+    Raises:
+        ProvisioningError: If the content type is not supported or the body is empty.
+    """
+    content_type = (request.content_type or "").split(";")[0].strip()
+    if content_type not in INPUTS:
+        raise ProvisioningError(f"Content-Type must be one of: {', '.join(INPUTS)}.")
+    stream = request.stream
+    if stream is None:
+        raise ProvisioningError("The request body is empty.")
+    return INPUTS[content_type], codecs.iterdecode(stream, "utf-8-sig")
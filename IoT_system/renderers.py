@@ -0,0 +1,124 @@
+"""
+orjson-based JSON rendering and parsing for the API.
+
+- ``ORJSONRenderer`` / ``ORJSONParser`` replace DRF's stock JSON renderer and parser
+  (configured in REST_FRAMEWORK). ObjectId, datetime, date, UUID and Decimal values
+  are serialized natively, so views can return MongoDB documents as they are.
+- ``ORJSONResponse`` replaces ``JsonResponse`` in plain Django views.
+- ``ValuesListMixin`` serves list actions of model viewsets from ``QuerySet.values()``,
+  skipping model instantiation and ModelSerializer field introspection, for models whose
+  fields serialize to the same JSON either way.
+"""
+from decimal import Decimal
+import orjson
+from bson import ObjectId
+from django.db import models
+from django.http import HttpResponse
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+
+
+# Model fields whose values() representation equals their ModelSerializer output
+# (auto and positive integer fields are IntegerField subclasses)
+PLAIN_FIELD_TYPES = (models.IntegerField, models.FloatField, models.BooleanField, models.CharField, models.TextField)
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    """
+    Serialize the types orjson does not handle natively.
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Promise):
+        # Lazy translation strings, e.g. in validation errors
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(data, indent=False):
+    """
+    Serialize data to JSON bytes with orjson and the project defaults.
+
+    Args:
+        data: Data to serialize.
+        indent (bool): Indent with two spaces.
+
+    Returns:
+        bytes: UTF-8 encoded JSON.
+    """
+    return orjson.dumps(data, default=_default, option=_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+
+
+class ORJSONRenderer(BaseRenderer):
+    """DRF renderer serializing responses with orjson."""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # "Accept: application/json; indent=4" asks for readable output, as with DRF's renderer
+        indent = bool(accepted_media_type and 'indent=' in accepted_media_type)
+        return dumps(data, indent=indent)
+
+
+class ORJSONParser(BaseParser):
+    """DRF parser decoding JSON request bodies with orjson."""
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as e:
+            raise ParseError(f"JSON parse error - {e}")
+
+
+class ORJSONResponse(HttpResponse):
+    """
+    JSON response serialized with orjson, a drop-in replacement for JsonResponse.
+    Unlike JsonResponse, lists are accepted without safe=False.
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+class ValuesListMixin:
+    """
+    List action of a ModelViewSet served from QuerySet.values().
+
+    Used when the serializer is a ModelSerializer with fields = '__all__' and every
+    model field is a PLAIN_FIELD_TYPES field; otherwise the regular serializer path is
+    taken. Filter backends and pagination apply to the values() queryset as usual.
+    """
+
+    def values_fields(self):
+        serializer_class = self.get_serializer_class()
+        meta = getattr(serializer_class, 'Meta', None)
+        if meta is None or getattr(meta, 'fields', None) != '__all__':
+            return None
+        fields = meta.model._meta.concrete_fields
+        if not all(isinstance(field, PLAIN_FIELD_TYPES) for field in fields):
+            return None
+        return [field.name for field in fields]
+
+    def list(self, request, *args, **kwargs):
+        fields = self.values_fields()
+        if fields is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).values(*fields)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(queryset))
@@ -0,0 +1,247 @@
+"""
+Retention of raw samples and rollups.
+
+Raw samples are kept RETENTION_DAYS days, overridable per source
+(RETENTION_<SOURCE>_DAYS) and per series (RETENTION_OVERRIDES, e.g.
+"modbus:3=365,mqtt:BTC=90"). Unset means kept forever. Expiry is tiered:
+
+- Writers stamp each raw document with ``expire_at`` (``stamp_expiry()``) and a
+  TTL index on it lets MongoDB delete expired samples, per series retention included.
+  Time-series collections expire by the collection-level expireAfterSeconds of the
+  longest retention of their source instead.
+- Rollups are written within seconds of the samples (see rollups.py), so the
+  minute/hour/day tier already holds the data when raw samples expire. Each rollup
+  resolution has its own TTL (ROLLUP_RETENTION_DAYS, e.g. "1m=30,1h=730").
+- The ``RetentionCompactor`` deletes what TTL cannot: samples stored before retention
+  was configured (no expire_at) and series retained shorter than their time-series
+  collection. It deletes in batches of RETENTION_BATCH_SIZE with a pause after each
+  batch and at most RETENTION_MAX_DELETES_PER_PASS documents per pass, so its I/O is
+  bounded, and skips series without rollups up to the cutoff (run rebuild_rollups
+  for those first). Each pass returns and logs a report of what it removed.
+
+TTL indexes are created by ``manage.py mongo_indexes``; the compactor runs with
+RETENTION_COMPACTOR=True on ASGI startup or once with ``manage.py compact_retention``.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+from .mongo import get_collection
+from .rollups import ROLLUPS_ENABLED, ROLLUP_SOURCES, rollup_collection_name, series_key
+from .timeseries import SERIES_SOURCES, get_series_collection
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_days(value):
+    return float(value) if value else None
+
+
+def _parse_mapping(value):
+    """
+    Parse "key=days,key=days" into a dict of floats.
+    """
+    mapping = {}
+    for item in (value or "").split(","):
+        if item.strip():
+            key, _, days = item.partition("=")
+            mapping[key.strip()] = float(days)
+    return mapping
+
+
+# Days raw samples are kept, unless overridden per source or series (unset: forever)
+RETENTION_DAYS = _parse_days(os.getenv('RETENTION_DAYS'))
+# Per source overrides, e.g. RETENTION_MQTT_DAYS=7
+SOURCE_RETENTION_DAYS = {
+    source: _parse_days(os.getenv(f'RETENTION_{source.upper()}_DAYS')) or RETENTION_DAYS
+    for source in SERIES_SOURCES
+}
+# Per series overrides, e.g. "modbus:3=365,mqtt:BTC=90"
+RETENTION_OVERRIDES = _parse_mapping(os.getenv('RETENTION_OVERRIDES'))
+# Days each rollup resolution is kept, e.g. "1m=30,1h=730" (unlisted: forever)
+ROLLUP_RETENTION_DAYS = _parse_mapping(os.getenv('ROLLUP_RETENTION_DAYS'))
+
+# Run the compactor in the background (ASGI startup)
+RETENTION_COMPACTOR = os.getenv('RETENTION_COMPACTOR') == 'True'
+# Seconds between compactor passes
+RETENTION_INTERVAL = float(os.getenv('RETENTION_INTERVAL', 3600))
+# Documents deleted per batch, and pause (seconds) after each batch
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', 1000))
+RETENTION_BATCH_PAUSE = float(os.getenv('RETENTION_BATCH_PAUSE', 0.5))
+# Upper bound of documents deleted in one pass; the rest is left for the next pass
+RETENTION_MAX_DELETES_PER_PASS = int(os.getenv('RETENTION_MAX_DELETES_PER_PASS', 100000))
+
+EXPIRE_FIELD = "expire_at"
+
+_compactor = None
+_compactor_lock = threading.Lock()
+
+
+def retention_days(source, key):
+    """
+    Return the raw retention of a series in days, or None if it is kept forever.
+
+    Args:
+        source (str): "modbus", "mqtt" or "telemetry".
+        key: Device primary key or symbol.
+    """
+    return RETENTION_OVERRIDES.get(series_key(source, key), SOURCE_RETENTION_DAYS.get(source))
+
+
+def max_retention_seconds(source):
+    """
+    Return the longest raw retention of any series of a source in seconds, or None
+    if some series are kept forever. Used as the TTL of time-series collections.
+    """
+    days = SOURCE_RETENTION_DAYS.get(source)
+    if days is None:
+        return None
+    overrides = [value for key, value in RETENTION_OVERRIDES.items() if key.startswith(f"{source}:")]
+    return int(max([days, *overrides]) * 86400)
+
+
+def stamp_expiry(source, key, document):
+    """
+    Set the expire_at date of a raw document from its timestamp and the series retention.
+    Documents of series kept forever are left unchanged.
+
+    Args:
+        source (str): "modbus", "mqtt" or "telemetry".
+        key: Device primary key or symbol.
+        document (dict): Sample with an epoch-seconds "timestamp".
+
+    Returns:
+        dict: The document.
+    """
+    days = retention_days(source, key)
+    if days is not None:
+        document[EXPIRE_FIELD] = datetime.fromtimestamp(document["timestamp"] + days * 86400, tz=timezone.utc)
+    return document
+
+
+class RetentionCompactor:
+    """
+    Deletes expired raw samples that TTL indexes do not cover, with bounded I/O.
+    """
+
+    def __init__(self, interval=RETENTION_INTERVAL, batch_size=RETENTION_BATCH_SIZE,
+                 batch_pause=RETENTION_BATCH_PAUSE, max_deletes=RETENTION_MAX_DELETES_PER_PASS):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.max_deletes = max_deletes
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.last_report = None
+
+    def start(self):
+        """
+        Start the background thread running a pass every interval seconds.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="retention-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_pass()
+            except Exception as e:
+                logger.error("Retention pass failed: %s", e)
+            self._stop_event.wait(self.interval)
+
+    def run_pass(self, now=None):
+        """
+        Delete the raw samples older than the retention of their series.
+
+        Args:
+            now (float): Reference time, defaults to the current time.
+
+        Returns:
+            dict: "deleted" per series, "skipped" series without rollups, totals and duration.
+        """
+        now = time.time() if now is None else now
+        started = time.monotonic()
+        report = {"deleted": {}, "skipped": [], "total": 0, "complete": True}
+        budget = self.max_deletes
+
+        for source, (collection_name, _) in SERIES_SOURCES.items():
+            if not collection_name or source not in ROLLUP_SOURCES:
+                continue
+            key_field = ROLLUP_SOURCES[source][0]
+            collection = get_series_collection(source)
+            for key in collection.distinct(key_field):
+                days = retention_days(source, key)
+                if days is None:
+                    continue
+                if budget <= 0 or self._stop_event.is_set():
+                    report["complete"] = False
+                    break
+                cutoff = now - days * 86400
+                expired = dict({key_field: key}, timestamp={"$lt": cutoff})
+                if not list(collection.find(expired, {"_id": 1}).limit(1)):
+                    continue
+                series = series_key(source, key)
+                if ROLLUPS_ENABLED and not self._has_rollups(series, cutoff):
+                    report["skipped"].append(series)
+                    continue
+                deleted = self._delete_batches(collection, expired, budget)
+                if deleted:
+                    report["deleted"][series] = deleted
+                    report["total"] += deleted
+                    budget -= deleted
+
+        report["seconds"] = round(time.monotonic() - started, 3)
+        self.last_report = report
+        logger.info("Retention pass removed %s samples of %s series in %ss%s", report["total"],
+                    len(report["deleted"]), report["seconds"], "" if report["complete"] else " (budget reached)")
+        if report["skipped"]:
+            logger.warning("Retention skipped series without rollups: %s", ", ".join(report["skipped"]))
+        return report
+
+    def _has_rollups(self, series, cutoff):
+        """
+        Return whether the coarsest rollup holds the series before the cutoff.
+        """
+        collection = get_collection(rollup_collection_name("1d"))
+        return collection.find_one({"series": series,
+                                    "start": {"$lt": datetime.fromtimestamp(cutoff, tz=timezone.utc)}},
+                                   {"_id": 1}) is not None
+
+    def _delete_batches(self, collection, query, budget):
+        deleted = 0
+        while deleted < budget and not self._stop_event.is_set():
+            limit = min(self.batch_size, budget - deleted)
+            ids = [document["_id"] for document in collection.find(query, {"_id": 1}).limit(limit)]
+            if not ids:
+                break
+            deleted += collection.delete_many({"_id": {"$in": ids}}).deleted_count
+            # Throttle: leave the disk and the oplog to the writers between batches
+            self._stop_event.wait(self.batch_pause)
+        return deleted
+
+
+def get_compactor():
+    """
+    Return the process-wide retention compactor (not started).
+    """
+    global _compactor
+    with _compactor_lock:
+        if _compactor is None:
+            _compactor = RetentionCompactor()
+    return _compactor
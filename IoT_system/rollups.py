@@ -0,0 +1,337 @@
+"""
+Incrementally maintained rollups of device values and prices.
+
+Writers report each sample with ``record_sample()``. The process-wide
+``RollupWriter`` merges samples per series and bucket in memory and flushes them
+every ROLLUP_FLUSH_INTERVAL seconds as one unordered ``bulk_write`` of upserts
+into the minute, hour and day rollup collections. Each upsert uses ``$inc`` for
+count/sum, ``$min``/``$max`` for the extremes, and ``$max`` on a {t, v} document
+for the latest value. Merging is order-independent, so several processes can
+feed the same series.
+
+``query_rollups()`` is the query router: it picks the coarsest rollup that is
+not coarser than the requested interval and re-buckets it in MongoDB. A year at
+daily resolution is then a few hundred small documents instead of a raw scan.
+
+Rollup document:
+    {"series": "modbus:3", "start": <bucket start datetime, UTC>,
+     "count": n, "sum": s, "min": x, "max": y, "last": {"t": <epoch seconds>, "v": value}}
+"""
+import os
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .mongo import get_collection
+from .timeseries import get_series_collection
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Rollups can be switched off per deployment
+ROLLUPS_ENABLED = os.getenv('ROLLUPS_ENABLED', 'True') == 'True'
+# Interval (seconds) at which buffered rollup updates are written
+ROLLUP_FLUSH_INTERVAL = float(os.getenv('ROLLUP_FLUSH_INTERVAL', 1))
+# Rollup collection names are <prefix>_<resolution>
+ROLLUP_COLLECTION_PREFIX = os.getenv('ROLLUP_COLLECTION_PREFIX', 'rollup')
+
+# Resolution name -> bucket size in seconds, finest first
+RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+
+# Sample source (see timeseries.SERIES_SOURCES) -> (series key field, value field), used to rebuild rollups
+ROLLUP_SOURCES = {
+    "modbus": ("device_id", "value"),
+    "mqtt": ("symbol", "priceUsd"),
+    "telemetry": ("device_id", "value"),
+}
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def rollup_collection_name(resolution):
+    """
+    Return the collection name of a rollup resolution, e.g. "rollup_1h".
+    """
+    return f"{ROLLUP_COLLECTION_PREFIX}_{resolution}"
+
+
+def series_key(source, key):
+    """
+    Return the series identifier of a sample source, e.g. series_key("modbus", 3) -> "modbus:3".
+
+    Args:
+        source (str): "modbus", "mqtt" or "telemetry".
+        key: Device primary key or symbol.
+    """
+    return f"{source}:{key}"
+
+
+def _merge(bucket, timestamp, value):
+    """
+    Fold one sample into an in-memory bucket aggregate.
+    """
+    if bucket is None:
+        return {"count": 1, "sum": value, "min": value, "max": value, "last": (timestamp, value)}
+    bucket["count"] += 1
+    bucket["sum"] += value
+    bucket["min"] = min(bucket["min"], value)
+    bucket["max"] = max(bucket["max"], value)
+    if timestamp >= bucket["last"][0]:
+        bucket["last"] = (timestamp, value)
+    return bucket
+
+
+class RollupWriter:
+    """
+    Buffers samples as per-bucket partial aggregates and writes them with bulk upserts
+    from a background thread, so the sample writers never wait for MongoDB.
+    """
+
+    def __init__(self, flush_interval=ROLLUP_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        # (resolution, series, bucket start) -> partial aggregate
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.metrics = {"samples": 0, "upserts": 0, "write_errors": 0}
+
+    def start(self):
+        """
+        Start the flush thread.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="rollup-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        """
+        Stop the flush thread after writing the buffered updates.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def add(self, series, timestamp, value):
+        """
+        Add a sample to the minute, hour and day buckets of a series.
+
+        Args:
+            series (str): Series identifier from series_key().
+            timestamp (float): Sample time, epoch seconds.
+            value (float): Sample value.
+        """
+        with self._lock:
+            self.metrics["samples"] += 1
+            for resolution, size in RESOLUTIONS.items():
+                key = (resolution, series, timestamp - timestamp % size)
+                self._pending[key] = _merge(self._pending.get(key), timestamp, value)
+
+    def flush(self):
+        """
+        Write the buffered bucket updates as one unordered bulk upsert per resolution.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        requests = {resolution: [] for resolution in RESOLUTIONS}
+        for (resolution, series, start), bucket in pending.items():
+            requests[resolution].append(UpdateOne(
+                {"series": series, "start": datetime.fromtimestamp(start, tz=timezone.utc)},
+                {
+                    "$inc": {"count": bucket["count"], "sum": bucket["sum"]},
+                    "$min": {"min": bucket["min"]},
+                    "$max": {"max": bucket["max"], "last": {"t": bucket["last"][0], "v": bucket["last"][1]}},
+                },
+                upsert=True,
+            ))
+
+        for resolution, updates in requests.items():
+            if updates:
+                self._write(rollup_collection_name(resolution), updates)
+
+    def _write(self, collection_name, updates):
+        collection = get_collection(collection_name)
+        try:
+            try:
+                collection.bulk_write(updates, ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                # Concurrent upserts of a new bucket can race on the unique index, those are retried once
+                if any(error.get("code") != 11000 for error in errors):
+                    raise
+                collection.bulk_write([updates[error["index"]] for error in errors], ordered=False)
+            self.metrics["upserts"] += len(updates)
+        except Exception as e:
+            self.metrics["write_errors"] += 1
+            logger.error("Failed to write %s rollup updates to %s: %s", len(updates), collection_name, e)
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+
+def get_rollup_writer():
+    """
+    Return the process-wide rollup writer, starting it on first use and again after fork().
+
+    Returns:
+        RollupWriter: The running writer.
+    """
+    global _writer, _writer_pid
+    if _writer is not None and _writer_pid == os.getpid():
+        return _writer
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            writer = RollupWriter()
+            writer.start()
+            # Write the buffered updates on interpreter exit
+            atexit.register(writer.stop)
+            _writer, _writer_pid = writer, os.getpid()
+    return _writer
+
+
+def record_sample(source, key, timestamp, value):
+    """
+    Feed one sample into the rollups, if enabled. Never raises, so it is safe in writer loops.
+
+    Args:
+        source (str): "modbus", "mqtt" or "telemetry".
+        key: Device primary key or symbol.
+        timestamp (float): Sample time, epoch seconds.
+        value (float): Sample value; non-numeric values are ignored.
+    """
+    if not ROLLUPS_ENABLED or isinstance(value, bool) or not isinstance(value, (int, float)):
+        return
+    try:
+        get_rollup_writer().add(series_key(source, key), timestamp, value)
+    except Exception as e:
+        logger.error("Failed to record rollup sample: %s", e)
+
+
+def select_resolution(interval):
+    """
+    Pick the coarsest rollup resolution whose bucket size does not exceed the interval.
+
+    Args:
+        interval (float): Requested bucket size in seconds.
+
+    Returns:
+        str or None: Resolution name, or None if the interval is finer than all rollups.
+    """
+    selected = None
+    for resolution, size in RESOLUTIONS.items():
+        if size <= interval:
+            selected = resolution
+    return selected
+
+
+def query_rollups(series, start, end, interval):
+    """
+    Return min/max/avg/last/count per interval bucket from the best-fitting rollup.
+
+    Rollup buckets are assigned to the requested bucket containing their start, so
+    bucket edges are accurate to the rollup resolution.
+
+    Args:
+        series (str): Series identifier from series_key().
+        start (float): Inclusive lower time bound (epoch seconds).
+        end (float): Exclusive upper time bound.
+        interval (float): Requested bucket size in seconds.
+
+    Returns:
+        list or None: Buckets like aggregation.aggregate_buckets(), or None if no rollup fits.
+    """
+    resolution = select_resolution(interval)
+    if resolution is None:
+        return None
+    size = RESOLUTIONS[resolution]
+    # Whole rollup buckets overlapping the window
+    first = datetime.fromtimestamp(start - start % size, tz=timezone.utc)
+    last = datetime.fromtimestamp(end, tz=timezone.utc)
+    epoch_ms = {"$toLong": "$start"}
+    seconds = {"$divide": [epoch_ms, 1000]}
+    pipeline = [
+        {"$match": {"series": series, "start": {"$gte": first, "$lt": last}}},
+        {"$sort": {"start": ASCENDING}},
+        {"$group": {
+            "_id": {"$subtract": [seconds, {"$mod": [seconds, interval]}]},
+            "min": {"$min": "$min"},
+            "max": {"$max": "$max"},
+            "sum": {"$sum": "$sum"},
+            "count": {"$sum": "$count"},
+            "last": {"$max": "$last"},
+        }},
+        {"$sort": {"_id": ASCENDING}},
+        {"$project": {
+            "_id": 0, "t": "$_id", "min": 1, "max": 1, "count": 1,
+            "avg": {"$divide": ["$sum", "$count"]},
+            "last": "$last.v",
+        }},
+    ]
+    return list(get_collection(rollup_collection_name(resolution)).aggregate(pipeline))
+
+
+def rebuild_rollups(source, start=None, end=None):
+    """
+    Recompute the rollups of a source from its raw collection, e.g. for data written
+    before rollups were enabled. Buckets in the window are replaced, so the window
+    should end before samples that are still being written.
+
+    Args:
+        source (str): Key of ROLLUP_SOURCES.
+        start (float): Inclusive lower time bound (epoch seconds), or None.
+        end (float): Exclusive upper time bound, or None.
+    """
+    key_field, value_field = ROLLUP_SOURCES[source]
+    match = {value_field: {"$type": "number"}}
+    time_range = {}
+    if start is not None:
+        time_range["$gte"] = start
+    if end is not None:
+        time_range["$lt"] = end
+    if time_range:
+        match["timestamp"] = time_range
+
+    value = f"${value_field}"
+    for resolution, size in RESOLUTIONS.items():
+        get_series_collection(source).aggregate([
+            {"$match": match},
+            {"$sort": {"timestamp": ASCENDING}},
+            {"$group": {
+                "_id": {"key": f"${key_field}", "start": {"$subtract": ["$timestamp", {"$mod": ["$timestamp", size]}]}},
+                "count": {"$sum": 1},
+                "sum": {"$sum": value},
+                "min": {"$min": value},
+                "max": {"$max": value},
+                "last": {"$last": {"t": "$timestamp", "v": value}},
+            }},
+            {"$project": {
+                "_id": 0,
+                "series": {"$concat": [f"{source}:", {"$toString": "$_id.key"}]},
+                "start": {"$toDate": {"$multiply": ["$_id.start", 1000]}},
+                "count": 1, "sum": 1, "min": 1, "max": 1, "last": 1,
+            }},
+            {"$merge": {
+                "into": rollup_collection_name(resolution),
+                "on": ["series", "start"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }},
+        ], allowDiskUse=True)
+        logger.info("Rebuilt %s rollups of %s", resolution, source)
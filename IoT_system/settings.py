@@ -22,6 +22,8 @@ postgres_db = os.getenv('POSTGRES_DB')
 postgres_user = os.getenv("POSTGRES_USER")
 postgres_password = os.getenv('POSTGRES_PASSWORD')
 debug_mode = os.getenv('DEBUG') == 'True'
+log_level = os.getenv('LOG_LEVEL', 'INFO')
+log_format = os.getenv('LOG_FORMAT', 'text')
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -48,6 +50,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # OpClass expression indexes of the device listings
     'rest_framework',  # Django REST framework for building the REST API
     'data_api',  # App for data handling (MongoDB, MQTT)
     'modbus',  # App for modbus device metadata
@@ -87,6 +90,9 @@ TEMPLATES = [
     },
 ]
 
+# Live dashboard updates (api/events/) and the Motor-backed async views are ASGI-only:
+# serve IoT_system.asgi:application (e.g. with uvicorn) for them. Under WSGI each open
+# event stream would hold a worker thread, so api/events/ answers 503 and the dashboards poll.
 WSGI_APPLICATION = 'IoT_system.wsgi.application'
 
 
@@ -117,6 +123,46 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
+    # orjson rendering and parsing, with native ObjectId and datetime support (see IoT_system/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'IoT_system.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'IoT_system.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Logging
+# Records are formatted and written on a background thread (see IoT_system/logs.py).
+# "sampling" keeps one of every N DEBUG/INFO records of high-rate loggers.
+
+LOGGING_CONFIG = 'IoT_system.logs.configure_logging'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'text': {
+            'format': '%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+        },
+        'json': {
+            '()': 'IoT_system.logs.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': log_format,
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': log_level,
+    },
+    'sampling': {},
 }
 
 # Password validation
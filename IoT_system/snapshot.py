@@ -0,0 +1,124 @@
+"""
+Version counters and ETags of the dashboard snapshot endpoints.
+
+Each dashboard loads its whole state (statuses, device list, latest readings) from
+one snapshot endpoint. Writers bump a named version counter in MongoDB whenever a
+part of that state changes (``bump_version()``), e.g. "modbus:devices" on device
+saves. Series written on every poll cycle are not counted, which would add a write
+per sample; their newest stored sample (``latest_position()``) identifies their
+latest page instead. A snapshot's ETag is a hash of the counters and positions it
+depends on, the process-local statuses it includes and its parameters, so it is
+computed with indexed reads only.
+
+Snapshot views are wrapped in ``snapshot_condition()``, Django's ``condition()``
+decorator with such an ETag: a poll whose If-None-Match matches is answered
+``304 Not Modified`` without reading any data. Counters live in MongoDB rather than in memory, so every worker
+process sees the bumps of the others.
+"""
+import os
+import hashlib
+import logging
+from functools import wraps
+from dotenv import load_dotenv
+from django.views.decorators.http import condition
+from pymongo.errors import PyMongoError
+
+from .mongo import get_collection
+from .history import HISTORY_SORT
+from .renderers import dumps
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Collection holding one {"_id": name, "version": n} document per counter
+VERSIONS_COLLECTION = os.getenv('SNAPSHOT_VERSIONS_COLLECTION', 'versions')
+
+
+def bump_version(name):
+    """
+    Increment a version counter. Never raises, so it is safe in writer loops;
+    a failed bump is logged and only delays the next 200 response of a poll.
+
+    Args:
+        name (str): Counter name, e.g. "modbus:devices".
+    """
+    try:
+        get_collection(VERSIONS_COLLECTION).update_one({"_id": name}, {"$inc": {"version": 1}}, upsert=True)
+    except PyMongoError as e:
+        logger.error("Failed to bump version %s: %s", name, e)
+
+
+def get_versions(names):
+    """
+    Read version counters with one query.
+
+    Args:
+        names (list): Counter names.
+
+    Returns:
+        dict: Counter name -> version, 0 for counters never bumped.
+    """
+    versions = dict.fromkeys(names, 0)
+    for document in get_collection(VERSIONS_COLLECTION).find({"_id": {"$in": list(names)}}):
+        versions[document["_id"]] = document["version"]
+    return versions
+
+
+def latest_position(collection, query):
+    """
+    Return the position of the newest sample of a series, read from the history index.
+
+    Args:
+        collection: Sample collection, e.g. from get_series_collection().
+        query (dict): Base filter of the series, e.g. {"device_id": 1}.
+
+    Returns:
+        list or None: [timestamp, _id as str] of the newest sample, None for an empty series.
+    """
+    for document in collection.find(query, {"_id": 1, "timestamp": 1}).sort(HISTORY_SORT).limit(1):
+        return [document["timestamp"], str(document["_id"])]
+    return None
+
+
+def snapshot_etag(names, state=None, params=None):
+    """
+    Compute the strong ETag of a snapshot.
+
+    Args:
+        names (list): Version counters the snapshot depends on.
+        state (dict): Process-local values included in the snapshot, e.g. running flags.
+        params (dict): Request parameters that select the snapshot content.
+
+    Returns:
+        str: ETag value without quotes, as expected by django.views.decorators.http.condition.
+    """
+    content = dumps([get_versions(names), state or {}, params or {}])
+    return hashlib.sha1(content).hexdigest()
+
+
+def snapshot_condition(etag_func):
+    """
+    Decorator applying Django's condition() with etag_func to a snapshot view,
+    keeping the ETag off error responses: condition() tags every GET response, and
+    a tagged error would be revalidated to 304 Not Modified by the next poll.
+
+    Args:
+        etag_func (callable): Returns the ETag of a request, or None for invalid parameters.
+
+    Returns:
+        callable: The view decorator.
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func)(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code >= 400 and response.has_header("ETag"):
+                del response["ETag"]
+            return response
+        return inner
+    return decorator
@@ -1,8 +1,25 @@
 const csrftoken = document.querySelector('[name=csrf-token]').content;
 
-async function fetchDevices() {
-    const res = await fetch('/modbus/api/devices/');
-    const devices = await res.json();
+// ETag of the last snapshot, sent back so unchanged polls are answered 304 Not Modified
+let modbusSnapshotETag = null;
+// Device whose logs are shown, chosen with the refresh button
+let logsDeviceId = null;
+// Device page: search prefix, cursor of the page shown and cursors of its neighbours
+let deviceSearch = '';
+let deviceCursor = null;
+let devicesNext = null;
+let devicesPrevious = null;
+
+function cursorOf(link) {
+    return link ? new URL(link).searchParams.get('cursor') : null;
+}
+
+function showDevicePage(cursor) {
+    deviceCursor = cursor;
+    refreshModbus();
+}
+
+function renderDevices(devices) {
     const tbody = document.querySelector('#devices-table tbody');
     tbody.innerHTML = '';
 
@@ -24,12 +41,57 @@ async function fetchDevices() {
         });
 }
 
+async function loadActiveDevices() {
+    // One page of the active devices matching the search prefix, not the whole table
+    const search = document.getElementById('active-device-search')?.value.trim();
+    const params = new URLSearchParams(search ? { search } : {});
+    const res = await fetch(`/modbus/api/devices/active/?${params}`, { cache: 'no-store' });
+    if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+    renderActiveDevices((await res.json()).results);
+}
+
+function renderActiveDevices(devices) {
+    const deviceSelect = document.getElementById('device-select');
+    const selected = deviceSelect.value;
+
+    if (devices.length === 0) {
+        deviceSelect.innerHTML = '<option disabled>No active devices</option>';
+        return;
+    }
+
+    deviceSelect.innerHTML = devices.map(device =>
+        `<option value="${device.id}">${device.name}</option>`
+    ).join('');
+    // Keep the user's choice across refreshes
+    if (devices.some(device => String(device.id) === selected)) deviceSelect.value = selected;
+}
+
+function renderLogs(logs) {
+    const tableBody = document.querySelector('#logs-table tbody');
+    const logsContainer = document.getElementById('logs-container'); // Optional message container
+
+    tableBody.innerHTML = '';
+    logsContainer.innerHTML = logs.length === 0 ? '<p>No logs found for this device.</p>' : '';
+
+    logs.forEach(log => {
+        const row = document.createElement('tr');
+        const timestamp = new Date(log.timestamp * 1000).toLocaleString();
+        const value = JSON.stringify(log.value);
+
+        row.innerHTML = `
+            <td>${timestamp}</td>
+            <td>${value}</td>
+        `;
+        tableBody.appendChild(row);
+    });
+}
+
 async function startDevice(id) {
     await fetch(`/modbus/api/devices/${id}/start/`, {
         method: 'POST',
         headers: { 'X-CSRFToken': csrftoken },
     });
-    await refreshAll();
+    await refreshModbus();
 }
 
 async function stopDevice(id) {
@@ -37,15 +99,7 @@ async function stopDevice(id) {
         method: 'POST',
         headers: { 'X-CSRFToken': csrftoken },
     });
-    await refreshAll();
-}
-
-async function fetchServerStatus() {
-    const res = await fetch('/modbus/api/server/status/');
-    const { running } = await res.json();
-    const label = document.getElementById('server_status');
-    label.textContent = running ? "Running" : "Stopped";
-    label.className = `status-label ${running ? 'running' : 'stopped'}`;
+    await refreshModbus();
 }
 
 async function startServer() {
@@ -53,7 +107,7 @@ async function startServer() {
         method: 'POST',
         headers: { 'X-CSRFToken': csrftoken },
     });
-    await refreshAll();
+    await refreshModbus();
 }
 
 async function stopServer() {
@@ -61,80 +115,102 @@ async function stopServer() {
         method: 'POST',
         headers: { 'X-CSRFToken': csrftoken },
     });
-    await refreshAll();
+    await refreshModbus();
 }
 
-async function refreshAll() {
-    await fetchDevices();
-    await fetchServerStatus();
+async function refreshModbus() {
+    // The whole dashboard in one request, instead of one per table
+    const params = new URLSearchParams();
+    if (logsDeviceId) params.set('device', logsDeviceId);
+    if (deviceSearch) params.set('search', deviceSearch);
+    if (deviceCursor) params.set('cursor', deviceCursor);
+    const url = `/modbus/api/snapshot/?${params}`;
+    const res = await fetch(url, {
+        cache: 'no-store',
+        headers: modbusSnapshotETag ? { 'If-None-Match': modbusSnapshotETag } : {},
+    });
+    if (res.status === 304) return; // Nothing changed since the last snapshot
+    if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+
+    modbusSnapshotETag = res.headers.get('ETag');
+    const snapshot = await res.json();
+    renderDevices(snapshot.devices);
+    devicesNext = cursorOf(snapshot.devices_next);
+    devicesPrevious = cursorOf(snapshot.devices_previous);
+    document.getElementById('devices-next').disabled = !devicesNext;
+    document.getElementById('devices-previous').disabled = !devicesPrevious;
+    setServerStatus(snapshot.server.running);
+    if (logsDeviceId) renderLogs(snapshot.logs);
 }
 
-refreshAll();
-setInterval(refreshAll, 5000); // Auto-refresh every 5 seconds
-
-document.addEventListener('DOMContentLoaded', async () => {
-    const deviceSelect = document.getElementById('device-select');
-
-    try {
-        const response = await fetch('/modbus/api/devices/active/');
-        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+function setServerStatus(running) {
+    const label = document.getElementById('server_status');
+    label.textContent = running ? "Running" : "Stopped";
+    label.className = `status-label ${running ? 'running' : 'stopped'}`;
+}
 
-        const devices = await response.json();
+const MODBUS_LIVE_ROWS = 20;
 
-        if (devices.length === 0) {
-            deviceSelect.innerHTML = '<option disabled>No active devices</option>';
-        return;
-        }
+function prependReading(reading) {
+    // Only the logs of the device currently shown
+    if (String(reading.device_id) !== logsDeviceId) return;
+    const tableBody = document.querySelector('#logs-table tbody');
+    const row = document.createElement('tr');
+    row.innerHTML = `
+        <td>${new Date(reading.timestamp * 1000).toLocaleString()}</td>
+        <td>${JSON.stringify(reading.value)}</td>
+    `;
+    tableBody.prepend(row);
+    while (tableBody.rows.length > MODBUS_LIVE_ROWS) tableBody.deleteRow(-1);
+}
 
-    deviceSelect.innerHTML = devices.map(device =>
-        `<option value="${device.id}">${device.name}</option>`
-    ).join('');
+function connectModbusEvents() {
+    // Server push of readings and status changes, instead of polling every 5 seconds
+    const source = new EventSource('/api/events/?channels=modbus');
+    source.addEventListener('reading', e => prependReading(JSON.parse(e.data)));
+    source.addEventListener('device_status', () => refreshModbus());
+    source.addEventListener('server_status', e => setServerStatus(JSON.parse(e.data).running));
+    // The stream is only served under ASGI (503 otherwise): poll instead
+    source.addEventListener('error', () => {
+        if (source.readyState === EventSource.CLOSED) setInterval(refreshModbus, 5000);
+    });
+    // Missed events could not be replayed: reload the state
+    source.addEventListener('reset', () => {
+        refreshModbus();
+        loadActiveDevices();
+    });
+}
 
-    } catch (error) {
-        console.error('Failed to load devices:', error);
-        deviceSelect.innerHTML = '<option disabled>Error loading devices</option>';
+// Both dashboard scripts are loaded by base.html, start only on the Modbus page
+if (document.getElementById('devices-table')) {
+    refreshModbus();
+    loadActiveDevices();
+    if (window.EventSource) {
+        connectModbusEvents();
+        setInterval(refreshModbus, 60000); // Safety refresh
+    } else {
+        setInterval(refreshModbus, 5000); // Auto-refresh every 5 seconds
     }
-});
-
+}
 
-document.getElementById('refresh-btn').addEventListener('click', async () => {
-    const deviceSelect = document.getElementById('device-select');
-    const deviceId = deviceSelect.value;
+document.getElementById('device-search')?.addEventListener('input', event => {
+    // The search starts again from the first page
+    deviceSearch = event.target.value.trim();
+    showDevicePage(null);
+});
 
-    const tableBody = document.querySelector('#logs-table tbody');
-    const logsContainer = document.getElementById('logs-container'); // Optional message container
+document.getElementById('active-device-search')?.addEventListener('input', () => loadActiveDevices());
 
-    // Clear previous table data
-    tableBody.innerHTML = '';
+document.getElementById('refresh-btn')?.addEventListener('click', async () => {
+    const logsContainer = document.getElementById('logs-container');
+    logsDeviceId = document.getElementById('device-select').value || null;
+    document.querySelector('#logs-table tbody').innerHTML = '';
     logsContainer.innerHTML = 'Loading...';
 
     try {
-        const response = await fetch(`/modbus/api/devices/${deviceId}/logs/`);
-        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-
-        const logs = await response.json();
-
-        logsContainer.innerHTML = ''; // Clear loading or previous messages
-
-    if (logs.length === 0) {
-        logsContainer.innerHTML = '<p>No logs found for this device.</p>';
-        return;
-    }
-
-    // Populate table
-    logs.forEach(log => {
-        const row = document.createElement('tr');
-        const timestamp = new Date(log.timestamp * 1000).toLocaleString();
-        const value = JSON.stringify(log.value);
-
-        row.innerHTML = `
-            <td>${timestamp}</td>
-            <td>${value}</td>
-        `;
-        tableBody.appendChild(row);
-    });
-
+        modbusSnapshotETag = null;
+        await refreshModbus();
     } catch (error) {
         logsContainer.innerHTML = `<p style="color:red;">Failed to load logs: ${error.message}</p>`;
     }
-});
\ No newline at end of file
+});
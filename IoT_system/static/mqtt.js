@@ -15,20 +15,12 @@ function getCookie(name) {
     return cookieValue;
 }
 
-async function fetchPublisherStatus() {
-    const res = await fetch('/mqtt/api/publisher/status/');
-    const { running } = await res.json();
-    const label = document.getElementById('mqtt_publisher_status');
-    label.textContent = running ? "Running" : "Stopped";
-    label.className = `status-label ${running ? 'running' : 'stopped'}`;
-}
-
 async function startPublisher() {
     await fetch('/mqtt/api/publisher/start/', {
         method: 'POST',
         headers: { 'X-CSRFToken': csrftoken },
         });
-    await refreshAll();
+    await refreshMqtt();
 }
 
 async function stopPublisher() {
@@ -36,15 +28,7 @@ async function stopPublisher() {
         method: 'POST',
         headers: { 'X-CSRFToken': csrftoken },
         });
-    await refreshAll();
-}
-
-async function fetchSubscriberStatus() {
-    const res = await fetch('/mqtt/api/subscriber/status/');
-    const { running } = await res.json();
-    const label = document.getElementById('mqtt_subscriber_status');
-    label.textContent = running ? "Running" : "Stopped";
-    label.className = `status-label ${running ? 'running' : 'stopped'}`;
+    await refreshMqtt();
 }
 
 async function startSubscriber() {
@@ -52,7 +36,7 @@ async function startSubscriber() {
         method: 'POST',
         headers: { 'X-CSRFToken': csrftoken },
         });
-    await refreshAll();
+    await refreshMqtt();
 }
 
 async function stopSubscriber() {
@@ -60,40 +44,39 @@ async function stopSubscriber() {
         method: 'POST',
         headers: { 'X-CSRFToken': csrftoken },
         });
-    await refreshAll();
+    await refreshMqtt();
 }
 
-async function fetchData() {
+function renderData(data) {
     const tableBody = document.querySelector("#data-table tbody");
-    tableBody.innerHTML = "<tr><td colspan='4'>Loading data...</td></tr>";
 
-    try {
-        const response = await fetch(baseURL + "mqtt-data/");
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
+    if (data.length === 0) {
+        tableBody.innerHTML = "<tr><td colspan='4'>No data available</td></tr>";
+        return;
+    }
 
-        const data = await response.json();
-        
-        if (data.length === 0) {
-            tableBody.innerHTML = "<tr><td colspan='4'>No data available</td></tr>";
-            return;
-        }
+    tableBody.innerHTML = "";
+    data.forEach(item => {
+        const row = document.createElement("tr");
+        const timestamp = new Date(item.timestamp * 1000).toLocaleString();
+
+        row.innerHTML = `
+            <td>${timestamp}</td>
+            <td>${item.name}</td>
+            <td>${item.symbol}</td>
+            <td>${item.priceUsd.toFixed(2)}</td>
+        `;
+        tableBody.appendChild(row);
+    });
+}
 
-        tableBody.innerHTML = "";
-        data.forEach(item => {
-            const row = document.createElement("tr");
-            const timestamp = new Date(item.timestamp * 1000).toLocaleString();
+async function fetchData() {
+    const tableBody = document.querySelector("#data-table tbody");
+    tableBody.innerHTML = "<tr><td colspan='4'>Loading data...</td></tr>";
 
-            row.innerHTML = `
-                <td>${timestamp}</td>
-                <td>${item.name}</td>
-                <td>${item.symbol}</td>
-                <td>${item.priceUsd.toFixed(2)}</td>
-            `;
-            tableBody.appendChild(row);
-        });
+    try {
+        mqttSnapshotETag = null;
+        await refreshMqtt();
     } catch (err) {
         console.error("Error fetching data:", err);
         tableBody.innerHTML = `<tr><td colspan='4'>Error loading data: ${err.message}</td></tr>`;
@@ -152,13 +135,69 @@ async function sendCommand() {
     }
 }
 
-async function refreshAll() {
-    await fetchPublisherStatus();
-    await fetchSubscriberStatus();
+// ETag of the last snapshot, sent back so unchanged polls are answered 304 Not Modified
+let mqttSnapshotETag = null;
+
+async function refreshMqtt() {
+    // Statuses and data in one request, instead of one per panel
+    const res = await fetch(baseURL + "snapshot/", {
+        cache: 'no-store',
+        headers: mqttSnapshotETag ? { 'If-None-Match': mqttSnapshotETag } : {},
+    });
+    if (res.status === 304) return; // Nothing changed since the last snapshot
+    if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+
+    mqttSnapshotETag = res.headers.get('ETag');
+    const snapshot = await res.json();
+    setStatus('mqtt_publisher_status', snapshot.publisher.running);
+    setStatus('mqtt_subscriber_status', snapshot.subscriber.running);
+    renderData(snapshot.data);
 }
 
-refreshAll();
-setInterval(refreshAll, 5000); // Auto-refresh every 5 seconds
+function setStatus(id, running) {
+    const label = document.getElementById(id);
+    label.textContent = running ? "Running" : "Stopped";
+    label.className = `status-label ${running ? 'running' : 'stopped'}`;
+}
+
+const MQTT_LIVE_ROWS = 20;
+
+function prependPrice(item) {
+    const tableBody = document.querySelector("#data-table tbody");
+    // Drop the "No data available" placeholder
+    if (tableBody.rows.length === 1 && tableBody.rows[0].cells.length === 1) tableBody.innerHTML = "";
+    const row = document.createElement("tr");
+    row.innerHTML = `
+        <td>${new Date(item.timestamp * 1000).toLocaleString()}</td>
+        <td>${item.name}</td>
+        <td>${item.symbol}</td>
+        <td>${item.priceUsd.toFixed(2)}</td>
+    `;
+    tableBody.prepend(row);
+    while (tableBody.rows.length > MQTT_LIVE_ROWS) tableBody.deleteRow(-1);
+}
+
+function connectMqttEvents() {
+    // Server push of prices and status changes, instead of polling every 5 seconds
+    const source = new EventSource('/api/events/?channels=mqtt');
+    source.addEventListener('price', e => prependPrice(JSON.parse(e.data)));
+    source.addEventListener('publisher_status', e => setStatus('mqtt_publisher_status', JSON.parse(e.data).running));
+    source.addEventListener('subscriber_status', e => setStatus('mqtt_subscriber_status', JSON.parse(e.data).running));
+    // The stream is only served under ASGI (503 otherwise): poll instead
+    source.addEventListener('error', () => {
+        if (source.readyState === EventSource.CLOSED) setInterval(refreshMqtt, 5000);
+    });
+    // Missed events could not be replayed: reload the state
+    source.addEventListener('reset', () => refreshMqtt());
+}
 
-// Load data when page loads
-document.addEventListener('DOMContentLoaded', fetchData);
\ No newline at end of file
+// Both dashboard scripts are loaded by base.html, start only on the MQTT page
+if (document.getElementById('data-table')) {
+    fetchData();
+    if (window.EventSource) {
+        connectMqttEvents();
+        setInterval(refreshMqtt, 60000); // Safety refresh
+    } else {
+        setInterval(refreshMqtt, 5000); // Auto-refresh every 5 seconds
+    }
+}
\ No newline at end of file
@@ -0,0 +1,249 @@
+"""
+MongoDB time-series layout of the sample collections.
+
+The plain layout stores one flat document per sample, repeating the device or
+asset metadata in every one:
+
+    {"device_id": 3, "device_name": "boiler", "timestamp": 1718000000.5, "value": 21.5}
+
+With MONGO_TIMESERIES=True, samples are stored in native time-series collections
+named ``<collection>_ts`` (timeField "ts", metaField "meta"), where MongoDB groups
+samples of the same metadata into compressed buckets:
+
+    {"ts": ISODate(...), "meta": {"device_id": 3, "device_name": "boiler"}, "value": 21.5}
+
+``get_series_collection()`` returns the collection of the configured layout.
+For the time-series layout it returns a ``TimeSeriesCollection``, which converts
+documents on insert and read and translates filters, sorts, projections and
+leading ``$match``/``$sort`` pipeline stages. Views, aggregations and writers
+therefore use the same plain-layout queries for both layouts. Existing data is
+copied with ``manage.py migrate_timeseries``.
+"""
+import os
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from bson import ObjectId
+from pymongo.errors import CollectionInvalid
+
+from .mongo import get_collection, get_database
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Read and write samples in time-series collections instead of the plain collections
+TIMESERIES_ENABLED = os.getenv('MONGO_TIMESERIES') == 'True'
+# Time-series bucket granularity: seconds, minutes or hours (samples arrive every few seconds)
+TIMESERIES_GRANULARITY = os.getenv('MONGO_TIMESERIES_GRANULARITY', 'seconds')
+
+TIME_FIELD = "ts"
+META_FIELD = "meta"
+
+# Sample source -> (plain collection name, metadata fields)
+SERIES_SOURCES = {
+    "modbus": (os.getenv('MODBUS_COLLECTION_NAME'), ("device_id", "device_name")),
+    "mqtt": (os.getenv('MQTT_COLLECTION_NAME'), ("symbol", "name")),
+    "telemetry": (os.getenv('MQTT_TELEMETRY_COLLECTION_NAME', 'mqtt_telemetry'), ("device_id", "serial_number")),
+}
+
+_LOGICAL_OPERATORS = ("$and", "$or", "$nor")
+
+
+def timeseries_collection_name(source):
+    """
+    Return the name of the time-series collection of a source, e.g. "modbus_data_ts".
+    """
+    return f"{SERIES_SOURCES[source][0]}_ts"
+
+
+def ensure_timeseries_collection(source, expire_after=None):
+    """
+    Create the time-series collection of a source if it does not exist.
+
+    Args:
+        source (str): Key of SERIES_SOURCES.
+        expire_after (int): Seconds after which samples expire, or None to keep them.
+            Applied to an existing collection as well.
+
+    Returns:
+        bool: True if the collection was created.
+    """
+    name = timeseries_collection_name(source)
+    database = get_database()
+    if name in database.list_collection_names(filter={"name": name}):
+        database.command("collMod", name, expireAfterSeconds="off" if expire_after is None else expire_after)
+        return False
+    options = {}
+    if expire_after is not None:
+        options["expireAfterSeconds"] = expire_after
+    try:
+        database.create_collection(name, timeseries={
+            "timeField": TIME_FIELD,
+            "metaField": META_FIELD,
+            "granularity": TIMESERIES_GRANULARITY,
+        }, **options)
+    except CollectionInvalid:
+        # Created concurrently by another process
+        return False
+    return True
+
+
+def _to_date(value):
+    """
+    Convert epoch seconds, also inside operator documents and lists, to UTC datetimes.
+    """
+    if isinstance(value, dict):
+        return {operator: _to_date(operand) for operator, operand in value.items()}
+    if isinstance(value, list):
+        return [_to_date(item) for item in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    return value
+
+
+class TimeSeriesCursor:
+    """Wraps a pymongo cursor over a time-series collection and yields plain-layout documents."""
+
+    def __init__(self, cursor, layout):
+        self.cursor = cursor
+        self.layout = layout
+
+    def sort(self, key_or_list, direction=None):
+        if isinstance(key_or_list, str):
+            self.cursor.sort(self.layout.field(key_or_list), direction or 1)
+        else:
+            self.cursor.sort([(self.layout.field(key), order) for key, order in key_or_list])
+        return self
+
+    def limit(self, limit):
+        self.cursor.limit(limit)
+        return self
+
+    def batch_size(self, batch_size):
+        self.cursor.batch_size(batch_size)
+        return self
+
+    def explain(self):
+        return self.cursor.explain()
+
+    def __iter__(self):
+        for document in self.cursor:
+            yield self.layout.from_document(document)
+
+
+class TimeSeriesCollection:
+    """
+    Plain-layout view of a time-series collection.
+
+    Supports the operations used on sample collections: insert_one, insert_many,
+    find (with sort/limit/batch_size), distinct, delete_many and aggregate.
+    """
+
+    def __init__(self, source, collection=None):
+        self.source = source
+        self.meta_fields = SERIES_SOURCES[source][1]
+        # Another driver's collection may be given, see IoT_system.mongo_async
+        self.collection = collection if collection is not None else get_collection(timeseries_collection_name(source))
+
+    def field(self, name):
+        """
+        Return the time-series field of a plain-layout field name.
+        """
+        if name == "timestamp":
+            return TIME_FIELD
+        if name in self.meta_fields:
+            return f"{META_FIELD}.{name}"
+        return name
+
+    def to_document(self, document):
+        """
+        Convert a plain-layout sample to a time-series document; the _id is kept.
+        """
+        document = dict(document)
+        meta = {field: document.pop(field) for field in self.meta_fields if field in document}
+        # Expiry is collection-level (expireAfterSeconds) in time-series collections
+        document.pop("expire_at", None)
+        document[TIME_FIELD] = datetime.fromtimestamp(document.pop("timestamp"), tz=timezone.utc)
+        document[META_FIELD] = meta
+        return document
+
+    def from_document(self, document):
+        """
+        Convert a time-series document back to the plain layout.
+        """
+        document.update(document.pop(META_FIELD, None) or {})
+        moment = document.pop(TIME_FIELD, None)
+        if moment is not None:
+            # pymongo returns naive datetimes in UTC
+            document["timestamp"] = moment.replace(tzinfo=timezone.utc).timestamp()
+        return document
+
+    def translate_filter(self, query):
+        """
+        Translate a plain-layout filter; numeric timestamp bounds become datetimes.
+        """
+        translated = {}
+        for key, value in query.items():
+            if key in _LOGICAL_OPERATORS:
+                translated[key] = [self.translate_filter(condition) for condition in value]
+            elif key == "timestamp":
+                translated[TIME_FIELD] = _to_date(value)
+            else:
+                translated[self.field(key)] = value
+        return translated
+
+    def insert_one(self, document):
+        # Like pymongo, set the _id on the caller's document
+        document.setdefault("_id", ObjectId())
+        return self.collection.insert_one(self.to_document(document))
+
+    def insert_many(self, documents, ordered=True):
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+        return self.collection.insert_many([self.to_document(document) for document in documents], ordered=ordered)
+
+    def find(self, query=None, projection=None):
+        if projection is not None:
+            projection = {self.field(key): value for key, value in projection.items()}
+        return TimeSeriesCursor(self.collection.find(self.translate_filter(query or {}), projection), self)
+
+    def delete_many(self, query):
+        # Deleting by non-metadata fields requires MongoDB 7.0
+        return self.collection.delete_many(self.translate_filter(query))
+
+    def distinct(self, key, query=None):
+        return self.collection.distinct(self.field(key), self.translate_filter(query or {}))
+
+    def aggregate(self, pipeline, **kwargs):
+        """
+        Run a plain-layout pipeline. Its leading $match and $sort stages are translated,
+        so they still use the time-series bucket bounds and indexes, followed by an
+        $addFields stage that restores the plain-layout fields for the remaining stages.
+        """
+        pipeline = list(pipeline)
+        translated = []
+        while pipeline and next(iter(pipeline[0])) in ("$match", "$sort"):
+            stage = pipeline.pop(0)
+            if "$match" in stage:
+                translated.append({"$match": self.translate_filter(stage["$match"])})
+            else:
+                translated.append({"$sort": {self.field(key): order for key, order in stage["$sort"].items()}})
+        plain_fields = {field: f"${META_FIELD}.{field}" for field in self.meta_fields}
+        plain_fields["timestamp"] = {"$divide": [{"$toLong": f"${TIME_FIELD}"}, 1000]}
+        translated.append({"$addFields": plain_fields})
+        return self.collection.aggregate(translated + pipeline, **kwargs)
+
+
+def get_series_collection(source):
+    """
+    Return the sample collection of a source in the configured layout.
+
+    Args:
+        source (str): Key of SERIES_SOURCES ("modbus", "mqtt" or "telemetry").
+
+    Returns:
+        Collection or TimeSeriesCollection: Collection accepting plain-layout documents and queries.
+    """
+    if TIMESERIES_ENABLED:
+        return TimeSeriesCollection(source)
+    return get_collection(SERIES_SOURCES[source][0])
@@ -16,12 +16,20 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from .views import index, mqtt, modbus
+from .views import index, mqtt, modbus, logging_settings, mongo_pool_stats, current_state, live_events
 
 
 # Main Django urls
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Runtime logging levels and sampling
+    path('api/logging/', logging_settings, name='logging-settings'),
+    # MongoDB connection pool usage
+    path('api/mongo/', mongo_pool_stats, name='mongo-pool-stats'),
+    # Current value of every device and asset
+    path('api/current/', current_state, name='current-state'),
+    # Server-sent events with device status and new readings for the dashboards
+    path('api/events/', live_events, name='live-events'),
     # Url for index page
     path('', index, name='index'),
     # Url for MQTT dashboard page
@@ -1,4 +1,17 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from rest_framework.decorators import api_view
+from rest_framework.decorators import permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework import status
+from .logs import get_logging_state, set_level, set_sampling
+from .mongo import pool_stats
+from .current import current_values
+from .renderers import ORJSONResponse
+from .auth import async_api_view
+from .events import CHANNELS, event_stream
 
 
 # Index page view
@@ -13,4 +26,77 @@ def mqtt(request):
 
 # Modbus dashboard view
 def modbus(request):
-    return render(request, 'modbus.html')
\ No newline at end of file
+    return render(request, 'modbus.html')
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAdminUser])
+def logging_settings(request):
+    """
+    Show or change logger levels and sampling rates at runtime.
+
+    POST body: {"logger": "mqtt_clients", "level": "DEBUG", "sample_every": 10},
+    where "level" and "sample_every" are both optional.
+    """
+    if request.method == 'POST':
+        logger_name = request.data.get('logger', 'root')
+        try:
+            if 'level' in request.data:
+                set_level(logger_name, request.data['level'])
+            if 'sample_every' in request.data:
+                set_sampling(logger_name, int(request.data['sample_every']))
+        except (ValueError, TypeError, RuntimeError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(get_logging_state())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def mongo_pool_stats(request):
+    """
+    Show the MongoDB connection pool settings and usage of this process.
+    """
+    return Response(pool_stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def current_state(request):
+    """
+    Return the current value, timestamp and quality of every device and asset
+    from the last-value cache, without querying MongoDB.
+
+    Query parameters: source ("modbus", "mqtt" or "telemetry") and keys
+    (comma-separated device ids or symbols of that source).
+    """
+    source = request.GET.get('source') or None
+    keys = set(request.GET['keys'].split(',')) if request.GET.get('keys') else None
+    values = current_values(source, keys)
+    # Serialized with orjson, thousands of values are answered in a few milliseconds
+    return ORJSONResponse({"count": len(values), "values": values})
+
+
+@async_api_view(["GET"])
+async def live_events(request):
+    """
+    Stream device status and new readings as server-sent events (see IoT_system.events).
+
+    Query parameters: channels (comma-separated, "modbus" and/or "mqtt", default both).
+    A reconnecting EventSource sends the Last-Event-ID header and first receives the
+    events it missed. Served without a worker thread per client on the ASGI application
+    only: under WSGI every open stream would hold a worker thread, so it answers 503
+    and the dashboards fall back to polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Server-sent events require the ASGI application (IoT_system.asgi)."},
+                            status=503)
+    channels = set(request.GET.get("channels", ",".join(CHANNELS)).split(","))
+    if not channels or not channels.issubset(CHANNELS):
+        return JsonResponse({"error": f"'channels' must be a subset of: {', '.join(CHANNELS)}."}, status=400)
+
+    response = StreamingHttpResponse(event_stream(channels, request.headers.get("Last-Event-ID")),
+                                     content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Disable response buffering in nginx
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,139 @@
+"""
+Load test of the sync and async variants of the dashboard read endpoints.
+
+Runs a closed-loop load against a running server: at each concurrency level,
+that many clients send requests back to back for --duration seconds. For every
+endpoint pair (sync view, async view) it reports requests per second, median and
+95th percentile latency and errors per level, and the concurrency limit of each
+path: the highest level whose p95 latency stays within --slo-ms without errors.
+
+Serve the application under ASGI with one worker so both paths get the same
+resources, e.g.:
+
+    uvicorn IoT_system.asgi:application --workers 1
+
+The client needs aiohttp, which is in requirements.txt; in a separate benchmark
+environment install it with `pip install aiohttp`.
+
+History reads pass from=0 by default, so every request reads MongoDB instead of
+the in-memory latest buffer; use --allow-buffer to measure buffered reads.
+
+Usage:
+    python benchmarks/async_views_load_test.py --token <api token> [--base-url http://127.0.0.1:8000]
+        [--device 1] [--levels 1,10,50,100,200] [--duration 10] [--slo-ms 200]
+"""
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+import aiohttp
+
+
+def endpoint_pairs(device, allow_buffer):
+    """
+    Return (name, sync path, async path) of the compared endpoints.
+    """
+    query = "" if allow_buffer else "?from=0"
+    return [
+        ("device logs", f"/modbus/api/devices/{device}/logs/{query}",
+         f"/modbus/api/devices/{device}/logs/async/{query}"),
+        ("mqtt data", f"/mqtt/api/mqtt-data/{query}", f"/mqtt/api/mqtt-data/async/{query}"),
+        ("server status", "/modbus/api/server/status/", "/modbus/api/server/status/async/"),
+        ("publisher status", "/mqtt/api/publisher/status/", "/mqtt/api/publisher/status/async/"),
+    ]
+
+
+async def run_level(session, url, concurrency, duration):
+    """
+    Run `concurrency` clients against url for `duration` seconds.
+
+    Returns:
+        dict: requests per second, p50 and p95 latency (ms) and error count.
+    """
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if len(latencies) >= 2:
+        p95 = statistics.quantiles(latencies, n=20)[-1]
+    else:
+        p95 = latencies[0] if latencies else float("inf")
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) if latencies else float("inf"),
+        "p95": p95,
+        "errors": errors,
+    }
+
+
+def concurrency_limit(results, slo_ms):
+    """
+    Return the highest concurrency level served within the latency objective without errors, or 0.
+    """
+    limit = 0
+    for level, result in results.items():
+        if result["errors"] or result["p95"] > slo_ms:
+            break
+        limit = level
+    return limit
+
+
+async def main_async(args):
+    levels = [int(level) for level in args.levels.split(",")]
+    headers = {"Authorization": f"Token {args.token}"}
+    # One connection per client, so the server sees the full concurrency
+    connector = aiohttp.TCPConnector(limit=max(levels))
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(args.base_url, headers=headers, connector=connector, timeout=timeout) as session:
+        for name, sync_path, async_path in endpoint_pairs(args.device, args.allow_buffer):
+            print(f"\n{name}")
+            print(f"{'path':<8}{'clients':>9}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+            limits = {}
+            for path_name, path in (("sync", sync_path), ("async", async_path)):
+                results = {}
+                for level in levels:
+                    result = results[level] = await run_level(session, path, level, args.duration)
+                    print(f"{path_name:<8}{level:>9}{result['rps']:>10.1f}{result['p50']:>10.1f}"
+                          f"{result['p95']:>10.1f}{result['errors']:>8}")
+                limits[path_name] = concurrency_limit(results, args.slo_ms)
+            print(f"concurrency limit (p95 <= {args.slo_ms:g} ms, no errors): "
+                  f"sync {limits['sync']}, async {limits['async']}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", required=True, help="DRF API token of a user")
+    parser.add_argument("--device", type=int, default=1, help="Modbus device id with stored logs")
+    parser.add_argument("--levels", default="1,10,50,100,200", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per level")
+    parser.add_argument("--slo-ms", type=float, default=200, help="p95 latency objective in milliseconds")
+    parser.add_argument("--timeout", type=float, default=30, help="request timeout in seconds")
+    parser.add_argument("--allow-buffer", action="store_true", help="let history reads use the latest buffer")
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
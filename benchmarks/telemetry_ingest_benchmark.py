@@ -0,0 +1,87 @@
+"""
+Throughput benchmark of the MQTT telemetry ingestion stage.
+
+Feeds pre-encoded status payloads through TelemetryIngestor.handle() the way the
+subscriber's on_message does, on a single thread, and reports messages per second.
+By default batches go to an in-memory sink so the number measures the ingestion
+stage itself; pass --mongo to write to the configured telemetry collection.
+
+Usage:
+    python benchmarks/telemetry_ingest_benchmark.py [--messages 200000] [--devices 1000] [--mongo]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mqtt_clients.telemetry_ingest import TelemetryIngestor, get_telemetry_collection  # noqa: E402
+
+# Required sustained rate for a single core
+TARGET_RATE = 10_000
+
+
+class CountingCollection:
+    """In-memory stand-in for a collection that only counts inserted documents."""
+
+    def __init__(self):
+        self.inserted = 0
+
+    def insert_many(self, documents, ordered=True):
+        self.inserted += len(documents)
+
+
+def build_messages(count, devices):
+    """
+    Build (topic, payload) pairs cycling over the given number of devices,
+    with one invalid payload in every hundred.
+    """
+    topics = [f"mqtt_devices/SN{index:06d}/status" for index in range(devices)]
+    messages = []
+    for index in range(count):
+        if index % 100 == 99:
+            payload = b'{"value": "not-a-number"}'
+        else:
+            payload = b'{"value": %.3f, "unit": "C", "quality": "good", "timestamp": %.3f}' % (
+                20 + (index % 50) / 10, 1718000000 + index / 1000)
+        messages.append((topics[index % devices], payload))
+    return topics, messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--devices", type=int, default=1_000)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    parser.add_argument("--mongo", action="store_true", help="write to the MongoDB telemetry collection")
+    args = parser.parse_args()
+
+    topics, messages = build_messages(args.messages, args.devices)
+    collection = get_telemetry_collection() if args.mongo else CountingCollection()
+    ingestor = TelemetryIngestor(collection=collection, batch_size=args.batch_size)
+    ingestor.set_devices({topic: (index, topic.split('/')[1]) for index, topic in enumerate(topics)})
+    ingestor.start()
+
+    handle = ingestor.handle
+    started = time.perf_counter()
+    for topic, payload in messages:
+        handle(topic, payload)
+    handled = time.perf_counter() - started
+    ingestor.stop()
+    total = time.perf_counter() - started
+
+    metrics = ingestor.get_metrics()
+    rate = args.messages / handled
+    print(f"messages:        {args.messages}")
+    print(f"accepted:        {metrics['received'] - metrics['invalid'] - metrics['unknown_device']}")
+    print(f"invalid:         {metrics['invalid']}")
+    print(f"written:         {metrics['written']}")
+    print(f"handle time:     {handled:.3f}s ({handled / args.messages * 1e6:.2f} us/msg)")
+    print(f"total with flush: {total:.3f}s")
+    print(f"throughput:      {rate:,.0f} msgs/s (target {TARGET_RATE:,} msgs/s)")
+    return 0 if rate >= TARGET_RATE else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,26 @@
 from django.urls import path
-from .views import MQTTDataMongoView, SendMQTTCommand
+from .views import (MQTTDataMongoView, MQTTDashboardSnapshotView, mqtt_data_async, MQTTDataAggregateView, MQTTDataExportView, SendMQTTCommand, SendBulkMQTTCommand,
+                    MQTTCommandStats, mqtt_command_outcome)
 
 
 # Urls for main MQTT endpoints
 urlpatterns = [
     # Visualization of sensor data collected in MongoDB
     path('mqtt-data/', MQTTDataMongoView.as_view(), name='mqtt-data'),
+    # Async variant of the sensor data, reading MongoDB without blocking a worker thread under ASGI
+    path('mqtt-data/async/', mqtt_data_async, name='mqtt-data-async'),
+    # Whole dashboard state in one response, with an ETag for 304 Not Modified polls
+    path('snapshot/', MQTTDashboardSnapshotView.as_view(), name='mqtt-snapshot'),
+    # Bucketed or downsampled sensor data for charts
+    path('mqtt-data/aggregate/', MQTTDataAggregateView.as_view(), name='mqtt-data-aggregate'),
+    # Streaming NDJSON/CSV/Parquet export of sensor data
+    path('mqtt-data/export/', MQTTDataExportView.as_view(), name='mqtt-data-export'),
     # Sending control commands to MQTT devices
     path('mqtt-control/', SendMQTTCommand.as_view(), name='mqtt-control'),
+    # Sending one control command to many MQTT devices
+    path('mqtt-control/bulk/', SendBulkMQTTCommand.as_view(), name='mqtt-control-bulk'),
+    # Outcome of a sent command, for polling or awaiting the device reply
+    path('mqtt-control/commands/<str:command_id>/', mqtt_command_outcome, name='mqtt-control-command'),
+    # Connection pool state and command latency statistics
+    path('mqtt-control/stats/', MQTTCommandStats.as_view(), name='mqtt-control-stats'),
 ]
@@ -1,55 +1,216 @@
 import os
+import math
 import logging
-import ssl
-from pymongo import MongoClient
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from dotenv import load_dotenv
-import paho.mqtt.publish as publish
+from IoT_system.timeseries import get_series_collection
+from IoT_system.history import HistoryQueryError, parse_history_params, NEXT_CURSOR_HEADER
+from IoT_system.latest import fetch_latest_page
+from IoT_system.aggregation import parse_aggregation_params, aggregate
+from IoT_system.rollups import series_key
+from IoT_system.export import parse_export_params, export_response
+from IoT_system.auth import async_api_view
+from IoT_system.mongo_async import read_latest_page
+from IoT_system.renderers import ORJSONResponse
+from IoT_system.snapshot import snapshot_condition, snapshot_etag
 from mqtt_devices.models import MQTTDevice
+from mqtt_clients.connection_pool import get_pool, PublishTimeout
+from mqtt_clients.mqtt_publisher import get_publisher_status
+from mqtt_clients.views import is_subscriber_running
 
 
 load_dotenv()
 
-MONGO_URI = os.getenv('MONGO_URI')
-DB_NAME = os.getenv('MONGO_DB_NAME')
-MQTT_COLLECTION_NAME = os.getenv('MQTT_COLLECTION_NAME')
-BROKER = os.getenv('MQTT_BROKER')
-PORT = int(os.getenv('MQTT_PORT'))
-USERNAME = os.getenv('MQTT_USERNAME')
-PASSWORD = os.getenv('MQTT_PASSWORD')
+# Fields of MQTT data documents returned by MQTTDataMongoView
+MQTT_DATA_FIELDS = ["timestamp", "name", "symbol", "priceUsd"]
+# Maximum time (seconds) a client may wait on a command outcome in one request
+MAX_COMMAND_WAIT = float(os.getenv('MQTT_COMMAND_MAX_WAIT', 30))
+# Maximum number of devices a single bulk command may target
+BULK_MAX_DEVICES = int(os.getenv('MQTT_BULK_MAX_DEVICES', 50000))
+
+# MQTTDevice lookups accepted in the "filter" of a bulk command
+BULK_FILTER_FIELDS = {
+    'location', 'location__in', 'location__icontains',
+    'name', 'name__icontains',
+    'serial_number__in', 'serial_number__startswith',
+    'slave_id', 'is_active',
+}
 
 logger = logging.getLogger(__name__)
 
 
 class MQTTDataMongoView(APIView):
-    """APIView for retrieving mqtt data stored in MongoDB."""
+    """
+    APIView for retrieving mqtt data stored in MongoDB, newest first.
+
+    Query parameters: from, to, limit, cursor and fields (see IoT_system.history),
+    and symbol to select one asset. The cursor of the next page is returned in
+    the X-Next-Cursor header. Latest-page reads are answered from the in-memory
+    buffer of the symbol, or of all symbols, when it is warm.
+    """
     permission_classes = [IsAuthenticated]
     def get(self, request):
         try:
-            # Connecting to data collection in MongoDB
-            mongo_client = MongoClient(MONGO_URI)
-            db = mongo_client[DB_NAME]
-            collection = db[MQTT_COLLECTION_NAME]
-            data_cursor = collection.find().sort("timestamp", -1).limit(20)
-            result = []
+            params = parse_history_params(request.query_params, MQTT_DATA_FIELDS, MQTT_DATA_FIELDS)
+        except HistoryQueryError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        symbol = request.query_params.get("symbol") or None
+        query = {"symbol": symbol} if symbol else {}
+        try:
+            # Data collection on the shared, pooled MongoDB client
+            collection = get_series_collection("mqtt")
+            documents, next_cursor = fetch_latest_page(collection, "mqtt", symbol, query, params)
 
             # Saving retrieved data to the response in JSON format
-            for item in data_cursor:
-                print(item)
-                result.append({
-                    "timestamp": item.get("timestamp"),
-                    "name": item.get("name"),
-                    "symbol": item.get("symbol"),
-                    "priceUsd": item.get("priceUsd")
-                })
-            return Response(result)
+            result = [{field: item.get(field) for field in params["fields"]} for item in documents]
+            headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+            return Response(result, headers=headers)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(["GET"])
+async def mqtt_data_async(request):
+    """
+    Async MQTTDataMongoView, with the same parameters and response. MongoDB is read
+    through the async driver (see IoT_system.mongo_async), so under ASGI concurrent
+    requests wait on the event loop instead of queueing for the sync view thread.
+    """
+    try:
+        params = parse_history_params(request.GET, MQTT_DATA_FIELDS, MQTT_DATA_FIELDS)
+    except HistoryQueryError as e:
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    symbol = request.GET.get("symbol") or None
+    query = {"symbol": symbol} if symbol else {}
+    try:
+        documents, next_cursor = await read_latest_page("mqtt", symbol, query, params)
+        result = [{field: item.get(field) for field in params["fields"]} for item in documents]
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+        return ORJSONResponse(result, headers=headers)
+    except Exception as e:
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _snapshot_limit(request):
+    return parse_history_params({"limit": request.GET["limit"]} if request.GET.get("limit") else {},
+                                MQTT_DATA_FIELDS, MQTT_DATA_FIELDS)["limit"]
+
+
+def _snapshot_state():
+    return {"publisher": get_publisher_status() == "running", "subscriber": is_subscriber_running()}
+
+
+def _snapshot_etag(request):
+    try:
+        limit = _snapshot_limit(request)
+    except HistoryQueryError:
+        # Answered with 400 by the view
+        return None
+    return snapshot_etag(["mqtt:data"], _snapshot_state(), {"limit": limit})
+
+
+class MQTTDashboardSnapshotView(APIView):
+    """
+    APIView returning the whole state of the MQTT dashboard in one response:
+    publisher and subscriber status and the latest data of all assets.
+
+    Query parameters: limit. The response carries an ETag derived from version
+    counters (see IoT_system.snapshot), so a poll sending it back in If-None-Match
+    gets 304 Not Modified while nothing changed.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @method_decorator(snapshot_condition(_snapshot_etag))
+    def get(self, request):
+        try:
+            limit = _snapshot_limit(request)
+        except HistoryQueryError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            state = _snapshot_state()
+            params = {"start": None, "end": None, "limit": limit, "cursor": None, "fields": MQTT_DATA_FIELDS}
+            collection = get_series_collection("mqtt")
+            documents, _ = fetch_latest_page(collection, "mqtt", None, {}, params)
+            return Response({
+                "publisher": {"running": state["publisher"]},
+                "subscriber": {"running": state["subscriber"]},
+                "data": [{field: item.get(field) for field in MQTT_DATA_FIELDS} for item in documents],
+            }, headers={"Cache-Control": "private, no-cache"})
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class MQTTDataAggregateView(APIView):
+    """
+    APIView returning MQTT data prices over a time window, bucketed or downsampled in MongoDB.
+
+    Query parameters: symbol (required), from, to, interval, points and method
+    (see IoT_system.aggregation).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        symbol = request.query_params.get("symbol")
+        if not symbol:
+            return Response({"error": "'symbol' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            params = parse_aggregation_params(request.query_params)
+        except HistoryQueryError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            collection = get_series_collection("mqtt")
+            result = aggregate(collection, {"symbol": symbol}, "priceUsd", params, series=series_key("mqtt", symbol))
+            return Response(dict(result, symbol=symbol))
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class MQTTDataExportView(APIView):
+    """
+    APIView streaming MQTT data in a time window as a file download, oldest first.
+
+    Query parameters: from, to, fields, output and compression (see IoT_system.export),
+    and symbol to select one asset.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            params = parse_export_params(request.query_params, MQTT_DATA_FIELDS, MQTT_DATA_FIELDS)
+        except HistoryQueryError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        symbol = request.query_params.get("symbol")
+        query = {"symbol": symbol} if symbol else {}
+        try:
+            collection = get_series_collection("mqtt")
+            return export_response(collection, query, params, f"mqtt_data_{symbol}" if symbol else "mqtt_data")
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def get_broker_pool(create=True):
+    """
+    Return the MQTT connection pool, or None if it cannot be created (e.g. missing broker settings)
+    or, with create=False, does not exist yet.
+    """
+    try:
+        return get_pool(create)
+    except Exception as e:
+        logger.error("MQTT connection pool unavailable: %s", e)
+        return None
+
+
 class SendMQTTCommand(APIView):
     """APIView for sending a control command to a mqtt device."""
     permission_classes = [IsAuthenticated]
@@ -59,11 +220,14 @@ class SendMQTTCommand(APIView):
         serial_number = request.data.get("serial_number")
         command = request.data.get("command")
         qos = request.data.get("qos", 0)  # Default QoS=0
+        if str(qos) not in ("0", "1", "2"):
+            return Response({"error": "'qos' must be 0, 1 or 2."}, status=400)
+        qos = int(qos)
 
-        logger.info(f"The command {command} was sent to device-{serial_number}")
+        logger.info("The command %s was sent to device-%s", command, serial_number)
 
         if not serial_number or not command:
-            logger.warning(f"Missing parameters. Serial: {serial_number}, Command: {command}")
+            logger.warning("Missing parameters. Serial: %s, Command: %s", serial_number, command)
             return Response(
                 {"error": "Both 'serial_number' and 'command' are required."},
                 status=400
@@ -72,9 +236,9 @@ class SendMQTTCommand(APIView):
         # Looking for the active device according to the device serial number, taken from the request
         try:
             device = MQTTDevice.objects.get(serial_number=serial_number)
-            logger.info(f"Device-{device} was found")
+            logger.info("Device-%s was found", device)
         except MQTTDevice.DoesNotExist:
-            logger.warning(f"Device not found or inactive: {serial_number}")
+            logger.warning("Device not found or inactive: %s", serial_number)
             return Response(
                 {"error": "Device not found or inactive."},
                 status=404
@@ -82,41 +246,173 @@ class SendMQTTCommand(APIView):
 
         # Use the device's topic if available, otherwise fall back to default pattern
         topic = device.mqtt_command_topic or f"devices/{device.serial_number}/command"
-        print(topic, command)
+        pool = get_broker_pool()
+        if pool is None:
+            return Response({"error": "The MQTT broker connection is not available."}, status=503)
+        # Track the command so the device reply can be matched by its correlation data
+        command_id = pool.tracker.register(device.serial_number, command, topic)
         try:
-            publish.single(
-                topic,
-                payload=command,
-                qos=qos,
-                hostname=BROKER,
-                port=PORT,
-                auth={
-                    'username': USERNAME,
-                    'password': PASSWORD
-                },
-                tls={
-                    'ca_certs': '/etc/mosquitto/certs/ca.crt',
-                    'certfile': '/etc/mosquitto/certs/clients/client.crt',
-                    'keyfile': '/etc/mosquitto/certs/clients/client.key',
-                    'cert_reqs': ssl.CERT_REQUIRED,
-                    'tls_version': ssl.PROTOCOL_TLS_CLIENT,
-                },
-                client_id=f"publisher_{serial_number}"
-            )
-            logger.info(f"Sent command to {topic}: {command}")
+            # Publish over a pooled, already authenticated broker connection
+            latency = pool.publish(topic, command, qos=qos, properties=pool.request_properties(command_id))
+            logger.info("Sent command to %s: %s", topic, command)
 
-            # Response to the frontend
+            # Response to the frontend; the device outcome is available under command_id
             return Response({
                 "status": "success",
                 "device": device.name,
                 "serial_number": device.serial_number,
                 "command": command,
                 "mqtt_topic": topic,
-                "qos": qos
+                "qos": qos,
+                "latency_ms": round(latency * 1000, 3),
+                "command_id": command_id,
             })
+        except PublishTimeout as e:
+            pool.tracker.fail(command_id, str(e))
+            logger.error("MQTT publish not acknowledged: %s", e)
+            return Response(
+                {"error": "The MQTT broker did not acknowledge the command in time."},
+                status=504
+            )
         except Exception as e:
-            logger.error(f"MQTT publish failed: {str(e)}")
+            pool.tracker.fail(command_id, str(e))
+            logger.error("MQTT publish failed: %s", e)
             return Response(
                 {"error": "Failed to send MQTT command. Please try again."},
                 status=500
-            )
\ No newline at end of file
+            )
+
+
+class SendBulkMQTTCommand(APIView):
+    """
+    APIView for sending one control command to many mqtt devices at once.
+
+    The targets are given by exactly one of "serial_numbers" (list), "location" (str)
+    or "filter" (dict of BULK_FILTER_FIELDS lookups) and resolved with a single query.
+    All commands are published over the shared connection pool with pipelined
+    QoS acknowledgements, and a result is returned for every device.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        command = request.data.get("command")
+        qos = request.data.get("qos", 0)
+        if not command:
+            return Response({"error": "'command' is required."}, status=400)
+        if str(qos) not in ("0", "1", "2"):
+            return Response({"error": "'qos' must be 0, 1 or 2."}, status=400)
+        qos = int(qos)
+
+        selectors = [key for key in ("serial_numbers", "location", "filter") if request.data.get(key) not in (None, "")]
+        if len(selectors) != 1:
+            return Response(
+                {"error": "Exactly one of 'serial_numbers', 'location' or 'filter' is required."},
+                status=400
+            )
+
+        serial_numbers = request.data.get("serial_numbers")
+        if serial_numbers is not None:
+            if not isinstance(serial_numbers, list):
+                return Response({"error": "'serial_numbers' must be a list."}, status=400)
+            lookup = {"serial_number__in": serial_numbers}
+        elif request.data.get("location"):
+            lookup = {"location": request.data["location"]}
+        else:
+            lookup = request.data["filter"]
+            if not isinstance(lookup, dict) or not set(lookup) <= BULK_FILTER_FIELDS:
+                return Response(
+                    {"error": f"'filter' keys must be among: {', '.join(sorted(BULK_FILTER_FIELDS))}."},
+                    status=400
+                )
+
+        # Resolve all targets with one query, fetching only the needed columns
+        try:
+            devices = list(
+                MQTTDevice.objects.filter(**lookup)
+                .values_list("serial_number", "name", "mqtt_command_topic")[:BULK_MAX_DEVICES + 1]
+            )
+        except (ValueError, TypeError, DjangoValidationError) as e:
+            # A lookup value that does not fit its field, e.g. {"slave_id": "abc"}
+            return Response({"error": f"Invalid 'filter' value: {e}"}, status=400)
+        if len(devices) > BULK_MAX_DEVICES:
+            return Response({"error": f"More than {BULK_MAX_DEVICES} devices selected."}, status=400)
+
+        pool = get_broker_pool()
+        if pool is None:
+            return Response({"error": "The MQTT broker connection is not available."}, status=503)
+        topics = [topic or f"devices/{serial}/command" for serial, name, topic in devices]
+        command_ids = [pool.tracker.register(serial, command, topic) for (serial, _, _), topic in zip(devices, topics)]
+        outcomes = pool.publish_many(
+            [(topic, command, pool.request_properties(command_id)) for topic, command_id in zip(topics, command_ids)],
+            qos=qos
+        )
+
+        results = []
+        sent = 0
+        for (serial, name, _), topic, command_id, outcome in zip(devices, topics, command_ids, outcomes):
+            result = {"serial_number": serial, "device": name, "mqtt_topic": topic, "command_id": command_id}
+            if isinstance(outcome, Exception):
+                pool.tracker.fail(command_id, str(outcome))
+                result["status"] = "timeout" if isinstance(outcome, PublishTimeout) else "failed"
+                result["error"] = str(outcome)
+            else:
+                sent += 1
+                result["status"] = "sent"
+                result["latency_ms"] = round(outcome * 1000, 3)
+            results.append(result)
+
+        if serial_numbers is not None:
+            found = {serial for serial, _, _ in devices}
+            results.extend(
+                {"serial_number": serial, "status": "not_found"}
+                for serial in dict.fromkeys(serial_numbers) if serial not in found
+            )
+
+        logger.info("Bulk command %s sent to %s/%s devices", command, sent, len(devices))
+        return Response({
+            "command": command,
+            "qos": qos,
+            "targeted": len(devices),
+            "sent": sent,
+            "failed": len(devices) - sent,
+            "results": results,
+        })
+
+
+@async_api_view(["GET"])
+async def mqtt_command_outcome(request, command_id):
+    """
+    Return the outcome of a command sent by this process.
+
+    With ?wait=<seconds> the request waits (up to MAX_COMMAND_WAIT) for the device
+    reply without holding a worker thread; without it, the current state is returned
+    immediately for polling. The status is one of pending, completed, failed or timeout.
+    """
+    try:
+        wait = float(request.GET.get("wait", 0))
+        # float() accepts "nan" and "inf", which no timeout can use
+        if not math.isfinite(wait):
+            raise ValueError(wait)
+    except ValueError:
+        return JsonResponse({"error": "'wait' must be a number of seconds."}, status=400)
+    wait = min(max(wait, 0), MAX_COMMAND_WAIT)
+
+    # Commands are tracked by the pool that sent them; creating one here would block the event loop
+    pool = get_broker_pool(create=False)
+    if pool is None:
+        return JsonResponse({"error": "The MQTT broker connection is not available."}, status=503)
+    record = await pool.tracker.wait(command_id, wait)
+    if record is None:
+        return JsonResponse({"error": "Unknown or expired command."}, status=404)
+    return JsonResponse(record)
+
+
+class MQTTCommandStats(APIView):
+    """APIView reporting the MQTT connection pool state and command latency."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        pool = get_broker_pool()
+        if pool is None:
+            return Response({"error": "The MQTT broker connection is not available."}, status=503)
+        return Response(pool.stats())
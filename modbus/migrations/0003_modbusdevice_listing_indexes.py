@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:00
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modbus', '0002_alter_modbusdevice_port'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='modbusdevice',
+            index=models.Index(fields=['is_active', 'id'], name='modbus_active_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='modbusdevice',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='modbus_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='modbusdevice',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('host'), name='text_pattern_ops'), name='modbus_host_prefix_idx'),
+        ),
+    ]
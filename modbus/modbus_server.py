@@ -10,8 +10,7 @@ from pymodbus.server import StartAsyncTcpServer
 import aiohttp
 
 
-# Configure logging format and level
-logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
+# Logging is configured by Django (LOGGING in settings), records are written on a background thread
 log = logging.getLogger("modbus")
 
 # Load environment variables from .env file
@@ -49,7 +48,7 @@ async def fetch_polygon_price():
                 data = await response.json()
                 return data["results"][0]["cash_amount"]  # Return first result's cash_amount
     except Exception as e:
-        log.error(f"Polygon API error: {e}")
+        log.error("Polygon API error: %s", e)
         return None
 
 
@@ -68,7 +67,7 @@ async def updating_loop():
 
             # Update holding registers (function code 3) at address 0
             context[0x00].setValues(3, 0, payload)
-            log.info(f"Updated Modbus register with value: {value}")
+            log.info("Updated Modbus register with value: %s", value)
         else:
             log.warning("No value fetched; registers not updated")
 
@@ -83,7 +82,7 @@ async def modbus_server_loop():
     """
     # Start Modbus server on specified host and port
     server = StartAsyncTcpServer(context, address=(MODBUS_SERVER_HOST, MODBUS_SERVER_PORT))
-    log.info(f"Modbus server starting on {MODBUS_SERVER_HOST}:{MODBUS_SERVER_PORT}")
+    log.info("Modbus server starting on %s:%s", MODBUS_SERVER_HOST, MODBUS_SERVER_PORT)
 
     # Run both the TCP server and register updating loop at the same time
     await asyncio.gather(
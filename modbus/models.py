@@ -1,4 +1,9 @@
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Upper
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from IoT_system.snapshot import bump_version
 
 
 class ModbusDevice(models.Model):
@@ -10,6 +15,27 @@ class ModbusDevice(models.Model):
     is_active = models.BooleanField(default=False)
     is_running = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Paginated listings filtered on the active state, in primary key order
+            models.Index(fields=['is_active', 'id'], name='modbus_active_id_idx'),
+            # Case-insensitive prefix search (istartswith) on name and host
+            models.Index(OpClass(Upper('name'), name='text_pattern_ops'), name='modbus_name_prefix_idx'),
+            models.Index(OpClass(Upper('host'), name='text_pattern_ops'), name='modbus_host_prefix_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.host}:{self.port})"
 
+
+@receiver(post_save, sender=ModbusDevice)
+@receiver(post_delete, sender=ModbusDevice)
+def invalidate_device_snapshots(sender, update_fields=None, **kwargs):
+    """
+    Bump the device list version of the dashboard snapshots on every change, except
+    for saves of the running flag alone: the client threads write it, and bump the
+    version themselves only when the device stops.
+    """
+    if update_fields is not None and set(update_fields) == {"is_running"}:
+        return
+    bump_version("modbus:devices")
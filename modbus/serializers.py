@@ -7,3 +7,9 @@ class ModbusDeviceSerializer(serializers.ModelSerializer):
     class Meta:
         model = ModbusDevice
         fields = '__all__'
+
+
+class ModbusDeviceImportSerializer(ModbusDeviceSerializer):
+    """Validates a row of a bulk device import; the running state is not importable."""
+    class Meta(ModbusDeviceSerializer.Meta):
+        extra_kwargs = {'is_running': {'read_only': True}}
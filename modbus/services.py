@@ -1,4 +1,3 @@
-import os
 import threading
 import time
 import logging
@@ -6,30 +5,43 @@ from dotenv import load_dotenv
 from pymodbus.client import ModbusTcpClient
 from pymodbus.payload import BinaryPayloadDecoder
 from pymodbus.constants import Endian
-from pymongo import MongoClient
+from IoT_system.logs import kv
+from IoT_system.timeseries import get_series_collection
+from IoT_system.rollups import record_sample
+from IoT_system.latest import record_latest
+from IoT_system.current import record_value
+from IoT_system.retention import stamp_expiry
+from IoT_system.events import publish_event
+from IoT_system.snapshot import bump_version
 from .models import ModbusDevice
 
 
-# Configure logging
+# Logging is configured by Django (LOGGING in settings), records are written on a background thread
 log = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.DEBUG,  # Set to DEBUG for more detailed output
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
 
 # Dictionary to store references to running client threads
 client_threads = {}
 
+# Device fields re-read before every reading; host and port are fixed by the open connection
+WORKER_FIELDS = ["name", "slave_id", "register_address", "is_active"]
+
 # Load environment variables
 load_dotenv()
-MONGO_URI = os.getenv('MONGO_URI')
-MONGO_DB = os.getenv('MONGO_DB_NAME')
-MONGO_COLLECTION = os.getenv('MODBUS_COLLECTION_NAME')
 
-# Initialize MongoDB client and target collection
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client[MONGO_DB]
-collection = db[MONGO_COLLECTION]
+
+def publish_device_status(device):
+    """
+    Push the running state of a device to the dashboards.
+
+    Args:
+        device (ModbusDevice): The device whose state changed.
+    """
+    publish_event("modbus", "device_status", {
+        "id": device.pk,
+        "name": device.name,
+        "is_active": device.is_active,
+        "is_running": device.is_running,
+    })
 
 
 def modbus_client_worker(device_id):
@@ -43,31 +55,36 @@ def modbus_client_worker(device_id):
     try:
         device = ModbusDevice.objects.get(pk=device_id)
     except ModbusDevice.DoesNotExist:
-        log.error(f"Device {device_id} does not exist.")
+        log.error("Device %s does not exist.", device_id)
         return
 
     # Create a Modbus TCP client for the specified device
     client = ModbusTcpClient(device.host, port=device.port, timeout=15)
 
     if not client.connect():
-        log.error(f"Cannot connect to Modbus device {device.name} at {device.host}:{device.port}")
+        log.error("Cannot connect to Modbus device %s at %s:%s", device.name, device.host, device.port)
         device.is_running = False
-        device.save()
+        device.save(update_fields=["is_running"])
+        bump_version("modbus:devices")
         return
 
-    log.info(f"Started Modbus client for device {device.name}")
+    # Target collection on the shared, pooled MongoDB client
+    collection = get_series_collection("modbus")
+    log.info("Started Modbus client for device %s", device.name)
     try:
         while True:
-            # Refresh the device instance to check if it's still active
-            device.refresh_from_db()
+            # Refresh the fields used by the loop to check if it's still active
+            device.refresh_from_db(fields=WORKER_FIELDS)
             if not device.is_active:
-                log.info(f"Device {device.name} is not active. Stopping client.")
+                log.info("Device %s is not active. Stopping client.", device.name)
                 break
 
             # Read two 16-bit registers (32-bit float) from the device
             rr = client.read_holding_registers(device.register_address, count=2, slave=device.slave_id)
             if rr.isError():
-                log.warning(f"Failed to read registers for device {device.name}")
+                log.warning("Failed to read registers for device %s", device.name)
+                # Keep the last value, flagged as bad until the next successful read
+                record_value("modbus", device.pk, None, time.time(), "bad")
             else:
                 # Decode the 32-bit float from the register values
                 decoder = BinaryPayloadDecoder.fromRegisters(rr.registers, byteorder=Endian.BIG)
@@ -80,27 +97,41 @@ def modbus_client_worker(device_id):
                     "timestamp": time.time(),
                     "value": value,
                 }
-                collection.insert_one(record)
-                log.info(f"Logged value {value} for device {device.name} in MongoDB")
+                collection.insert_one(stamp_expiry("modbus", device.pk, record))
+                # Update the minute/hour/day rollups and the latest-values buffer of the device
+                record_sample("modbus", device.pk, record["timestamp"], value)
+                record_latest("modbus", device.pk, record)
+                record_value("modbus", device.pk, value, record["timestamp"])
+                publish_event("modbus", "reading", {
+                    "device_id": device.pk,
+                    "device_name": device.name,
+                    "timestamp": record["timestamp"],
+                    "value": value,
+                })
+                log.info(kv("Logged value in MongoDB", device=device.name, value=value))
 
             # Wait 5 seconds before the next reading
             time.sleep(5)
 
     except Exception as e:
-        log.exception(f"Unhandled exception in client thread for device {device.name}: {e}")
+        log.exception("Unhandled exception in client thread for device %s: %s", device.name, e)
 
     finally:
         # Ensure proper cleanup on exit
         client.close()
         device.is_running = False
-        device.save()
-        log.info(f"Stopped Modbus client for device {device.name}")
+        # Only the running flag: other fields may have been edited through the API since the thread started
+        device.save(update_fields=["is_running"])
+        # Running-flag saves bump no version (see modbus.models), the stop is shown once
+        bump_version("modbus:devices")
+        publish_device_status(device)
+        log.info("Stopped Modbus client for device %s", device.name)
 
     # This redundant block ensures cleanup in any case (safe fallback)
     client.close()
     device.is_running = False
-    device.save()
-    log.info(f"Stopped Modbus client for device {device.name}")
+    device.save(update_fields=["is_running"])
+    log.info("Stopped Modbus client for device %s", device.name)
 
 
 def start_client(device: ModbusDevice):
@@ -111,18 +142,19 @@ def start_client(device: ModbusDevice):
         device (ModbusDevice): The Modbus device to start a client for.
     """
     if device.pk in client_threads and client_threads[device.pk].is_alive():
-        log.warning(f"Client for device {device.name} is already running.")
+        log.warning("Client for device %s is already running.", device.name)
         return
 
     # Mark the device as running in the database
     device.is_running = True
     device.save()
+    publish_device_status(device)
 
     # Create and start a background thread to handle the device's communication
     thread = threading.Thread(target=modbus_client_worker, args=(device.pk,), daemon=True)
     thread.start()
     client_threads[device.pk] = thread
-    log.info(f"Started client thread for device {device.name}")
+    log.info("Started client thread for device %s", device.name)
 
 
 def stop_client(device: ModbusDevice):
@@ -134,4 +166,5 @@ def stop_client(device: ModbusDevice):
     """
     device.is_running = False
     device.save()
-    log.info(f"Set is_active=False for device {device.name}, client will stop shortly.")
+    publish_device_status(device)
+    log.info("Set is_active=False for device %s, client will stop shortly.", device.name)
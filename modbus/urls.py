@@ -1,7 +1,8 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 from .views import (ModbusDeviceViewSet, list_devices, server_status, start_modbus_server, stop_modbus_server, start_modbus_device,
-                    stop_modbus_device, fetch_device_logs, get_active_devices)
+                    stop_modbus_device, fetch_device_logs, get_active_devices, aggregate_device_logs,
+                    export_device_logs, dashboard_snapshot, server_status_async, fetch_device_logs_async)
 
 
 router = DefaultRouter()
@@ -14,6 +15,8 @@ urlpatterns = [
     path('api/devices/', list_devices, name='list_devices'),
     # Showing the Modbus server status (Stopped/Running)
     path('api/server/status/', server_status, name='server_status'),
+    # Async variant of the server status, for ASGI deployments
+    path('api/server/status/async/', server_status_async, name='server_status_async'),
     # Starting Modbus server
     path('api/server/start/', start_modbus_server, name='start_modbus_server'),
     # Stopping Modbus server
@@ -26,6 +29,14 @@ urlpatterns = [
     path('api/devices/active/', get_active_devices, name='get_active_devices'),
     # Showing data log for a chosen Modbus device
     path('api/devices/<int:device_id>/logs/', fetch_device_logs, name='device-logs'),
+    # Async variant of the data log, reading MongoDB without blocking a worker thread under ASGI
+    path('api/devices/<int:device_id>/logs/async/', fetch_device_logs_async, name='device-logs-async'),
+    # Bucketed or downsampled values of a chosen Modbus device for charts
+    path('api/devices/<int:device_id>/aggregate/', aggregate_device_logs, name='device-aggregate'),
+    # Streaming NDJSON/CSV/Parquet export of a chosen Modbus device's data log
+    path('api/devices/<int:device_id>/export/', export_device_logs, name='device-export'),
+    # Whole dashboard state in one response, with an ETag for 304 Not Modified polls
+    path('api/snapshot/', dashboard_snapshot, name='modbus-snapshot'),
     ]
 
 urlpatterns += router.urls
@@ -1,34 +1,80 @@
-import os
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from django.http import JsonResponse
 from rest_framework import viewsets
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
 from rest_framework.decorators import permission_classes
+from rest_framework.exceptions import APIException
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from IoT_system.timeseries import get_series_collection
+from IoT_system.history import HistoryQueryError, parse_history_params, NEXT_CURSOR_HEADER
+from IoT_system.latest import fetch_latest_page
+from IoT_system.aggregation import parse_aggregation_params, aggregate
+from IoT_system.rollups import series_key
+from IoT_system.export import parse_export_params, export_response
+from IoT_system.renderers import ORJSONResponse, ValuesListMixin
+from IoT_system.pagination import DEVICE_FILTER_BACKENDS, DeviceCursorPagination, paginate_devices, \
+    validate_device_listing
+from IoT_system.provisioning import PROVISION_BATCH_SIZE, DeviceImporter, ProvisioningError, request_lines, \
+    import_devices
 from .models import ModbusDevice
-from .serializers import ModbusDeviceSerializer
+from .serializers import ModbusDeviceSerializer, ModbusDeviceImportSerializer
 from .modbus_server import start_server, stop_server, is_server_running
 from .services import start_client, stop_client
+from IoT_system.events import publish_event
+from IoT_system.snapshot import snapshot_condition, snapshot_etag, bump_version, latest_position
+from IoT_system.auth import async_api_view
+from IoT_system.mongo_async import read_latest_page
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Load MongoDB connection settings
-MONGO_URI = os.getenv('MONGO_URI')
-MONGO_DB = os.getenv('MONGO_DB_NAME')
-MONGO_COLLECTION = os.getenv('MODBUS_COLLECTION_NAME')
+# Fields of Modbus log documents returned by fetch_device_logs
+LOG_FIELDS = ["_id", "device_id", "device_name", "timestamp", "value"]
+# Device fields returned by list_devices
+DEVICE_LIST_FIELDS = ["id", "name", "host", "port", "slave_id", "register_address", "is_active", "is_running"]
+# Fields matched by the search parameter of device listings, by case-insensitive prefix
+DEVICE_SEARCH_FIELDS = ["^name", "^host"]
+# Fields identifying an existing device in bulk imports
+DEVICE_IMPORT_KEY = ("host", "port", "slave_id")
 
 
-class ModbusDeviceViewSet(viewsets.ModelViewSet):
+def device_importer(upsert=False, batch_size=PROVISION_BATCH_SIZE):
+    """
+    Return a bulk importer of Modbus devices (see IoT_system.provisioning), matching
+    existing devices by host, port and slave id.
+    """
+    # bulk_create skips the post_save signal that invalidates the dashboard snapshots
+    return DeviceImporter(ModbusDeviceImportSerializer, DEVICE_IMPORT_KEY, upsert=upsert, batch_size=batch_size,
+                          after_write=lambda: bump_version("modbus:devices"))
+
+
+class ModbusDeviceViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for performing CRUD operations on ModbusDevice model.
-    Exposes endpoints for create, retrieve, update, delete and list.
+    Exposes endpoints for create, retrieve, update, delete and list;
+    list is served from QuerySet.values() (see IoT_system.renderers.ValuesListMixin),
+    cursor-paginated and filtered (see IoT_system.pagination).
     """
     queryset = ModbusDevice.objects.all()
     serializer_class = ModbusDeviceSerializer
+    pagination_class = DeviceCursorPagination
+    filter_backends = DEVICE_FILTER_BACKENDS
+    search_fields = DEVICE_SEARCH_FIELDS
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        """
+        Create, or with ?upsert=true create or update, devices from a CSV (text/csv) or
+        NDJSON (application/x-ndjson) request body, matched by host, port and slave id.
+        Returns the counts of created and updated devices and the errors per row.
+        """
+        try:
+            input_format, lines = request_lines(request)
+            importer = device_importer(upsert=request.query_params.get('upsert') == 'true')
+            return Response(import_devices(lines, input_format, importer))
+        except ProvisioningError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET'])
@@ -41,6 +87,14 @@ def server_status(request):
     return Response({"running": is_server_running()})
 
 
+@async_api_view(["GET"])
+async def server_status_async(request):
+    """
+    Async server_status: answered on the event loop without a worker thread under ASGI.
+    """
+    return ORJSONResponse({"running": is_server_running()})
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def start_modbus_server(request):
@@ -51,6 +105,7 @@ def start_modbus_server(request):
         return Response({'message': 'Server is already running'}, status=status.HTTP_400_BAD_REQUEST)
 
     start_server()
+    publish_event("modbus", "server_status", {"running": True})
     return Response({'message': 'Modbus server started'}, status=status.HTTP_200_OK)
 
 
@@ -64,6 +119,7 @@ def stop_modbus_server(request):
         return Response({'message': 'Server is not running'}, status=status.HTTP_400_BAD_REQUEST)
 
     stop_server()
+    publish_event("modbus", "server_status", {"running": False})
     return Response({'message': 'Modbus server stopped'}, status=status.HTTP_200_OK)
 
 
@@ -71,23 +127,15 @@ def stop_modbus_server(request):
 @permission_classes([IsAuthenticated])
 def list_devices(request):
     """
-    Return a list of all Modbus devices with full metadata.
-    """
-    devices = ModbusDevice.objects.all()
-    data = [
-        {
-            "id": device.id,
-            "name": device.name,
-            "host": device.host,
-            "port": device.port,
-            "slave_id": device.slave_id,
-            "register_address": device.register_address,
-            "is_active": device.is_active,
-            "is_running": device.is_running,
-        }
-        for device in devices
-    ]
-    return Response(data)
+    Return one page of Modbus devices with full metadata, in id order.
+    Rows are read as dicts with values(), without instantiating models.
+
+    Query parameters: limit, cursor, is_active and search (name or host prefix),
+    see IoT_system.pagination.
+    """
+    page, paginator = paginate_devices(request, ModbusDevice.objects.values(*DEVICE_LIST_FIELDS),
+                                       DEVICE_SEARCH_FIELDS)
+    return paginator.get_paginated_response(page)
 
 
 @api_view(['POST'])
@@ -122,42 +170,239 @@ def stop_modbus_device(request, pk):
 @permission_classes([IsAuthenticated])
 def get_active_devices(request):
     """
-    Return a list of all currently active devices (is_active = True).
+    Return one page of the currently active devices (is_active = True), in id order.
+
+    Query parameters: limit, cursor and search (name or host prefix).
     """
-    active_devices = ModbusDevice.objects.filter(is_active=True)
-    data = [{'id': d.id, 'name': d.name} for d in active_devices]
-    return JsonResponse(data, safe=False)
+    page, paginator = paginate_devices(request, ModbusDevice.objects.filter(is_active=True).values('id', 'name'),
+                                       DEVICE_SEARCH_FIELDS)
+    return paginator.get_paginated_response(page)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def fetch_device_logs(request, device_id):
     """
-    Fetch the latest 20 log entries for a given device from MongoDB.
-    The logs include timestamp and value, sorted by newest first.
+    Fetch log entries for a given device from MongoDB, sorted by newest first.
+    Without parameters these are the latest 20 entries.
+
+    Query parameters: from, to, limit, cursor and fields (see IoT_system.history).
+    The cursor of the next page is returned in the X-Next-Cursor header. Latest-page
+    reads are answered from the in-memory buffer of the device when it is warm.
 
     Args:
         device_id (int): The primary key of the device to retrieve logs for.
 
     Returns:
-        JsonResponse: List of logs or error message.
+        ORJSONResponse: List of logs or error message.
     """
     try:
-        # Connect to MongoDB and select the collection
-        client = MongoClient(MONGO_URI)
-        db = client[MONGO_DB]
-        collection = db[MONGO_COLLECTION]
+        params = parse_history_params(request.GET, LOG_FIELDS, LOG_FIELDS)
+    except HistoryQueryError as e:
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # Select the collection on the shared, pooled MongoDB client
+        collection = get_series_collection("modbus")
 
-        # Fetch the latest 20 log records for the device
-        logs = list(collection.find({'device_id': device_id}).sort('timestamp', -1).limit(20))
+        # Fetch one page of log records for the device, from memory when possible
+        documents, next_cursor = fetch_latest_page(collection, "modbus", device_id, {'device_id': device_id}, params)
 
-        # Format ObjectId and round timestamps for frontend readability
-        for log in logs:
-            log['_id'] = str(log['_id'])  # Convert ObjectId to string
-            log['timestamp'] = round(log['timestamp'], 2)
+        # Round timestamps for frontend readability; ObjectIds are serialized as strings by orjson
+        logs = []
+        for document in documents:
+            log = {field: document.get(field) for field in params['fields']}
+            if 'timestamp' in log:
+                log['timestamp'] = round(log['timestamp'], 2)
+            logs.append(log)
 
-        return JsonResponse(logs, safe=False)
+        response = ORJSONResponse(logs)
+        if next_cursor:
+            response[NEXT_CURSOR_HEADER] = next_cursor
+        return response
 
     except Exception as e:
         # Return server error response with exception details
-        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(["GET"])
+async def fetch_device_logs_async(request, device_id):
+    """
+    Async fetch_device_logs, with the same parameters and response. MongoDB is read
+    through the async driver (see IoT_system.mongo_async), so under ASGI concurrent
+    requests wait on the event loop instead of queueing for the sync view thread.
+
+    Args:
+        device_id (int): The primary key of the device to retrieve logs for.
+
+    Returns:
+        ORJSONResponse: List of logs or error message.
+    """
+    try:
+        params = parse_history_params(request.GET, LOG_FIELDS, LOG_FIELDS)
+    except HistoryQueryError as e:
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        documents, next_cursor = await read_latest_page("modbus", device_id, {'device_id': device_id}, params)
+        logs = []
+        for document in documents:
+            log = {field: document.get(field) for field in params['fields']}
+            if 'timestamp' in log:
+                log['timestamp'] = round(log['timestamp'], 2)
+            logs.append(log)
+
+        response = ORJSONResponse(logs)
+        if next_cursor:
+            response[NEXT_CURSOR_HEADER] = next_cursor
+        return response
+
+    except Exception as e:
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def aggregate_device_logs(request, device_id):
+    """
+    Return the values of a device over a time window, bucketed or downsampled in MongoDB.
+
+    Query parameters: from, to, interval, points and method (see IoT_system.aggregation),
+    e.g. ?from=2025-01-01&to=2025-01-31&points=1000 for a 30-day chart.
+
+    Args:
+        device_id (int): The primary key of the device.
+
+    Returns:
+        ORJSONResponse: Window, interval, method and points, or an error message.
+    """
+    try:
+        params = parse_aggregation_params(request.GET)
+    except HistoryQueryError as e:
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        collection = get_series_collection("modbus")
+        return ORJSONResponse(aggregate(collection, {'device_id': device_id}, 'value', params,
+                                      series=series_key("modbus", device_id)))
+    except Exception as e:
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_device_logs(request, device_id):
+    """
+    Stream all log entries of a device in a time window as a file download, oldest first.
+
+    Query parameters: from, to, fields, output and compression (see IoT_system.export),
+    e.g. ?from=2025-01-01&output=csv&compression=gzip.
+
+    Args:
+        device_id (int): The primary key of the device.
+
+    Returns:
+        StreamingHttpResponse: NDJSON, CSV or Parquet export, or a JSON error message.
+    """
+    try:
+        params = parse_export_params(request.GET, LOG_FIELDS, LOG_FIELDS)
+    except HistoryQueryError as e:
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        collection = get_series_collection("modbus")
+        return export_response(collection, {'device_id': device_id}, params, f"device_{device_id}_logs")
+    except Exception as e:
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _snapshot_params(request):
+    """
+    Validate the parameters of the dashboard snapshot: device (optional) and limit.
+
+    Returns:
+        tuple: (device id or None, log page size).
+
+    Raises:
+        HistoryQueryError: If a parameter is invalid.
+    """
+    device = request.GET.get('device')
+    if device and not device.isdigit():
+        raise HistoryQueryError("'device' must be a device id.")
+    params = parse_history_params({'limit': request.GET['limit']} if request.GET.get('limit') else {},
+                                  LOG_FIELDS, LOG_FIELDS)
+    return int(device) if device else None, params['limit']
+
+
+def _snapshot_paginator():
+    # "limit" selects the log page size here, device pages have the default size
+    paginator = DeviceCursorPagination()
+    paginator.page_size_query_param = None
+    return paginator
+
+
+def _snapshot_etag(request):
+    try:
+        device_id, limit = _snapshot_params(request)
+        validate_device_listing(request, _snapshot_paginator())
+    except (HistoryQueryError, APIException):
+        # Answered with 400 or 404 by the view
+        return None
+    state = {"server": is_server_running()}
+    if device_id:
+        # The newest stored reading identifies the log page, the poller bumps no counter per reading
+        state["logs"] = latest_position(get_series_collection("modbus"), {'device_id': device_id})
+    # The device page depends on the listing parameters as well
+    listing = {name: request.GET.get(name) for name in ("cursor", "is_active", "search")}
+    return snapshot_etag(["modbus:devices"], state, dict(listing, device=device_id, limit=limit))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@snapshot_condition(_snapshot_etag)
+def dashboard_snapshot(request):
+    """
+    Return the whole state of the Modbus dashboard in one response: server status,
+    one page of devices and the latest logs of the selected device. The log selector
+    reads one page of active devices matching its search prefix from get_active_devices.
+
+    Query parameters: device (id of the device whose logs are included) and limit (of logs),
+    and cursor, is_active and search of the device page (see IoT_system.pagination).
+    The response carries an ETag derived from version counters (see IoT_system.snapshot),
+    so a poll sending it back in If-None-Match gets 304 Not Modified while nothing changed.
+
+    Returns:
+        ORJSONResponse: Snapshot or error message.
+    """
+    try:
+        device_id, limit = _snapshot_params(request)
+    except HistoryQueryError as e:
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        devices, paginator = paginate_devices(request, ModbusDevice.objects.values(*DEVICE_LIST_FIELDS),
+                                              DEVICE_SEARCH_FIELDS, _snapshot_paginator())
+        logs = []
+        if device_id:
+            params = {"start": None, "end": None, "limit": limit, "cursor": None, "fields": LOG_FIELDS}
+            collection = get_series_collection("modbus")
+            documents, _ = fetch_latest_page(collection, "modbus", device_id, {'device_id': device_id}, params)
+            logs = [dict({field: document.get(field) for field in LOG_FIELDS},
+                         timestamp=round(document['timestamp'], 2)) for document in documents]
+
+        response = ORJSONResponse({
+            "server": {"running": is_server_running()},
+            "devices": devices,
+            "devices_next": paginator.get_next_link(),
+            "devices_previous": paginator.get_previous_link(),
+            "logs": logs,
+        })
+        # Revalidate on every poll, a 304 is a single read of the version counters
+        response["Cache-Control"] = "private, no-cache"
+        return response
+    except APIException:
+        # Invalid cursor or is_active, answered 404/400 by DRF
+        raise
+    except Exception as e:
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,457 @@
+import os
+import asyncio
+import logging
+import time
+import paho.mqtt.client as mqtt
+from paho.mqtt.subscribeoptions import SubscribeOptions
+from dotenv import load_dotenv
+
+from .mqtt_subscriber import (DEVICE_COMMANDS, SUBSCRIBE_QOS, SUBSCRIBE_BATCH_SIZE, SUBSCRIPTION_POLL_INTERVAL,
+                              SHARED_GROUP, build_client, connect_properties, default_client_id, topic_filter,
+                              parse_command_topic, send_reply, backoff_delay, _batched)
+from .telemetry_ingest import TelemetryIngestor, TELEMETRY_INGEST_ENABLED
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of messages buffered per in-process consumer before new messages are dropped
+CONSUMER_QUEUE_SIZE = int(os.getenv('MQTT_CONSUMER_QUEUE_SIZE', 1000))
+
+# Subscriber hosted by the ASGI application (see IoT_system/asgi.py)
+_hosted_subscriber = None
+
+
+class AsyncMQTTSubscriber:
+    """
+    MQTT subscriber running entirely on an asyncio event loop.
+
+    The paho client is driven by the loop's reader/writer callbacks instead of a
+    network thread, device updates use Django's async ORM, and other in-process
+    consumers can read incoming messages through the `messages()` async iterator.
+    """
+
+    def __init__(self, client_id=None, shared_group=SHARED_GROUP):
+        from mqtt_devices.models import MQTTDevice
+        self.Device = MQTTDevice
+        self.shared_group = shared_group
+        self.client_id = client_id or default_client_id(shared_group)
+        self.client = None
+        self.connected = False
+        self.loop = None
+
+        self.subscriptions = set()
+        # Topic filters of SUBSCRIBE packets still waiting for a SUBACK, by message id
+        self._pending_subscribes = {}
+        self._consumers = set()
+        self._tasks = set()
+        self._misc_task = None
+        self._supervisor_task = None
+        self._sync_task = None
+        self._socket_closed = None
+        self._sync_event = None
+        self._stopping = False
+        self._connect_attempts = 0
+        self._disconnected_at = None
+        # Telemetry ingestion stage for device status topics; writes happen on its own writer thread
+        self.ingestor = TelemetryIngestor() if TELEMETRY_INGEST_ENABLED else None
+        self.metrics = {
+            "connects": 0,
+            "disconnects": 0,
+            "reconnect_attempts": 0,
+            "reconnects": 0,
+            "last_reconnect_seconds": None,
+            "messages": 0,
+            "dropped_messages": 0,
+        }
+
+    async def start(self):
+        """
+        Start the subscriber on the running event loop. Returns immediately,
+        connecting and reconnecting happens in a background task.
+        """
+        from django.db.models.signals import post_save, post_delete
+
+        if self._supervisor_task and not self._supervisor_task.done():
+            return
+        self.loop = asyncio.get_running_loop()
+        self._stopping = False
+        self._socket_closed = asyncio.Event()
+        self._sync_event = asyncio.Event()
+
+        if self.ingestor is not None:
+            self.ingestor.start()
+        self.client = build_client(self.client_id)
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_subscribe = self.on_subscribe
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+        post_save.connect(self._on_device_changed, sender=self.Device)
+        post_delete.connect(self._on_device_changed, sender=self.Device)
+        self._supervisor_task = self.loop.create_task(self._supervise())
+        self._sync_task = self.loop.create_task(self._sync_loop())
+
+    async def stop(self):
+        """
+        Disconnect from the broker and cancel all background tasks.
+        """
+        from django.db.models.signals import post_save, post_delete
+
+        post_save.disconnect(self._on_device_changed, sender=self.Device)
+        post_delete.disconnect(self._on_device_changed, sender=self.Device)
+        self._stopping = True
+        if self.client and self.connected:
+            self.client.disconnect()
+            try:
+                await asyncio.wait_for(self._socket_closed.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                logger.warning("Timed out waiting for MQTT disconnect")
+
+        for task in (self._supervisor_task, self._sync_task, self._misc_task, *self._tasks):
+            if task and not task.done():
+                task.cancel()
+        self.client = None
+        if self.ingestor is not None:
+            await self.loop.run_in_executor(None, self.ingestor.stop)
+        logger.info("Async MQTT subscriber stopped")
+
+    def is_running(self):
+        """
+        Check whether the subscriber supervisor task is alive (connected or reconnecting).
+        """
+        return self._supervisor_task is not None and not self._supervisor_task.done()
+
+    def get_metrics(self):
+        """
+        Return connection and message metrics of the subscriber.
+        """
+        metrics = dict(self.metrics, client_id=self.client_id, connected=self.connected,
+                       subscriptions=len(self.subscriptions), consumers=len(self._consumers))
+        if self.ingestor is not None:
+            metrics["telemetry"] = self.ingestor.get_metrics()
+        return metrics
+
+    async def messages(self, topic_filter="#"):
+        """
+        Async iterator over incoming messages for in-process consumers.
+
+        Each consumer gets its own bounded queue; when a consumer falls behind by more
+        than CONSUMER_QUEUE_SIZE messages, new messages are dropped for it only.
+
+        Args:
+            topic_filter (str): MQTT topic filter selecting the messages to yield.
+
+        Yields:
+            mqtt.MQTTMessage: Received messages in arrival order.
+        """
+        queue = asyncio.Queue(maxsize=CONSUMER_QUEUE_SIZE)
+        consumer = (topic_filter, queue)
+        self._consumers.add(consumer)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._consumers.discard(consumer)
+
+    # Event loop integration of the paho client
+
+    def _call_in_loop(self, callback, *args):
+        """
+        Run a callback on the subscriber event loop, which is required for
+        add_reader/add_writer when paho calls back from the connect executor.
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._call_in_loop(self._watch_socket, sock)
+
+    def _watch_socket(self, sock):
+        self._socket_closed.clear()
+        self.loop.add_reader(sock, self.client.loop_read)
+        self._misc_task = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._call_in_loop(self._unwatch_socket, sock)
+
+    def _unwatch_socket(self, sock):
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+        if self._misc_task:
+            self._misc_task.cancel()
+        self._socket_closed.set()
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._call_in_loop(self.loop.add_writer, sock, self.client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call_in_loop(self.loop.remove_writer, sock)
+
+    async def _misc_loop(self):
+        """
+        Periodic paho housekeeping (keepalive pings, retries) while the socket is open.
+        """
+        while self.client and self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    async def _supervise(self):
+        """
+        Connect to the broker and reconnect with exponential backoff and jitter
+        whenever the socket closes, reusing the client and its persistent session.
+        """
+        broker = os.getenv('MQTT_BROKER')
+        port = int(os.getenv('MQTT_PORT', 8883))
+        first_connect = True
+
+        while not self._stopping:
+            if self._connect_attempts:
+                delay = backoff_delay(self._connect_attempts)
+                logger.info("Reconnecting to MQTT broker in %.1fs (attempt %s)", delay, self._connect_attempts + 1)
+                await asyncio.sleep(delay)
+            self._connect_attempts += 1
+            if not first_connect:
+                self.metrics["reconnect_attempts"] += 1
+
+            try:
+                # The TCP/TLS handshake is blocking, so it runs in the default executor
+                if first_connect:
+                    await self.loop.run_in_executor(None, lambda: self.client.connect(
+                        broker, port, 60, clean_start=False, properties=connect_properties()))
+                    first_connect = False
+                else:
+                    await self.loop.run_in_executor(None, self.client.reconnect)
+            except Exception as e:
+                logger.warning("Connection attempt %s failed: %s", self._connect_attempts, e)
+                continue
+
+            await self._socket_closed.wait()
+
+    # MQTT callbacks, invoked on the event loop by loop_read/loop_write
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc != 0:
+            logger.error("Connection failed with code %s", rc)
+            return
+        self.connected = True
+        self._connect_attempts = 0
+        self.metrics["connects"] += 1
+        if self._disconnected_at is not None:
+            self.metrics["reconnects"] += 1
+            self.metrics["last_reconnect_seconds"] = round(time.monotonic() - self._disconnected_at, 3)
+            self._disconnected_at = None
+        logger.info("Successfully connected to MQTT broker (session present: %s)", flags.session_present)
+        # SUBACKs of the previous connection will not arrive any more
+        self._pending_subscribes.clear()
+        if not flags.session_present:
+            self.subscriptions.clear()
+        self._sync_event.set()
+
+    def on_disconnect(self, client, userdata, flags, rc, properties=None):
+        self.connected = False
+        self.metrics["disconnects"] += 1
+        if self._disconnected_at is None:
+            self._disconnected_at = time.monotonic()
+        logger.warning("Disconnected from MQTT broker (code: %s)", rc)
+
+    def on_subscribe(self, client, userdata, mid, reason_codes, properties=None):
+        """
+        Callback when the broker acknowledges a SUBSCRIBE packet. Topic filters it rejected
+        are removed from the subscription set, so the next sync retries them.
+        """
+        topics = self._pending_subscribes.pop(mid, [])
+        for topic, reason_code in zip(topics, reason_codes):
+            if reason_code.is_failure:
+                self.subscriptions.discard(topic)
+                logger.warning("Broker rejected subscription to %s: %s", topic, reason_code)
+
+    def on_message(self, client, userdata, msg):
+        self.metrics["messages"] += 1
+        for pattern, queue in self._consumers:
+            if mqtt.topic_matches_sub(pattern, msg.topic):
+                try:
+                    queue.put_nowait(msg)
+                except asyncio.QueueFull:
+                    self.metrics["dropped_messages"] += 1
+
+        if self.ingestor is not None and msg.topic in self.ingestor.devices:
+            self.ingestor.handle(msg.topic, msg.payload)
+            return
+
+        serial_number = parse_command_topic(msg.topic)
+        if serial_number is not None:
+            self._spawn(self.handle_command(serial_number, msg))
+
+    def _spawn(self, coroutine):
+        """
+        Run a coroutine as a tracked background task.
+        """
+        task = self.loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def handle_command(self, serial_number, msg):
+        """
+        Apply a START/STOP command to a device using the async ORM and answer
+        on the command's response topic, if it has one.
+
+        Args:
+            serial_number (str): Serial number taken from the command topic.
+            msg (mqtt.MQTTMessage): The command message.
+        """
+        payload = msg.payload.decode(errors="replace")
+        try:
+            device = await self.Device.objects.aget(serial_number=serial_number)
+        except self.Device.DoesNotExist:
+            logger.error("Device with serial_number %s not found.", serial_number)
+            self.client.publish(f"devices/{serial_number}/error", "Device not found")
+            send_reply(self.client, msg, "error", "Device not found")
+            return
+        except Exception as e:
+            logger.exception("Error processing MQTT message")
+            self.client.publish(f"devices/{serial_number}/error", str(e))
+            send_reply(self.client, msg, "error", str(e))
+            return
+
+        command = payload.upper()
+        if command not in DEVICE_COMMANDS:
+            logger.warning("Unknown command '%s' for device %s", payload, serial_number)
+            self.client.publish(f"devices/{serial_number}/error", f"Unknown command: {payload}")
+            send_reply(self.client, msg, "error", f"Unknown command: {payload}")
+            return
+
+        device.is_active = DEVICE_COMMANDS[command]
+        # asave() rather than aupdate() so that post_save receivers (subscription sync) still run
+        await device.asave(update_fields=["is_active"])
+        logger.info("Device %s set to %s", serial_number, 'active' if device.is_active else 'inactive')
+        send_reply(self.client, msg, "ok", {"is_active": device.is_active})
+
+    # Subscription sync
+
+    def _on_device_changed(self, sender, **kwargs):
+        """
+        Signal receiver for MQTTDevice saves and deletions; may run in any thread.
+        """
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._sync_event.set)
+
+    async def _sync_loop(self):
+        """
+        Keep subscriptions in sync with the device table, on device signals and
+        every SUBSCRIPTION_POLL_INTERVAL seconds.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._sync_event.wait(), timeout=SUBSCRIPTION_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._sync_event.clear()
+            if self.connected:
+                try:
+                    await self.sync_subscriptions()
+                except Exception:
+                    logger.exception("Subscription sync failed")
+
+    async def sync_subscriptions(self):
+        """
+        Diff the command and status topics of active devices against the current subscriptions
+        and send batched SUBSCRIBE/UNSUBSCRIBE packets for the difference.
+        """
+        rows = [
+            row async for row in self.Device.objects.filter(is_active=True).values_list(
+                'pk', 'serial_number', 'mqtt_command_topic', 'mqtt_status_topic')
+        ]
+        desired = set()
+        status_devices = {}
+        for pk, serial_number, command_topic, status_topic in rows:
+            desired.add(command_topic)
+            status_devices[status_topic] = (pk, serial_number)
+        if self.ingestor is not None:
+            self.ingestor.set_devices(status_devices)
+            desired.update(status_devices)
+        to_subscribe = sorted(desired - self.subscriptions)
+        to_unsubscribe = sorted(self.subscriptions - desired)
+
+        for batch in _batched(to_unsubscribe, SUBSCRIBE_BATCH_SIZE):
+            result, mid = self.client.unsubscribe([topic_filter(topic, self.shared_group) for topic in batch])
+            if result == mqtt.MQTT_ERR_SUCCESS:
+                self.subscriptions.difference_update(batch)
+
+        for batch in _batched(to_subscribe, SUBSCRIBE_BATCH_SIZE):
+            result, mid = self.client.subscribe(
+                [(topic_filter(topic, self.shared_group), SubscribeOptions(qos=SUBSCRIBE_QOS)) for topic in batch]
+            )
+            if result == mqtt.MQTT_ERR_SUCCESS:
+                self.subscriptions.update(batch)
+                # on_subscribe runs on this loop too, so it cannot see the SUBACK before this entry exists
+                self._pending_subscribes[mid] = batch
+
+        if to_subscribe or to_unsubscribe:
+            logger.info("Subscriptions synced: +%s -%s (%s total)",
+                        len(to_subscribe), len(to_unsubscribe), len(self.subscriptions))
+
+
+def get_hosted_subscriber():
+    """
+    Return the subscriber hosted by the ASGI application, if any.
+
+    Returns:
+        AsyncMQTTSubscriber or None: The running hosted subscriber.
+    """
+    return _hosted_subscriber
+
+
+async def start_hosted_subscriber():
+    """
+    Start the subscriber on the ASGI event loop (called on lifespan startup).
+    """
+    global _hosted_subscriber
+    if _hosted_subscriber is None:
+        _hosted_subscriber = AsyncMQTTSubscriber()
+        await _hosted_subscriber.start()
+
+
+async def stop_hosted_subscriber():
+    """
+    Stop the subscriber hosted on the ASGI event loop (called on lifespan shutdown).
+    """
+    global _hosted_subscriber
+    if _hosted_subscriber is not None:
+        await _hosted_subscriber.stop()
+        _hosted_subscriber = None
+
+
+async def main():
+    """
+    Run the async subscriber on its own event loop until interrupted.
+    """
+    subscriber = AsyncMQTTSubscriber()
+    await subscriber.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await subscriber.stop()
+
+
+if __name__ == "__main__":
+    # Entry point when running the module directly: python -m mqtt_clients.async_subscriber
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "IoT_system.settings")
+    import django
+    django.setup()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("Exiting...")
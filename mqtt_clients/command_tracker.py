@@ -0,0 +1,273 @@
+import os
+import time
+import uuid
+import heapq
+import asyncio
+import logging
+import threading
+from collections import deque
+import orjson
+from dotenv import load_dotenv
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Time (seconds) a device has to answer a command before it is marked as timed out
+COMMAND_TIMEOUT = float(os.getenv('MQTT_COMMAND_TIMEOUT', 30))
+# Number of finished commands whose outcome is kept for polling
+RESULT_RETENTION = int(os.getenv('MQTT_COMMAND_RESULT_RETENTION', 10000))
+# Topic prefix of the response topics devices reply to
+RESPONSE_TOPIC_PREFIX = os.getenv('MQTT_RESPONSE_TOPIC_PREFIX', 'iot/responses')
+
+# Reply status sent by the device -> final command status
+REPLY_STATUSES = {"ok": "completed", "error": "failed"}
+
+
+class CommandTracker:
+    """
+    In-memory table of commands waiting for a device reply.
+
+    Commands are published with an MQTT v5 correlation-data property holding the
+    command ID and a response-topic property; the reply is matched back by that ID.
+    Deadlines live in a heap processed by a single reaper thread, so thousands of
+    outstanding commands cost one heap entry each instead of one timer each.
+    Finished outcomes are kept for the last RESULT_RETENTION commands.
+    """
+
+    def __init__(self, timeout=COMMAND_TIMEOUT, retention=RESULT_RETENTION):
+        self.timeout = timeout
+        self.retention = retention
+        # Command ID -> command record, for pending and retained finished commands
+        self._commands = {}
+        # Finished command IDs in completion order, oldest are evicted first
+        self._finished = deque()
+        # Heap of (deadline, command ID) of pending commands
+        self._deadlines = []
+        # Command ID -> callbacks invoked with the record once the command finishes
+        self._waiters = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._reaper_thread = None
+        self.metrics = {
+            "registered": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeout": 0,
+            "unmatched_replies": 0,
+        }
+
+    def start(self):
+        """
+        Start the reaper thread that times out unanswered commands.
+        """
+        if self._reaper_thread and self._reaper_thread.is_alive():
+            return
+        self._reaper_thread = threading.Thread(target=self._reap, name="mqtt-command-reaper", daemon=True)
+        self._reaper_thread.start()
+
+    def register(self, serial_number, command, topic, timeout=None):
+        """
+        Add a command to the pending table before it is published.
+
+        Args:
+            serial_number (str): Serial number of the target device.
+            command (str): Command payload.
+            topic (str): Command topic.
+            timeout (float): Seconds to wait for the reply, defaults to COMMAND_TIMEOUT.
+
+        Returns:
+            str: Command ID, used as the MQTT correlation data.
+        """
+        command_id = uuid.uuid4().hex
+        deadline = time.monotonic() + (timeout or self.timeout)
+        record = {
+            "command_id": command_id,
+            "serial_number": serial_number,
+            "command": command,
+            "topic": topic,
+            "status": "pending",
+            "sent_at": time.time(),
+            "completed_at": None,
+            "response": None,
+        }
+        with self._lock:
+            self._commands[command_id] = record
+            self.metrics["registered"] += 1
+            heapq.heappush(self._deadlines, (deadline, command_id))
+            # Only the reaper's next deadline matters, wake it if this one is earlier
+            if self._deadlines[0][1] == command_id:
+                self._wakeup.notify()
+        return command_id
+
+    def fail(self, command_id, error):
+        """
+        Mark a command as failed without a device reply, e.g. when publishing it failed.
+
+        Args:
+            command_id (str): Command ID.
+            error (str): Failure description.
+        """
+        self._finish(command_id, "failed", {"error": error})
+
+    def resolve(self, correlation_data, payload):
+        """
+        Match a device reply to its pending command.
+
+        Args:
+            correlation_data (bytes): Correlation data of the reply (the command ID).
+            payload (bytes): Reply payload, e.g. {"status": "ok"} or {"status": "error", "detail": "..."}.
+
+        Returns:
+            bool: True if the reply finished a pending command.
+        """
+        command_id = correlation_data.decode(errors="replace") if correlation_data else None
+        try:
+            response = orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            response = {"status": "ok", "detail": payload.decode(errors="replace")}
+        if type(response) is not dict:
+            response = {"status": "ok", "detail": response}
+        status = REPLY_STATUSES.get(str(response.get("status", "ok")).lower(), "failed")
+
+        if command_id is None or not self._finish(command_id, status, response):
+            self.metrics["unmatched_replies"] += 1
+            return False
+        return True
+
+    def _finish(self, command_id, status, response):
+        """
+        Move a pending command to a final status and notify its waiters.
+
+        Returns:
+            bool: False if the command is unknown or already finished.
+        """
+        with self._lock:
+            record = self._commands.get(command_id)
+            if record is None or record["status"] != "pending":
+                return False
+            record["status"] = status
+            record["response"] = response
+            record["completed_at"] = time.time()
+            self.metrics[status] += 1
+            self._finished.append(command_id)
+            while len(self._finished) > self.retention:
+                self._commands.pop(self._finished.popleft(), None)
+            waiters = self._waiters.pop(command_id, ())
+            result = dict(record)
+
+        for callback in waiters:
+            try:
+                callback(result)
+            except Exception:
+                logger.exception("Command waiter failed")
+        return True
+
+    def _reap(self):
+        """
+        Reaper thread: marks commands whose deadline has passed as timed out.
+        Finished commands are popped lazily when their heap entry comes up.
+        """
+        while True:
+            with self._lock:
+                while True:
+                    if not self._deadlines:
+                        self._wakeup.wait()
+                        continue
+                    deadline, command_id = self._deadlines[0]
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        heapq.heappop(self._deadlines)
+                        break
+                    self._wakeup.wait(remaining)
+            self._finish(command_id, "timeout", None)
+
+    def get(self, command_id):
+        """
+        Return a copy of a command record.
+
+        Args:
+            command_id (str): Command ID.
+
+        Returns:
+            dict or None: The record, or None if the command is unknown or no longer retained.
+        """
+        with self._lock:
+            record = self._commands.get(command_id)
+            return dict(record) if record is not None else None
+
+    def add_waiter(self, command_id, callback):
+        """
+        Register a callback invoked with the record once the command finishes.
+
+        Args:
+            command_id (str): Command ID.
+            callback (callable): Called with the finished record, from the thread finishing the command.
+
+        Returns:
+            dict or None: The current record; the callback is not registered if the
+            command is unknown or already finished.
+        """
+        with self._lock:
+            record = self._commands.get(command_id)
+            if record is None:
+                return None
+            if record["status"] == "pending":
+                self._waiters.setdefault(command_id, []).append(callback)
+            return dict(record)
+
+    def remove_waiter(self, command_id, callback):
+        """
+        Unregister a callback added with add_waiter().
+        """
+        with self._lock:
+            callbacks = self._waiters.get(command_id)
+            if callbacks and callback in callbacks:
+                callbacks.remove(callback)
+                if not callbacks:
+                    del self._waiters[command_id]
+
+    async def wait(self, command_id, timeout):
+        """
+        Wait on the running event loop, without blocking it, until a command finishes.
+
+        Args:
+            command_id (str): Command ID.
+            timeout (float): Maximum time to wait, in seconds.
+
+        Returns:
+            dict or None: The record (still "pending" if the timeout elapsed first),
+            or None if the command is unknown.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def set_result(record):
+            if not future.done():
+                future.set_result(record)
+
+        def callback(record):
+            loop.call_soon_threadsafe(set_result, record)
+
+        record = self.add_waiter(command_id, callback)
+        if record is None or record["status"] != "pending" or timeout <= 0:
+            self.remove_waiter(command_id, callback)
+            return record
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.remove_waiter(command_id, callback)
+            return self.get(command_id)
+
+    def get_metrics(self):
+        """
+        Return command outcome counters and the number of pending commands.
+
+        Returns:
+            dict: Counters of registered, completed, failed and timed out commands.
+        """
+        with self._lock:
+            pending = len(self._commands) - len(self._finished)
+        return dict(self.metrics, pending=pending)
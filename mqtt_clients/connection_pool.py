@@ -0,0 +1,353 @@
+import os
+import time
+import socket
+import logging
+import itertools
+import threading
+from collections import deque
+import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from paho.mqtt.subscribeoptions import SubscribeOptions
+from dotenv import load_dotenv
+
+from .mqtt_subscriber import build_client, topic_filter, RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY
+from .command_tracker import CommandTracker, RESPONSE_TOPIC_PREFIX
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Number of long-lived broker connections per process
+POOL_SIZE = int(os.getenv('MQTT_POOL_SIZE', 4))
+# Maximum time (seconds) to wait for a connection and for the QoS acknowledgement of a publish
+PUBLISH_TIMEOUT = float(os.getenv('MQTT_PUBLISH_TIMEOUT', 5))
+# Maximum number of unacknowledged QoS>0 messages per connection, allows pipelining bulk publishes
+MAX_INFLIGHT = int(os.getenv('MQTT_POOL_MAX_INFLIGHT', 500))
+# Number of most recent publish latencies kept for percentiles
+LATENCY_WINDOW = 2048
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class LatencyStats:
+    """Thread-safe latency statistics over a sliding window of recent samples."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def summary(self):
+        """
+        Return count, error count and latency percentiles in milliseconds.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+            count, errors, total = self.count, self.errors, self.total
+        result = {"count": count, "errors": errors, "avg_ms": round(total / count * 1000, 3) if count else None}
+        for name, quantile in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            result[name] = round(samples[min(len(samples) - 1, int(quantile * len(samples)))] * 1000, 3) \
+                if samples else None
+        result["max_ms"] = round(samples[-1] * 1000, 3) if samples else None
+        return result
+
+
+class PublishTimeout(TimeoutError):
+    """Raised when the broker does not acknowledge a QoS>0 publish in time."""
+
+
+class MQTTConnectionPool:
+    """
+    Process-wide pool of long-lived, authenticated MQTT connections.
+
+    Each connection runs its own paho network thread, which reconnects with backoff
+    on failure. Publishes are spread round-robin over the connected clients, so a
+    command costs one PUBLISH (and its acknowledgement for QoS>0) instead of a TCP
+    and TLS handshake, CONNECT and DISCONNECT.
+
+    Device replies to tracked commands arrive on the pool's response topic, which all
+    connections subscribe to as one shared subscription group, so each reply is
+    delivered once to whichever connection is up and resolved in `tracker`.
+    """
+
+    def __init__(self, size=POOL_SIZE, client_id_prefix=None):
+        self.size = size
+        self.client_id_prefix = client_id_prefix or f"publisher-{socket.gethostname()}-{os.getpid()}"
+        self.clients = []
+        self.latency = LatencyStats()
+        self._round_robin = itertools.count()
+        self._connected = threading.Condition()
+        # One dict per running QoS>0 publish_many() batch: (client, mid) -> time the broker acknowledged it
+        self._ack_collectors = []
+        self._ack_lock = threading.Lock()
+        self.response_topic = f"{RESPONSE_TOPIC_PREFIX}/{self.client_id_prefix}"
+        self.tracker = CommandTracker()
+
+    def start(self):
+        """
+        Create the connections; they connect in the background.
+        """
+        broker = os.getenv('MQTT_BROKER')
+        port = int(os.getenv('MQTT_PORT', 8883))
+        self.tracker.start()
+        for index in range(self.size):
+            client_id = f"{self.client_id_prefix}-{index}"
+            client = build_client(client_id)
+            client.user_data_set(client_id)
+            client.on_connect = self._on_connect
+            client.on_disconnect = self._on_disconnect
+            client.on_message = self._on_message
+            client.on_publish = self._on_publish
+            client.max_inflight_messages_set(MAX_INFLIGHT)
+            client.reconnect_delay_set(min_delay=int(RECONNECT_MIN_DELAY), max_delay=int(RECONNECT_MAX_DELAY))
+            client.connect_async(broker, port, 60)
+            client.loop_start()
+            self.clients.append(client)
+        logger.info("Started MQTT connection pool with %s connections", self.size)
+
+    def stop(self):
+        """
+        Disconnect all connections and stop their network threads.
+        """
+        for client in self.clients:
+            client.disconnect()
+            client.loop_stop()
+        self.clients = []
+
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc == 0:
+            client.subscribe(topic_filter(self.response_topic, self.client_id_prefix), options=SubscribeOptions(qos=1))
+            with self._connected:
+                self._connected.notify_all()
+        else:
+            logger.error("Pool connection %s refused: %s", userdata, rc)
+
+    def _on_disconnect(self, client, userdata, flags, rc, properties=None):
+        logger.warning("Pool connection %s lost (code: %s)", userdata, rc)
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        if not self._ack_collectors:
+            return
+        acknowledged = time.perf_counter()
+        with self._ack_lock:
+            for collector in self._ack_collectors:
+                collector[(client, mid)] = acknowledged
+
+    def _on_message(self, client, userdata, msg):
+        correlation_data = getattr(msg.properties, "CorrelationData", None)
+        self.tracker.resolve(correlation_data, msg.payload)
+
+    def request_properties(self, command_id):
+        """
+        Build PUBLISH properties asking the device to reply to this pool.
+
+        Args:
+            command_id (str): Command ID returned by tracker.register().
+
+        Returns:
+            Properties: PUBLISH properties with the response topic and correlation data.
+        """
+        properties = Properties(PacketTypes.PUBLISH)
+        properties.ResponseTopic = self.response_topic
+        properties.CorrelationData = command_id.encode()
+        return properties
+
+    def acquire(self, timeout=PUBLISH_TIMEOUT):
+        """
+        Return the next connected client in round-robin order, waiting for one if needed.
+
+        Args:
+            timeout (float): Maximum time to wait for a connection, in seconds.
+
+        Returns:
+            mqtt.Client: A connected client.
+
+        Raises:
+            ConnectionError: If no connection is available within the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._connected:
+            while True:
+                start = next(self._round_robin)
+                for offset in range(len(self.clients)):
+                    client = self.clients[(start + offset) % len(self.clients)]
+                    if client.is_connected():
+                        return client
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ConnectionError("No MQTT connection available")
+                self._connected.wait(remaining)
+
+    def publish(self, topic, payload, qos=0, timeout=PUBLISH_TIMEOUT, properties=None):
+        """
+        Publish a message over a pooled connection.
+
+        For QoS 1 and 2 this waits until the broker has acknowledged the message.
+
+        Args:
+            topic (str): Topic to publish to.
+            payload (str or bytes): Message payload.
+            qos (int): MQTT QoS level.
+            timeout (float): Maximum time for getting a connection and the acknowledgement, in seconds.
+            properties (Properties): Optional MQTT v5 PUBLISH properties.
+
+        Returns:
+            float: Publish latency in seconds.
+
+        Raises:
+            ConnectionError: If no connection is available or the publish was rejected.
+            PublishTimeout: If the acknowledgement did not arrive in time.
+        """
+        started = time.perf_counter()
+        try:
+            client = self.acquire(timeout)
+            info = client.publish(topic, payload, qos=qos, properties=properties)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                raise ConnectionError(f"Publish failed: {mqtt.error_string(info.rc)}")
+            if qos > 0:
+                self.wait_for_ack(info, started + timeout - time.perf_counter())
+        except Exception:
+            self.latency.record_error()
+            raise
+        elapsed = time.perf_counter() - started
+        self.latency.record(elapsed)
+        return elapsed
+
+    def publish_many(self, messages, qos=0, timeout=PUBLISH_TIMEOUT):
+        """
+        Publish many messages over the pooled connections without waiting between them.
+
+        All messages are queued first, spread round-robin over the connections, and the
+        QoS acknowledgements are then awaited against one shared deadline, so the broker
+        round trips overlap instead of adding up. The latency of each message runs from
+        its own publish call to its acknowledgement, as for publish().
+
+        Args:
+            messages (list): (topic, payload) or (topic, payload, properties) tuples.
+            qos (int): MQTT QoS level for all messages.
+            timeout (float): Maximum total time for the whole batch, in seconds.
+
+        Returns:
+            list: For each message in order, the latency in seconds or the exception that occurred.
+        """
+        deadline = time.perf_counter() + timeout
+        # Registered before the first publish, so no acknowledgement of the batch is missed
+        acknowledged = {}
+        if qos > 0:
+            with self._ack_lock:
+                self._ack_collectors.append(acknowledged)
+        try:
+            return self._publish_batch(messages, qos, deadline, acknowledged)
+        finally:
+            if qos > 0:
+                with self._ack_lock:
+                    self._ack_collectors.remove(acknowledged)
+
+    def _publish_batch(self, messages, qos, deadline, acknowledged):
+        pending = []
+        for topic, payload, *properties in messages:
+            started = time.perf_counter()
+            try:
+                client = self.acquire(max(deadline - time.perf_counter(), 0))
+                info = client.publish(topic, payload, qos=qos, properties=properties[0] if properties else None)
+                if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                    raise ConnectionError(f"Publish failed: {mqtt.error_string(info.rc)}")
+                # QoS 0 is done once queued, as in publish()
+                pending.append((client, info, started, time.perf_counter()))
+            except Exception as e:
+                pending.append(e)
+
+        results = []
+        for entry in pending:
+            if isinstance(entry, Exception):
+                self.latency.record_error()
+                results.append(entry)
+                continue
+            client, info, started, finished = entry
+            try:
+                if qos > 0:
+                    self.wait_for_ack(info, deadline - time.perf_counter())
+                    # The acknowledgement may have arrived long before the loop got to this message
+                    finished = acknowledged.get((client, info.mid)) or time.perf_counter()
+            except Exception as e:
+                self.latency.record_error()
+                results.append(e)
+                continue
+            elapsed = finished - started
+            self.latency.record(elapsed)
+            results.append(elapsed)
+        return results
+
+    @staticmethod
+    def wait_for_ack(info, timeout):
+        """
+        Wait for the acknowledgement of a QoS>0 publish.
+
+        Args:
+            info (mqtt.MQTTMessageInfo): Result of client.publish().
+            timeout (float): Maximum time to wait, in seconds.
+
+        Raises:
+            PublishTimeout: If the acknowledgement did not arrive in time.
+        """
+        try:
+            info.wait_for_publish(timeout=max(timeout, 0))
+        except (RuntimeError, ValueError) as e:
+            raise ConnectionError(str(e))
+        if not info.is_published():
+            raise PublishTimeout("Timed out waiting for publish acknowledgement")
+
+    def stats(self):
+        """
+        Return connection state and command latency statistics.
+
+        Returns:
+            dict: Pool size, connected count, latency summary and command outcome counters.
+        """
+        return {
+            "size": self.size,
+            "connected": sum(client.is_connected() for client in self.clients),
+            "latency": self.latency.summary(),
+            "commands": self.tracker.get_metrics(),
+        }
+
+
+def get_pool(create=True):
+    """
+    Return the process-wide connection pool, creating it on first use.
+    A pool inherited through fork() is replaced, since its network threads do not survive the fork.
+
+    Args:
+        create (bool): If False, return None instead of creating a missing pool.
+
+    Returns:
+        MQTTConnectionPool: The started pool, or None.
+    """
+    global _pool, _pool_pid
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    if not create:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            pool = MQTTConnectionPool()
+            pool.start()
+            _pool, _pool_pid = pool, os.getpid()
+    return _pool
@@ -4,13 +4,22 @@ import time
 import ssl
 import threading
 import json
+import logging
 import requests
 import paho.mqtt.client as mqtt
-from pymongo import MongoClient
+from IoT_system.timeseries import get_series_collection
+from IoT_system.rollups import record_sample
+from IoT_system.latest import record_latest
+from IoT_system.current import record_value
+from IoT_system.retention import stamp_expiry
+from IoT_system.events import publish_event
+from IoT_system.snapshot import bump_version
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configuration parameters from .env
 BROKER_ADDRESS = os.getenv('MQTT_BROKER')
 BROKER_PORT = int(os.getenv('MQTT_PORT'))
@@ -19,18 +28,9 @@ MQTT_PASSWORD = os.getenv('MQTT_PASSWORD')
 PUBLISH_TOPIC = os.getenv('MQTT_PUBLISH_TOPIC')
 INTERVAL = 10  # Interval between publishing in seconds
 
-MONGO_URI = os.getenv('MONGO_URI')
-DB_NAME = os.getenv('MONGO_DB_NAME')
-COLLECTION_NAME = os.getenv('MQTT_COLLECTION_NAME')
-
 API_KEY = os.getenv('COINCAP_API_KEY')
 API_URL = "https://rest.coincap.io/v3/assets"
 
-# Initialize MongoDB client once at module level
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client[DB_NAME]
-collection = db[COLLECTION_NAME]
-
 # Internal thread control flags
 _publisher_thread = None
 _stop_event = threading.Event()
@@ -56,7 +56,7 @@ def fetch_crypto_data(limit=2):
 
         result = []
         for asset in selected:
-            print(asset)  # Debug print of raw API data
+            logger.debug("Raw API asset: %s", asset)
             result.append({
                 "name": asset["name"],
                 "symbol": asset["symbol"],
@@ -65,7 +65,7 @@ def fetch_crypto_data(limit=2):
             })
         return result
     except Exception as e:
-        print(f"[ERROR] Failed to fetch crypto data: {e}")
+        logger.error("Failed to fetch crypto data: %s", e)
         return []
 
 
@@ -94,8 +94,18 @@ def _run_publisher():
             client.publish(PUBLISH_TOPIC, payload)
 
             # Save each item to MongoDB
+            collection = get_series_collection("mqtt")
             for item in data:
-                collection.insert_one(item)
+                collection.insert_one(stamp_expiry("mqtt", item["symbol"], item))
+                record_sample("mqtt", item["symbol"], item["timestamp"], item["priceUsd"])
+                # Latest-values buffers of the symbol and of the feed of all symbols
+                record_latest("mqtt", item["symbol"], item)
+                record_latest("mqtt", None, item)
+                record_value("mqtt", item["symbol"], item["priceUsd"], item["timestamp"])
+                publish_event("mqtt", "price",
+                              {field: item[field] for field in ("timestamp", "name", "symbol", "priceUsd")})
+            # Invalidate the dashboard snapshots, once per batch
+            bump_version("mqtt:data")
 
         time.sleep(INTERVAL)
 
@@ -115,9 +125,9 @@ def on_connect(client, userdata, flags, rc):
         rc: The connection result code.
     """
     if rc == 0:
-        print("[INFO] Connected to MQTT broker")
+        logger.info("Connected to MQTT broker")
     else:
-        print(f"[ERROR] Failed to connect. Return code: {rc}")
+        logger.error("Failed to connect. Return code: %s", rc)
 
 
 def publish_loop(client):
@@ -133,17 +143,25 @@ def publish_loop(client):
         if crypto_data:
             payload = json.dumps(crypto_data)
             client.publish(PUBLISH_TOPIC, payload)
-            print(f"[PUBLISHED] {payload}")
+            logger.debug("Published %s", payload)
 
             # Insert each item into MongoDB
+            collection = get_series_collection("mqtt")
             for item in crypto_data:
                 try:
-                    collection.insert_one(item)
-                    print(f"[MONGODB] Inserted: {item}")
+                    collection.insert_one(stamp_expiry("mqtt", item["symbol"], item))
+                    record_sample("mqtt", item["symbol"], item["timestamp"], item["priceUsd"])
+                    record_latest("mqtt", item["symbol"], item)
+                    record_latest("mqtt", None, item)
+                    record_value("mqtt", item["symbol"], item["priceUsd"], item["timestamp"])
+                    publish_event("mqtt", "price",
+                                  {field: item[field] for field in ("timestamp", "name", "symbol", "priceUsd")})
+                    logger.debug("Inserted into MongoDB: %s", item)
                 except Exception as e:
-                    print(f"[ERROR] MongoDB insert failed: {e}")
+                    logger.error("MongoDB insert failed: %s", e)
+            bump_version("mqtt:data")
         else:
-            print("[INFO] No crypto data fetched.")
+            logger.info("No crypto data fetched.")
 
         time.sleep(INTERVAL)
 
@@ -163,6 +181,7 @@ def start_publisher():
     _publisher_thread = threading.Thread(target=_run_publisher, daemon=True)
     _publisher_thread.start()
     _is_running = True
+    publish_event("mqtt", "publisher_status", {"running": True})
     return True
 
 
@@ -176,6 +195,7 @@ def stop_publisher():
     global _is_running
     _stop_event.set()
     _is_running = False
+    publish_event("mqtt", "publisher_status", {"running": False})
     return True
 
 
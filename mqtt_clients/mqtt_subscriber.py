@@ -3,42 +3,103 @@ import sys
 import time
 import ssl
 import logging
+import queue
+import random
+import socket
+import threading
+import orjson
 import paho.mqtt.client as mqtt
 from paho.mqtt.client import CallbackAPIVersion
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from paho.mqtt.subscribeoptions import SubscribeOptions
 from dotenv import load_dotenv
 
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure logging
+# Logging is configured by Django (LOGGING in settings), records are written on a background thread
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.DEBUG,  # Use DEBUG for detailed output, WARNING for general info
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+
+# Commands accepted on device command topics, mapped to the resulting is_active value
+DEVICE_COMMANDS = {"START": True, "STOP": False}
+
+# QoS used for device command subscriptions
+SUBSCRIBE_QOS = 1
+# Maximum number of topic filters sent in a single SUBSCRIBE/UNSUBSCRIBE packet
+SUBSCRIBE_BATCH_SIZE = int(os.getenv('MQTT_SUBSCRIBE_BATCH_SIZE', 100))
+# Interval (seconds) for polling the device table for changes made by other processes
+SUBSCRIPTION_POLL_INTERVAL = float(os.getenv('MQTT_SUBSCRIPTION_POLL_INTERVAL', 1))
+
+# Shared subscription group; when set, command topics are subscribed as $share/<group>/<topic>
+# so that the broker load-balances commands across all subscriber instances of the group
+SHARED_GROUP = os.getenv('MQTT_SHARED_GROUP') or None
+# Base client ID of subscriber instances
+CLIENT_ID_PREFIX = os.getenv('MQTT_SUBSCRIBER_CLIENT_ID', 'device_123_subscriber')
+
+# Reconnect backoff bounds (seconds); the delay doubles per failed attempt and is jittered
+RECONNECT_MIN_DELAY = float(os.getenv('MQTT_RECONNECT_MIN_DELAY', 1))
+RECONNECT_MAX_DELAY = float(os.getenv('MQTT_RECONNECT_MAX_DELAY', 60))
+# How long (seconds) the broker keeps the session and queued QoS>0 messages after a disconnect
+SESSION_EXPIRY_INTERVAL = int(os.getenv('MQTT_SESSION_EXPIRY_INTERVAL', 3600))
 
 
 class MQTTSubscriber:
-    def __init__(self):
+    def __init__(self, client_id=None, shared_group=SHARED_GROUP):
         """
         Initialize the MQTTSubscriber instance.
         Sets up Django, loads MQTTDevice model, and attempts to initialize the MQTT client.
+
+        Args:
+            client_id (str): Client ID of this instance, unique per instance when running a group.
+            shared_group (str): Shared subscription group name, or None for plain subscriptions.
         """
         self.setup_django()
         from mqtt_devices.models import MQTTDevice
+        # Absolute import after setup_django(), so running this file directly works too
+        from mqtt_clients.telemetry_ingest import TelemetryIngestor, TELEMETRY_INGEST_ENABLED
         self.Device = MQTTDevice
+        self.shared_group = shared_group
+        self.client_id = client_id or default_client_id(shared_group)
         self.client = None
         self.connected = False
-        self.max_retries = 5
-        self.retry_delay = 3
+
+        # Reconnect supervisor state; the supervisor thread owns the client network loop
+        self._supervisor_thread = None
+        self._supervisor_stop = threading.Event()
+        self._socket_open = False
+        self._connect_attempts = 0
+        self._disconnected_at = None
+        # Telemetry ingestion stage for device status topics
+        self.ingestor = TelemetryIngestor() if TELEMETRY_INGEST_ENABLED else None
+        self.metrics = {
+            "connects": 0,
+            "disconnects": 0,
+            "reconnect_attempts": 0,
+            "reconnects": 0,
+            "last_reconnect_seconds": None,
+            "max_reconnect_seconds": None,
+        }
+
+        # Topic filters the broker currently holds for this client (owned by the sync thread)
+        self.subscriptions = set()
+        # Topic filters of SUBSCRIBE packets still waiting for a SUBACK, by message id
+        self._pending_subscribes = {}
+        # SUBACKs handed over from the network thread to the sync thread
+        self._subacks = queue.SimpleQueue()
+        self._resubscribe = False
+        # Set whenever the device table changes to wake up the sync thread
+        self._sync_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._sync_thread = None
 
         self.setup_django()  # Redundant but safe in case the first fails silently
 
         try:
             self.initialize_client()
         except Exception as e:
-            logger.error(f"Initial MQTT connection failed: {e}")
+            logger.error("MQTT initialization failed: %s", e)
 
     def setup_django(self):
         """
@@ -52,66 +113,121 @@ class MQTTSubscriber:
 
     def initialize_client(self):
         """
-        Initialize the MQTT client, set up callbacks, and attempt connection with retries.
+        Create the MQTT client once and start the supervisor thread that connects it.
+
+        The client is reused for every reconnect with a persistent session
+        (clean_start=False and a session expiry interval), so the broker keeps
+        subscriptions and queued messages across short outages.
+
         Raises:
-            Exception if connection fails after all retries or configuration is invalid.
+            ValueError: If the broker configuration is missing.
         """
-        try:
-            broker = os.getenv('MQTT_BROKER')
-            port = int(os.getenv('MQTT_PORT'))
-            username = os.getenv('MQTT_USERNAME')
-            password = os.getenv('MQTT_PASSWORD')
-
-            if not broker:
-                raise ValueError("MQTT_BROKER environment variable not set")
-
-            # Create and configure MQTT client
-            self.client = mqtt.Client(
-                client_id="device_123_subscriber",
-                callback_api_version=CallbackAPIVersion.VERSION2,
-                transport="tcp"
-            )
-            self.client.tls_set(
-                ca_certs="/etc/mosquitto/certs/ca.crt",
-                certfile="/etc/mosquitto/certs/clients/client.crt",
-                keyfile="/etc/mosquitto/certs/clients/client.key",
-                cert_reqs=ssl.CERT_REQUIRED,
-                tls_version=ssl.PROTOCOL_TLS_CLIENT)
-            self.client.username_pw_set(username, password)
-
-            # Socket event logging for advanced debugging
-            self.client.on_socket_open = lambda client, userdata, sock: logger.info("Socket opened")
-            self.client.on_socket_close = lambda client, userdata, sock: logger.warning("Socket closed")
-            self.client.on_socket_register_write = lambda client, userdata, sock: logger.debug("Socket write registered")
-            self.client.on_socket_unregister_write = lambda client, userdata, sock: logger.debug("Socket write unregistered")
-
-            # Assign callbacks
-            self.client.on_connect = self.on_connect
-            self.client.on_message = self.on_message
-            self.client.on_disconnect = self.on_disconnect
-
-            # Retry loop for connecting to MQTT broker
-            for attempt in range(1, self.max_retries + 1):
+        if self._supervisor_thread and self._supervisor_thread.is_alive():
+            if not self._supervisor_stop.is_set():
+                return
+            # A previous stop() timed out: let that supervisor exit and release its client first
+            self._supervisor_thread.join(timeout=5)
+            if self._supervisor_thread.is_alive():
+                logger.warning("Previous MQTT supervisor is still stopping, not starting a new one")
+                return
+
+        if self.client is None:
+            self.client = self._create_client()
+
+        self._supervisor_stop.clear()
+        self._supervisor_thread = threading.Thread(
+            target=self._supervise, name="mqtt-subscriber-supervisor", daemon=True
+        )
+        self._supervisor_thread.start()
+
+    def _create_client(self):
+        """
+        Build and configure the MQTT v5 client with TLS, credentials and callbacks.
+
+        Returns:
+            mqtt.Client: Configured, not yet connected client.
+        """
+        client = build_client(self.client_id)
+
+        # Socket event logging
+        client.on_socket_open = lambda client, userdata, sock: logger.info("Socket opened")
+        client.on_socket_close = lambda client, userdata, sock: logger.warning("Socket closed")
+
+        # Assign callbacks
+        client.on_connect = self.on_connect
+        client.on_message = self.on_message
+        client.on_disconnect = self.on_disconnect
+        client.on_subscribe = self.on_subscribe
+        return client
+
+    def _supervise(self):
+        """
+        Supervisor thread: drives the client network loop and reconnects with
+        exponential backoff and jitter whenever the connection is lost.
+
+        Reconnecting here instead of inside paho callbacks keeps a single network
+        thread per subscriber and never blocks message processing.
+        """
+        broker = os.getenv('MQTT_BROKER')
+        port = int(os.getenv('MQTT_PORT', 8883))
+        first_connect = True
+
+        while True:
+            # Keep looping after a stop request until the DISCONNECT packet has been flushed
+            if self._supervisor_stop.is_set() and not self.connected:
+                break
+
+            if not self._socket_open:
+                if self._connect_attempts:
+                    delay = backoff_delay(self._connect_attempts)
+                    logger.info("Reconnecting to MQTT broker in %.1fs (attempt %s)", delay, self._connect_attempts + 1)
+                    if self._supervisor_stop.wait(delay):
+                        break
+                self._connect_attempts += 1
+                if not first_connect:
+                    self.metrics["reconnect_attempts"] += 1
+
                 try:
-                    self.client.connect(broker, port, 60)
-                    self.client.loop_start()
-                    logger.info(f"Connecting to MQTT broker (attempt {attempt})...")
-                    time.sleep(2 if attempt == 1 else 1)
-                    if self.connected:
-                        return
+                    if first_connect:
+                        self.client.connect(broker, port, 60, clean_start=False, properties=connect_properties())
+                        first_connect = False
+                    else:
+                        self.client.reconnect()
+                    self._socket_open = True
                 except Exception as e:
-                    logger.warning(f"Connection attempt {attempt} failed: {e}")
-                    if attempt < self.max_retries:
-                        time.sleep(self.retry_delay * attempt)
+                    logger.warning("Connection attempt %s failed: %s", self._connect_attempts, e)
+                    continue
 
-            raise ConnectionError(f"Failed to connect after {self.max_retries} attempts")
+            rc = self.client.loop(timeout=1.0)
+            if rc != mqtt.MQTT_ERR_SUCCESS:
+                self._socket_open = False
 
-        except KeyError as e:
-            logger.error(f"Missing environment variable: {e}")
-            raise
-        except Exception as e:
-            logger.error(f"MQTT initialization failed: {e}")
-            raise
+        # Only this thread uses the client in its loop, so it is released here rather than in stop()
+        self.client = None
+        self._socket_open = False
+        logger.info("MQTT supervisor stopped")
+
+    def is_running(self):
+        """
+        Check whether the subscriber supervisor is alive (connected or reconnecting).
+
+        Returns:
+            bool: True if the supervisor thread is running.
+        """
+        return self._supervisor_thread is not None and self._supervisor_thread.is_alive()
+
+    def get_metrics(self):
+        """
+        Return connection and reconnect metrics of the subscriber.
+
+        Returns:
+            dict: Counters and reconnect timings in seconds.
+        """
+        metrics = dict(self.metrics, client_id=self.client_id, connected=self.connected,
+                       subscriptions=len(self.subscriptions))
+        if self.ingestor is not None:
+            metrics["telemetry"] = self.ingestor.get_metrics()
+        return metrics
 
     def validate_connection(self):
         """
@@ -127,7 +243,7 @@ class MQTTSubscriber:
             with socket.create_connection((broker, port), timeout=5):
                 return True
         except socket.error as e:
-            logger.error(f"Network connectivity check failed: {e}")
+            logger.error("Network connectivity check failed: %s", e)
             return False
 
     def on_connect(self, client, userdata, flags, rc, properties=None):
@@ -135,136 +251,463 @@ class MQTTSubscriber:
         Callback when the client connects to the broker.
         Subscribes to device topics on successful connection.
         """
-        print(f"on_connect called with rc={rc}")
         if rc == 0:
             self.connected = True
-            logger.info("Successfully connected to MQTT broker")
-            try:
-                self.subscribe_to_devices()
-            except Exception as e:
-                logger.error(f"Subscription failed in on_connect: {e}")
+            self._connect_attempts = 0
+            self.metrics["connects"] += 1
+            if self._disconnected_at is not None:
+                elapsed = time.monotonic() - self._disconnected_at
+                self._disconnected_at = None
+                self.metrics["reconnects"] += 1
+                self.metrics["last_reconnect_seconds"] = round(elapsed, 3)
+                self.metrics["max_reconnect_seconds"] = round(max(elapsed, self.metrics["max_reconnect_seconds"] or 0), 3)
+            logger.info("Successfully connected to MQTT broker (session present: %s)", flags.session_present)
+            # Without a resumed session the broker holds no subscriptions, so resubscribe everything
+            if not flags.session_present:
+                self._resubscribe = True
+            self._sync_event.set()
         else:
-            logger.error(f"Connection failed with code {rc}")
+            logger.error("Connection failed with code %s", rc)
 
     def on_message(self, client, userdata, msg):
         """
         Callback for handling incoming MQTT messages.
 
+        Messages on device status topics are handed to the telemetry ingestor.
         Handles commands for devices based on the topic:
         Expected format: mqtt_devices/<serial_number>/command
 
         Valid commands:
             - START: Sets device as active
             - STOP: Sets device as inactive
+
+        Commands carrying an MQTT v5 response topic are answered there with the
+        correlation data of the command and {"status": "ok" | "error", "detail": ...}.
         """
+        # Hot path: telemetry is parsed and buffered without per-message logging
+        if self.ingestor is not None and msg.topic in self.ingestor.devices:
+            self.ingestor.handle(msg.topic, msg.payload)
+            return
+
+        serial_number = None
         try:
             topic = msg.topic
             payload = msg.payload.decode()
-            logger.info(f"Received message on topic {topic}: {payload}")
+            logger.info("Received message on topic %s: %s", topic, payload)
 
             # Validate topic structure
-            parts = topic.split('/')
-            if len(parts) != 3 or parts[0] != "mqtt_devices" or parts[2] != "command":
-                logger.warning(f"Invalid topic format: {topic}")
+            serial_number = parse_command_topic(topic)
+            if serial_number is None:
+                logger.warning("Invalid topic format: %s", topic)
                 return
 
-            serial_number = parts[1]
-
             # Fetch device by serial number
             try:
                 device = self.Device.objects.get(serial_number=serial_number)
             except self.Device.DoesNotExist:
-                logger.error(f"Device with serial_number {serial_number} not found.")
+                logger.error("Device with serial_number %s not found.", serial_number)
                 client.publish(f"devices/{serial_number}/error", "Device not found")
+                send_reply(client, msg, "error", "Device not found")
                 return
 
             # Handle commands
-            if payload.upper() == "START":
-                device.is_active = True
-                device.save(update_fields=["is_active"])
-                logger.info(f"Device {serial_number} set to active")
-            elif payload.upper() == "STOP":
-                device.is_active = False
+            command = payload.upper()
+            if command in DEVICE_COMMANDS:
+                device.is_active = DEVICE_COMMANDS[command]
                 device.save(update_fields=["is_active"])
-                logger.info(f"Device {serial_number} set to inactive")
+                logger.info("Device %s set to %s", serial_number, 'active' if device.is_active else 'inactive')
+                send_reply(client, msg, "ok", {"is_active": device.is_active})
             else:
-                logger.warning(f"Unknown command '{payload}' for device {serial_number}")
+                logger.warning("Unknown command '%s' for device %s", payload, serial_number)
                 client.publish(f"devices/{serial_number}/error", f"Unknown command: {payload}")
+                send_reply(client, msg, "error", f"Unknown command: {payload}")
 
         except Exception as e:
             logger.exception("Error processing MQTT message")
             try:
-                client.publish(f"devices/{serial_number}/error", str(e))
+                if serial_number:
+                    client.publish(f"devices/{serial_number}/error", str(e))
+                send_reply(client, msg, "error", str(e))
             except:
                 pass  # Prevent crash if publishing error fails
 
     def on_disconnect(self, client, userdata, flags, rc, properties=None):
         """
         Callback triggered when client disconnects from the broker.
-        If disconnection was unexpected, attempts reconnection.
+        Reconnection is left to the supervisor thread.
         """
         self.connected = False
-        logger.warning(f"Disconnected from MQTT broker (code: {rc})")
-        if rc != 0:  # Unexpected disconnect
-            logger.info("Attempting to reconnect...")
-            time.sleep(5)
-            self.initialize_client()
+        self._socket_open = False
+        self.metrics["disconnects"] += 1
+        if self._disconnected_at is None:
+            self._disconnected_at = time.monotonic()
+        logger.warning("Disconnected from MQTT broker (code: %s)", rc)
+
+    def on_subscribe(self, client, userdata, mid, reason_codes, properties=None):
+        """
+        Callback when the broker acknowledges a SUBSCRIBE packet.
+        The acknowledgement is handed to the sync thread, which drops rejected
+        topic filters from the subscription set so that they are retried.
+        """
+        self._subacks.put((mid, reason_codes))
+        if any(reason_code.is_failure for reason_code in reason_codes):
+            self._sync_event.set()
 
     def subscribe_to_devices(self):
         """
-        Subscribe to MQTT topics for all active devices stored in the database.
+        Request a full resubscription to the topics of all active devices stored in the database.
+        The subscriptions are sent by the sync thread.
 
         Returns:
-            bool: True if all subscriptions were successful, False otherwise.
+            bool: True if the request was accepted, False if not connected.
         """
-        logger.info("Attempting to subscribe to device topics")
+        if not self.connected:
+            logger.error("Cannot subscribe - not connected to broker")
+            return False
+        self._resubscribe = True
+        self._sync_event.set()
+        return True
+
+    def sync_subscriptions(self):
+        """
+        Bring the broker subscriptions in line with the command topics (and status topics,
+        when telemetry ingestion is enabled) of active devices.
+
+        The desired topic set is diffed against the current one and only the difference
+        is sent, batching up to SUBSCRIBE_BATCH_SIZE topic filters per SUBSCRIBE or
+        UNSUBSCRIBE packet. Must only be called from the sync thread.
+
+        Returns:
+            bool: True if all subscription changes were sent, False otherwise.
+        """
+        if self._resubscribe:
+            self._resubscribe = False
+            self.subscriptions.clear()
+            self._pending_subscribes.clear()
+        self._process_subacks()
 
         if not self.connected:
             logger.error("Cannot subscribe - not connected to broker")
             return False
 
         try:
-            dev_objects = self.Device.objects.filter(is_active=True)
-            logger.info(f"Found {dev_objects.count} active devices")
-
-            # Subscribe to each device's topic
-            for device in dev_objects:
-                result, mid = self.client.subscribe(device.mqtt_command_topic)
-                if result == mqtt.MQTT_ERR_SUCCESS:
-                    logger.info(f"Successfully subscribed to {device.mqtt_command_topic}")
-                else:
-                    logger.warning(f"Failed to subscribe to {device.mqtt_command_topic}, error code: {result}")
-
-            logger.info("Subscribed to all active device topics")
-            return True
+            desired = self._desired_topics(self.Device.objects.filter(is_active=True).values_list(
+                'pk', 'serial_number', 'mqtt_command_topic', 'mqtt_status_topic'))
         except Exception as e:
-            logger.error(f"Failed to subscribe: {e}")
+            logger.error("Failed to load device topics: %s", e)
             return False
 
+        to_subscribe = sorted(desired - self.subscriptions)
+        to_unsubscribe = sorted(self.subscriptions - desired)
+        if not to_subscribe and not to_unsubscribe:
+            return True
+
+        success = True
+        for batch in _batched(to_unsubscribe, SUBSCRIBE_BATCH_SIZE):
+            result, mid = self.client.unsubscribe([topic_filter(topic, self.shared_group) for topic in batch])
+            if result == mqtt.MQTT_ERR_SUCCESS:
+                self.subscriptions.difference_update(batch)
+            else:
+                success = False
+                logger.warning("Failed to unsubscribe from %s topics, error code: %s", len(batch), result)
+
+        for batch in _batched(to_subscribe, SUBSCRIBE_BATCH_SIZE):
+            result, mid = self.client.subscribe(
+                [(topic_filter(topic, self.shared_group), SubscribeOptions(qos=SUBSCRIBE_QOS)) for topic in batch]
+            )
+            if result == mqtt.MQTT_ERR_SUCCESS:
+                self.subscriptions.update(batch)
+                self._pending_subscribes[mid] = batch
+            else:
+                success = False
+                logger.warning("Failed to subscribe to %s topics, error code: %s", len(batch), result)
+
+        logger.info("Subscriptions synced: +%s -%s (%s total)",
+                    len(to_subscribe), len(to_unsubscribe), len(self.subscriptions))
+        return success
+
+    def _desired_topics(self, rows):
+        """
+        Build the set of topics to subscribe to from device rows and update the
+        status topic mapping of the telemetry ingestor.
+
+        Args:
+            rows (iterable): Tuples of (pk, serial_number, mqtt_command_topic, mqtt_status_topic).
+
+        Returns:
+            set: Topics the subscriber should be subscribed to.
+        """
+        desired = set()
+        status_devices = {}
+        for pk, serial_number, command_topic, status_topic in rows:
+            desired.add(command_topic)
+            if self.ingestor is not None:
+                status_devices[status_topic] = (pk, serial_number)
+        if self.ingestor is not None:
+            self.ingestor.set_devices(status_devices)
+            desired.update(status_devices)
+        return desired
+
+    def _process_subacks(self):
+        """
+        Apply SUBACKs received by the network thread: topic filters rejected by the broker
+        are removed from the subscription set so that the next sync retries them.
+        """
+        while True:
+            try:
+                mid, reason_codes = self._subacks.get_nowait()
+            except queue.Empty:
+                return
+            topics = self._pending_subscribes.pop(mid, [])
+            for topic, reason_code in zip(topics, reason_codes):
+                if reason_code.is_failure:
+                    self.subscriptions.discard(topic)
+                    logger.warning("Broker rejected subscription to %s: %s", topic, reason_code)
+
+    def _on_device_changed(self, sender, **kwargs):
+        """
+        Signal receiver for MQTTDevice saves and deletions, wakes up the sync thread.
+        """
+        self._sync_event.set()
+
+    def _sync_loop(self):
+        """
+        Background thread keeping subscriptions in sync with the device table.
+        Runs immediately on device signals and otherwise polls every
+        SUBSCRIPTION_POLL_INTERVAL seconds to pick up changes made by other processes.
+        """
+        from django.db import close_old_connections
+
+        while not self._stop_event.is_set():
+            self._sync_event.wait(SUBSCRIPTION_POLL_INTERVAL)
+            self._sync_event.clear()
+            if self._stop_event.is_set():
+                break
+            if self.connected:
+                try:
+                    self.sync_subscriptions()
+                except Exception:
+                    logger.exception("Subscription sync failed")
+            close_old_connections()
+
+    def _start_sync(self):
+        """
+        Connect device signals and start the subscription sync thread if needed.
+        """
+        from django.db.models.signals import post_save, post_delete
+
+        if self._sync_thread and self._sync_thread.is_alive():
+            return
+        self._stop_event.clear()
+        post_save.connect(self._on_device_changed, sender=self.Device)
+        post_delete.connect(self._on_device_changed, sender=self.Device)
+        self._sync_thread = threading.Thread(target=self._sync_loop, name="mqtt-subscription-sync", daemon=True)
+        self._sync_thread.start()
+
+    def _stop_sync(self):
+        """
+        Disconnect device signals and stop the subscription sync thread.
+        """
+        from django.db.models.signals import post_save, post_delete
+
+        post_save.disconnect(self._on_device_changed, sender=self.Device)
+        post_delete.disconnect(self._on_device_changed, sender=self.Device)
+        self._stop_event.set()
+        self._sync_event.set()
+        if self._sync_thread and self._sync_thread is not threading.current_thread():
+            self._sync_thread.join(timeout=5)
+        self._sync_thread = None
+
     def start(self):
         """
-        Start the MQTT client if not already connected.
+        Start the MQTT client supervisor if it is not already running.
         """
-        if not self.connected:
-            self.initialize_client()
+        if self.ingestor is not None:
+            self.ingestor.start()
+        self.initialize_client()
+        self._start_sync()
 
     def stop(self):
         """
         Stop and clean up the MQTT client.
-        Disconnects from the broker and stops the loop.
+        Disconnects from the broker and waits for the supervisor thread to finish.
         """
-        if self.client:
+        self._stop_sync()
+        self._supervisor_stop.set()
+        client = self.client
+        if client:
             if self.connected:
-                self.client.disconnect()
-            self.client.loop_stop()
-            self.client = None  # Ensure cleanup
+                client.disconnect()
+            if self._supervisor_thread:
+                self._supervisor_thread.join(timeout=5)
+                if self._supervisor_thread.is_alive():
+                    # The supervisor releases the client itself once its loop returns
+                    logger.warning("MQTT supervisor did not stop within 5s")
+                else:
+                    self._supervisor_thread = None
+            else:
+                self.client = None
+        if self.ingestor is not None:
+            self.ingestor.stop()
         logger.info("MQTT client stopped")
 
 
+def default_client_id(shared_group=None):
+    """
+    Return the client ID for a subscriber instance.
+
+    Plain subscribers keep the fixed CLIENT_ID_PREFIX. Members of a shared subscription
+    group get the host name and process ID appended, since the broker disconnects
+    an existing client when another one connects with the same ID.
+
+    Args:
+        shared_group (str): Shared subscription group name, or None.
+
+    Returns:
+        str: Client ID.
+    """
+    if not shared_group:
+        return CLIENT_ID_PREFIX
+    return f"{CLIENT_ID_PREFIX}-{socket.gethostname()}-{os.getpid()}"
+
+
+def topic_filter(topic, shared_group=None):
+    """
+    Return the topic filter to subscribe to for a topic.
+
+    Args:
+        topic (str): Device topic.
+        shared_group (str): Shared subscription group name, or None.
+
+    Returns:
+        str: `$share/<group>/<topic>` for shared subscriptions, otherwise the topic itself.
+    """
+    if shared_group:
+        return f"$share/{shared_group}/{topic}"
+    return topic
+
+
+def build_client(client_id):
+    """
+    Create an MQTT v5 client with the broker TLS settings and credentials.
+
+    Args:
+        client_id (str): Client identifier presented to the broker.
+
+    Returns:
+        mqtt.Client: Configured, not yet connected client.
+
+    Raises:
+        ValueError: If the MQTT_BROKER environment variable is not set.
+    """
+    if not os.getenv('MQTT_BROKER'):
+        raise ValueError("MQTT_BROKER environment variable not set")
+
+    client = mqtt.Client(
+        client_id=client_id,
+        callback_api_version=CallbackAPIVersion.VERSION2,
+        protocol=mqtt.MQTTv5,
+        transport="tcp"
+    )
+    client.tls_set(
+        ca_certs="/etc/mosquitto/certs/ca.crt",
+        certfile="/etc/mosquitto/certs/clients/client.crt",
+        keyfile="/etc/mosquitto/certs/clients/client.key",
+        cert_reqs=ssl.CERT_REQUIRED,
+        tls_version=ssl.PROTOCOL_TLS_CLIENT)
+    client.username_pw_set(os.getenv('MQTT_USERNAME'), os.getenv('MQTT_PASSWORD'))
+    return client
+
+
+def connect_properties():
+    """
+    Build CONNECT properties requesting a persistent session.
+
+    Returns:
+        Properties: CONNECT properties with SESSION_EXPIRY_INTERVAL set.
+    """
+    properties = Properties(PacketTypes.CONNECT)
+    properties.SessionExpiryInterval = SESSION_EXPIRY_INTERVAL
+    return properties
+
+
+def send_reply(client, msg, status, detail=None):
+    """
+    Answer a command on its MQTT v5 response topic, if the sender asked for a reply.
+
+    Args:
+        client (mqtt.Client): Client to publish the reply with.
+        msg (mqtt.MQTTMessage): The command message.
+        status (str): "ok" or "error".
+        detail: JSON-serializable outcome details.
+
+    Returns:
+        bool: True if a reply was published.
+    """
+    response_topic = getattr(msg.properties, "ResponseTopic", None)
+    if not response_topic:
+        return False
+    properties = Properties(PacketTypes.PUBLISH)
+    correlation_data = getattr(msg.properties, "CorrelationData", None)
+    if correlation_data is not None:
+        properties.CorrelationData = correlation_data
+    client.publish(response_topic, orjson.dumps({"status": status, "detail": detail}), qos=1, properties=properties)
+    return True
+
+
+def parse_command_topic(topic):
+    """
+    Extract the device serial number from a command topic.
+
+    Args:
+        topic (str): Topic in the format mqtt_devices/<serial_number>/command.
+
+    Returns:
+        str or None: The serial number, or None if the topic has another format.
+    """
+    parts = topic.split('/')
+    if len(parts) != 3 or parts[0] != "mqtt_devices" or parts[2] != "command":
+        return None
+    return parts[1]
+
+
+def backoff_delay(attempt):
+    """
+    Compute the delay before the next connection attempt.
+
+    The upper bound doubles with each failed attempt up to RECONNECT_MAX_DELAY,
+    and the delay is drawn from the upper half of that bound so that instances
+    disconnected together do not reconnect in lockstep.
+
+    Args:
+        attempt (int): Number of failed attempts so far.
+
+    Returns:
+        float: Delay in seconds.
+    """
+    ceiling = min(RECONNECT_MAX_DELAY, RECONNECT_MIN_DELAY * 2 ** (attempt - 1))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+def _batched(items, size):
+    """
+    Split a list into consecutive chunks of at most `size` items.
+
+    Args:
+        items (list): Items to split.
+        size (int): Maximum chunk size.
+
+    Returns:
+        list: List of chunks.
+    """
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
 if __name__ == "__main__":
     # Entry point when running the module directly
     subscriber = MQTTSubscriber()
     subscriber.validate_connection()
+    subscriber.start()
 
     try:
         while True:
@@ -0,0 +1,191 @@
+import os
+import time
+import socket
+import logging
+import argparse
+import multiprocessing
+from dotenv import load_dotenv
+
+from .mqtt_subscriber import CLIENT_ID_PREFIX, MQTTSubscriber
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Shared subscription group used by the runner when none is given
+DEFAULT_GROUP = os.getenv('MQTT_SHARED_GROUP') or 'commands'
+# Interval (seconds) at which members report their metrics to the runner
+METRICS_INTERVAL = float(os.getenv('MQTT_GROUP_METRICS_INTERVAL', 5))
+
+# Metrics combined by taking the maximum over members instead of the sum
+_MAX_METRICS = {"last_reconnect_seconds", "max_reconnect_seconds"}
+
+
+def _run_member(index, client_id, shared_group, metrics, stop_event):
+    """
+    Entry point of a subscriber process: runs one MQTTSubscriber and publishes
+    its metrics into the shared metrics dictionary until asked to stop.
+
+    Args:
+        index (int): Member index within the group.
+        client_id (str): Unique client ID of this member.
+        shared_group (str): Shared subscription group name.
+        metrics (dict): Manager dictionary shared with the runner.
+        stop_event (multiprocessing.Event): Set by the runner to stop the member.
+    """
+    subscriber = MQTTSubscriber(client_id=client_id, shared_group=shared_group)
+    subscriber.start()
+    try:
+        while not stop_event.wait(METRICS_INTERVAL):
+            metrics[index] = subscriber.get_metrics()
+    finally:
+        subscriber.stop()
+        metrics[index] = subscriber.get_metrics()
+
+
+def combine_metrics(members):
+    """
+    Combine the metrics of several subscriber instances.
+
+    Counters are summed, reconnect timings take the maximum and `connected`
+    becomes the number of connected members.
+
+    Args:
+        members (list): Metrics dictionaries as returned by MQTTSubscriber.get_metrics().
+
+    Returns:
+        dict: Combined metrics, with the per-member metrics under 'instances'.
+    """
+    combined = {"members": len(members), "connected": 0}
+    for member in members:
+        for key, value in member.items():
+            if key == "connected":
+                combined["connected"] += int(bool(value))
+            elif key in _MAX_METRICS:
+                if value is not None:
+                    combined[key] = max(value, combined.get(key) or 0)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                combined[key] = combined.get(key, 0) + value
+    combined["instances"] = list(members)
+    return combined
+
+
+class SubscriberGroup:
+    """
+    Runs N subscriber processes that share command handling through an MQTT
+    shared subscription ($share/<group>/...). Each process has its own client ID,
+    so members do not disconnect each other, and dead members are restarted.
+    """
+
+    def __init__(self, size, shared_group=DEFAULT_GROUP, client_id_prefix=None):
+        self.size = size
+        self.shared_group = shared_group
+        self.client_id_prefix = client_id_prefix or f"{CLIENT_ID_PREFIX}-{socket.gethostname()}"
+        # Django must not be inherited half-initialized by forked children
+        self._context = multiprocessing.get_context("spawn")
+        self._manager = None
+        self._metrics = None
+        self._stop_event = None
+        self.processes = {}
+
+    def client_id(self, index):
+        """
+        Return the stable client ID of a member, so a restarted member resumes its session.
+        """
+        return f"{self.client_id_prefix}-{index}"
+
+    def start(self):
+        """
+        Start all member processes.
+        """
+        self._manager = self._context.Manager()
+        self._metrics = self._manager.dict()
+        self._stop_event = self._context.Event()
+        for index in range(self.size):
+            self._start_member(index)
+
+    def _start_member(self, index):
+        process = self._context.Process(
+            target=_run_member,
+            args=(index, self.client_id(index), self.shared_group, self._metrics, self._stop_event),
+            name=f"mqtt-subscriber-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info("Started subscriber %s (pid %s)", self.client_id(index), process.pid)
+
+    def restart_dead_members(self):
+        """
+        Restart member processes that exited unexpectedly.
+
+        Returns:
+            int: Number of restarted members.
+        """
+        restarted = 0
+        for index, process in list(self.processes.items()):
+            if not process.is_alive() and not self._stop_event.is_set():
+                logger.warning("Subscriber %s exited with code %s, restarting", self.client_id(index), process.exitcode)
+                self._start_member(index)
+                restarted += 1
+        return restarted
+
+    def metrics(self):
+        """
+        Return the combined metrics of all members.
+
+        Returns:
+            dict: Metrics combined by combine_metrics().
+        """
+        members = [dict(self._metrics[index]) for index in sorted(self._metrics.keys())]
+        combined = combine_metrics(members)
+        combined["alive"] = sum(process.is_alive() for process in self.processes.values())
+        return combined
+
+    def stop(self, timeout=10):
+        """
+        Stop all member processes and the metrics manager.
+        """
+        if self._stop_event is not None:
+            self._stop_event.set()
+        for process in self.processes.values():
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.terminate()
+        self.processes = {}
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+def main():
+    """
+    Command line runner: python -m mqtt_clients.subscriber_group --processes 4 --group commands
+    """
+    parser = argparse.ArgumentParser(description="Run a group of MQTT subscribers with shared subscriptions")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="number of subscriber processes")
+    parser.add_argument("--group", default=DEFAULT_GROUP, help="shared subscription group name")
+    parser.add_argument("--client-id-prefix", default=None, help="client ID prefix, defaults to <prefix>-<hostname>")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    group = SubscriberGroup(args.processes, shared_group=args.group, client_id_prefix=args.client_id_prefix)
+    group.start()
+    try:
+        while True:
+            time.sleep(METRICS_INTERVAL)
+            group.restart_dead_members()
+            metrics = group.metrics()
+            logger.info("Subscriber group: %s/%s connected, %s reconnects, %s reconnect attempts",
+                        metrics['connected'], group.size, metrics.get('reconnects', 0),
+                        metrics.get('reconnect_attempts', 0))
+    except KeyboardInterrupt:
+        print("Exiting...")
+    finally:
+        group.stop()
+
+
+if __name__ == "__main__":
+    main()
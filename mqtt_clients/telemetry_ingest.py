@@ -0,0 +1,247 @@
+import os
+import time
+import queue
+import logging
+import threading
+import orjson
+from dotenv import load_dotenv
+from pymongo.errors import BulkWriteError
+from IoT_system.timeseries import get_series_collection
+from IoT_system.rollups import record_sample
+from IoT_system.current import record_value
+from IoT_system.retention import stamp_expiry
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Ingestion of device status topics can be switched off per subscriber deployment
+TELEMETRY_INGEST_ENABLED = os.getenv('MQTT_TELEMETRY_INGEST', 'True') == 'True'
+# Number of records written per insert_many call
+BATCH_SIZE = int(os.getenv('MQTT_TELEMETRY_BATCH_SIZE', 1000))
+# Maximum time (seconds) a record waits in the buffer before being written
+FLUSH_INTERVAL = float(os.getenv('MQTT_TELEMETRY_FLUSH_INTERVAL', 0.5))
+# Maximum number of batches waiting for the writer; further batches are dropped
+MAX_PENDING_BATCHES = int(os.getenv('MQTT_TELEMETRY_MAX_PENDING_BATCHES', 100))
+
+# Accepted telemetry fields and their types; "value" is required
+TELEMETRY_SCHEMA = {
+    "value": (int, float),
+    "timestamp": (int, float),
+    "unit": str,
+    "status": str,
+    "quality": str,
+}
+REQUIRED_FIELDS = ("value",)
+
+
+class TelemetryValidationError(ValueError):
+    """Raised when a telemetry payload does not match TELEMETRY_SCHEMA."""
+
+
+def get_telemetry_collection():
+    """
+    Return the MongoDB collection telemetry records are written to.
+
+    Returns:
+        Collection: The telemetry collection.
+    """
+    return get_series_collection("telemetry")
+
+
+def parse_telemetry(payload):
+    """
+    Parse and validate a telemetry payload.
+
+    Args:
+        payload (bytes): JSON object, e.g. {"value": 21.5, "unit": "C", "timestamp": 1718000000.0}.
+
+    Returns:
+        dict: The validated record.
+
+    Raises:
+        TelemetryValidationError: If the payload is not a JSON object matching TELEMETRY_SCHEMA.
+    """
+    try:
+        record = orjson.loads(payload)
+    except orjson.JSONDecodeError as e:
+        raise TelemetryValidationError(f"invalid JSON: {e}")
+    if type(record) is not dict:
+        raise TelemetryValidationError("payload is not a JSON object")
+
+    for field, value in record.items():
+        expected = TELEMETRY_SCHEMA.get(field)
+        if expected is None:
+            raise TelemetryValidationError(f"unknown field '{field}'")
+        # bool is a subclass of int, but not a valid numeric reading
+        if not isinstance(value, expected) or value is True or value is False:
+            raise TelemetryValidationError(f"invalid type for '{field}'")
+    for field in REQUIRED_FIELDS:
+        if field not in record:
+            raise TelemetryValidationError(f"missing field '{field}'")
+    return record
+
+
+class TelemetryIngestor:
+    """
+    Ingestion stage for device status topics.
+
+    `handle()` runs on the MQTT network thread and only parses, validates, stamps
+    and buffers records; a writer thread stores them in batches with insert_many,
+    so MongoDB round trips never slow down message processing.
+    """
+
+    def __init__(self, collection=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 max_pending_batches=MAX_PENDING_BATCHES):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Status topic -> (device_id, serial_number), replaced atomically on subscription sync
+        self.devices = {}
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._batches = queue.Queue(maxsize=max_pending_batches)
+        self._stop_event = threading.Event()
+        self._writer_thread = None
+        self.metrics = {
+            "received": 0,
+            "invalid": 0,
+            "unknown_device": 0,
+            "written": 0,
+            "write_errors": 0,
+            "failed": 0,
+            "dropped": 0,
+        }
+
+    def set_devices(self, devices):
+        """
+        Replace the status topic to device mapping.
+
+        Args:
+            devices (dict): Status topic -> (device_id, serial_number).
+        """
+        self.devices = devices
+
+    def handle(self, topic, payload):
+        """
+        Ingest one status message.
+
+        Args:
+            topic (str): Status topic the message arrived on.
+            payload (bytes): Raw message payload.
+
+        Returns:
+            bool: True if the record was accepted, False if it was rejected.
+        """
+        self.metrics["received"] += 1
+        device = self.devices.get(topic)
+        if device is None:
+            self.metrics["unknown_device"] += 1
+            return False
+        try:
+            record = parse_telemetry(payload)
+        except TelemetryValidationError as e:
+            self.metrics["invalid"] += 1
+            logger.debug("Rejected telemetry on %s: %s", topic, e)
+            return False
+
+        record["device_id"], record["serial_number"] = device
+        record["received_at"] = time.time()
+        if "timestamp" not in record:
+            record["timestamp"] = record["received_at"]
+        stamp_expiry("telemetry", record["device_id"], record)
+
+        with self._buffer_lock:
+            self._buffer.append(record)
+            if len(self._buffer) < self.batch_size:
+                return True
+            batch, self._buffer = self._buffer, []
+        self._enqueue(batch)
+        return True
+
+    def _enqueue(self, batch):
+        try:
+            self._batches.put_nowait(batch)
+        except queue.Full:
+            self.metrics["dropped"] += len(batch)
+            logger.warning("Telemetry writer is behind, dropped %s records", len(batch))
+
+    def flush(self):
+        """
+        Hand the currently buffered records to the writer.
+        """
+        with self._buffer_lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._enqueue(batch)
+
+    def start(self):
+        """
+        Start the writer thread.
+        """
+        if self._writer_thread and self._writer_thread.is_alive():
+            return
+        if self.collection is None:
+            self.collection = get_telemetry_collection()
+        self._stop_event.clear()
+        self._writer_thread = threading.Thread(target=self._write_loop, name="mqtt-telemetry-writer", daemon=True)
+        self._writer_thread.start()
+
+    def stop(self, timeout=10):
+        """
+        Flush buffered records and stop the writer thread once they are written.
+        """
+        self.flush()
+        self._stop_event.set()
+        if self._writer_thread:
+            self._writer_thread.join(timeout=timeout)
+            self._writer_thread = None
+
+    def _write_loop(self):
+        """
+        Writer thread: writes queued batches and flushes the buffer every flush_interval seconds.
+        """
+        while True:
+            try:
+                batch = self._batches.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    return
+                self.flush()
+                continue
+            self._write(batch)
+
+    def _write(self, batch):
+        stored, inserted = batch, len(batch)
+        try:
+            self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Unordered inserts store every record except the failing ones
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            stored = [record for index, record in enumerate(batch) if index not in failed]
+            inserted = e.details.get("nInserted", len(stored))
+            self.metrics["write_errors"] += 1
+            self.metrics["failed"] += len(batch) - inserted
+            logger.error("Failed to write %s of %s telemetry records: %s", len(batch) - inserted, len(batch), e)
+        except Exception as e:
+            self.metrics["write_errors"] += 1
+            self.metrics["failed"] += len(batch)
+            logger.error("Failed to write %s telemetry records: %s", len(batch), e)
+            return
+        self.metrics["written"] += inserted
+        # Roll up only what was stored, on the writer thread rather than the MQTT network thread
+        for record in stored:
+            record_sample("telemetry", record["device_id"], record["timestamp"], record["value"])
+            record_value("telemetry", record["device_id"], record["value"], record["timestamp"],
+                         record.get("quality", "good"))
+
+    def get_metrics(self):
+        """
+        Return ingestion counters.
+
+        Returns:
+            dict: Counters of received, rejected, written, failed and dropped records.
+        """
+        return dict(self.metrics, buffered=len(self._buffer), pending_batches=self._batches.qsize())
@@ -1,6 +1,6 @@
 from django.urls import path
 from .views import (start_mqtt_publisher, stop_mqtt_publisher, mqtt_publisher_status, start_subscriber, stop_subscriber,
-                    subscriber_status)
+                    subscriber_status, mqtt_publisher_status_async, subscriber_status_async)
 
 
 # Urls for endpoints of MQTT clients
@@ -11,10 +11,14 @@ urlpatterns = [
     path('publisher/stop/', stop_mqtt_publisher, name='mqtt-publisher-stop'),
     # Getting publisher status
     path('publisher/status/', mqtt_publisher_status, name='mqtt-publisher-status'),
+    # Getting publisher status, async variant for ASGI deployments
+    path('publisher/status/async/', mqtt_publisher_status_async, name='mqtt-publisher-status-async'),
     # Starting subscriber
     path('subscriber/start/', start_subscriber),
     # Stopping subscriber
     path('subscriber/stop/', stop_subscriber),
     # Getting subscriber status
     path('subscriber/status/', subscriber_status),
+    # Getting subscriber status, async variant for ASGI deployments
+    path('subscriber/status/async/', subscriber_status_async),
 ]
\ No newline at end of file
@@ -1,5 +1,3 @@
-import time
-import threading
 from django.http import JsonResponse
 from rest_framework.decorators import api_view
 from rest_framework.decorators import permission_classes
@@ -7,12 +5,30 @@ from rest_framework.permissions import IsAuthenticated
 
 from .mqtt_publisher import start_publisher, stop_publisher, get_publisher_status
 from .mqtt_subscriber import MQTTSubscriber
+from .async_subscriber import get_hosted_subscriber
+from IoT_system.events import publish_event
+from IoT_system.auth import async_api_view
 
 
 # Global instance of the MQTT subscriber
 subscriber_instance = None
 
 
+def get_subscriber():
+    """
+    Return the subscriber started from the API, or the one hosted on the ASGI loop, or None.
+    """
+    return subscriber_instance or get_hosted_subscriber()
+
+
+def is_subscriber_running():
+    """
+    Return whether an MQTT subscriber is connected to the broker.
+    """
+    subscriber = get_subscriber()
+    return subscriber is not None and subscriber.connected
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def start_mqtt_publisher(request):
@@ -55,29 +71,24 @@ def mqtt_publisher_status(request):
 @permission_classes([IsAuthenticated])
 def start_subscriber(request):
     """
-    Starts the MQTT subscriber in a background thread if it is not already running.
+    Starts the MQTT subscriber if it is not already running.
+    The subscriber connects and reconnects in its own supervisor thread.
 
     Returns:
         JsonResponse: JSON indicating whether the subscriber was started or already running.
     """
     global subscriber_instance
 
-    # Start a new subscriber if none exists or it's not connected
-    if subscriber_instance is None or not subscriber_instance.connected:
-        def run():
-            """
-            Runs the MQTT subscriber in an infinite loop in a background thread.
-            """
-            global subscriber_instance
-            subscriber_instance = MQTTSubscriber()
-            subscriber_instance.start()
-            # Keep the thread alive to ensure MQTT loop stays active
-            while True:
-                time.sleep(1)
-
-        # Start the subscriber in a daemon thread
-        thread = threading.Thread(target=run, daemon=True)
-        thread.start()
+    # The subscriber hosted on the ASGI loop uses the same client ID, never run both
+    hosted = get_hosted_subscriber()
+    if hosted is not None and hosted.is_running():
+        return JsonResponse({'status': 'already running'})
+
+    # Start a new subscriber if none exists or its supervisor has exited
+    if subscriber_instance is None or not subscriber_instance.is_running():
+        subscriber_instance = MQTTSubscriber()
+        subscriber_instance.start()
+        publish_event("mqtt", "subscriber_status", {"running": True})
         return JsonResponse({'status': 'started'})
     else:
         return JsonResponse({'status': 'already running'})
@@ -94,9 +105,10 @@ def stop_subscriber(request):
     """
     global subscriber_instance
 
-    if subscriber_instance and subscriber_instance.connected:
+    if subscriber_instance and subscriber_instance.is_running():
         subscriber_instance.stop()
         subscriber_instance = None
+        publish_event("mqtt", "subscriber_status", {"running": False})
         return JsonResponse({'status': 'stopped'})
     return JsonResponse({'status': 'already stopped'})
 
@@ -105,10 +117,30 @@ def stop_subscriber(request):
 @permission_classes([IsAuthenticated])
 def subscriber_status(request):
     """
-    Returns the current running status of the MQTT subscriber.
+    Returns the current running status of the MQTT subscriber and its connection metrics.
 
     Returns:
-        JsonResponse: JSON with key 'running' indicating if the subscriber is active.
+        JsonResponse: JSON with key 'running' indicating if the subscriber is connected,
+        and 'metrics' with connect/reconnect counters and reconnect timings.
+    """
+    subscriber = get_subscriber()
+    metrics = subscriber.get_metrics() if subscriber is not None else None
+    return JsonResponse({'running': is_subscriber_running(), 'metrics': metrics})
+
+
+@async_api_view(["GET"])
+async def mqtt_publisher_status_async(request):
+    """
+    Async mqtt_publisher_status: answered on the event loop without a worker thread under ASGI.
+    """
+    return JsonResponse({'running': get_publisher_status() == 'running'})
+
+
+@async_api_view(["GET"])
+async def subscriber_status_async(request):
+    """
+    Async subscriber_status: answered on the event loop without a worker thread under ASGI.
     """
-    running = subscriber_instance is not None and subscriber_instance.connected
-    return JsonResponse({'running': running})
+    subscriber = get_subscriber()
+    metrics = subscriber.get_metrics() if subscriber is not None else None
+    return JsonResponse({'running': is_subscriber_running(), 'metrics': metrics})
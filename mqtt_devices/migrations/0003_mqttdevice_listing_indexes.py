@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:00
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mqtt_devices', '0002_remove_mqttdevice_is_paused'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mqttdevice',
+            index=models.Index(fields=['is_active', 'id'], name='mqtt_active_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mqttdevice',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='mqtt_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mqttdevice',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('location'), name='text_pattern_ops'), name='mqtt_location_prefix_idx'),
+        ),
+    ]
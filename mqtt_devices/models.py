@@ -1,4 +1,6 @@
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
@@ -12,14 +14,35 @@ class MQTTDevice(models.Model):
     mqtt_command_topic = models.CharField(max_length=255, default="mqtt_devices/{serial_number}/command")
     mqtt_status_topic = models.CharField(max_length=255, default="mqtt_devices/{serial_number}/status")
 
-    def save(self, *args, **kwargs):
-        # Auto-generate MQTT topics if using {serial_number} template
+    class Meta:
+        indexes = [
+            # Paginated listings filtered on the active state, in primary key order
+            models.Index(fields=['is_active', 'id'], name='mqtt_active_id_idx'),
+            # Case-insensitive prefix search (istartswith) on name and location
+            models.Index(OpClass(Upper('name'), name='text_pattern_ops'), name='mqtt_name_prefix_idx'),
+            models.Index(OpClass(Upper('location'), name='text_pattern_ops'), name='mqtt_location_prefix_idx'),
+        ]
+
+    def fill_topics(self):
+        """
+        Auto-generate MQTT topics if using {serial_number} template.
+        """
         if "{serial_number}" in self.mqtt_command_topic:
             self.mqtt_command_topic = f"mqtt_devices/{self.serial_number}/command"
 
         if "{serial_number}" in self.mqtt_status_topic:
             self.mqtt_status_topic = f"mqtt_devices/{self.serial_number}/status"
 
+    @classmethod
+    def fill_topics_bulk(cls, devices):
+        """
+        Generate the topics of devices written with bulk_create/bulk_update, which skip save().
+        """
+        for device in devices:
+            device.fill_topics()
+
+    def save(self, *args, **kwargs):
+        self.fill_topics()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -7,3 +7,12 @@ class MQTTDeviceSerializer(serializers.ModelSerializer):
     class Meta:
         model = MQTTDevice
         fields = '__all__'
+
+
+class MQTTDeviceImportSerializer(MQTTDeviceSerializer):
+    """
+    Validates a row of a bulk device import. Serial number uniqueness is checked by the
+    importer for a whole batch at once instead of by a query per row.
+    """
+    class Meta(MQTTDeviceSerializer.Meta):
+        extra_kwargs = {'serial_number': {'validators': []}}
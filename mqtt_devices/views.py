@@ -1,9 +1,44 @@
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from IoT_system.renderers import ValuesListMixin
+from IoT_system.pagination import DEVICE_FILTER_BACKENDS, DeviceCursorPagination
+from IoT_system.provisioning import PROVISION_BATCH_SIZE, DeviceImporter, ProvisioningError, request_lines, \
+    import_devices
 from .models import MQTTDevice
-from .serializers import MQTTDeviceSerializer
+from .serializers import MQTTDeviceSerializer, MQTTDeviceImportSerializer
 
 
-class MQTTDeviceViewSet(viewsets.ModelViewSet):
-    """ViewSet for performing CRUD operations on device metadata."""
+def device_importer(upsert=False, batch_size=PROVISION_BATCH_SIZE):
+    """
+    Return a bulk importer of MQTT devices (see IoT_system.provisioning), matching existing
+    devices by serial number and generating the topics of each batch at once.
+    """
+    return DeviceImporter(MQTTDeviceImportSerializer, ("serial_number",), upsert=upsert, batch_size=batch_size,
+                          prepare=MQTTDevice.fill_topics_bulk)
+
+
+class MQTTDeviceViewSet(ValuesListMixin, viewsets.ModelViewSet):
+    """
+    ViewSet for performing CRUD operations on device metadata; list is served from QuerySet.values(),
+    cursor-paginated and filtered on is_active and a name or location prefix (see IoT_system.pagination).
+    """
     queryset = MQTTDevice.objects.all()
-    serializer_class = MQTTDeviceSerializer
\ No newline at end of file
+    serializer_class = MQTTDeviceSerializer
+    pagination_class = DeviceCursorPagination
+    filter_backends = DEVICE_FILTER_BACKENDS
+    search_fields = ["^name", "^location"]
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        """
+        Create, or with ?upsert=true create or update, devices from a CSV (text/csv) or
+        NDJSON (application/x-ndjson) request body, matched by serial number.
+        Returns the counts of created and updated devices and the errors per row.
+        """
+        try:
+            input_format, lines = request_lines(request)
+            importer = device_importer(upsert=request.query_params.get('upsert') == 'true')
+            return Response(import_devices(lines, input_format, importer))
+        except ProvisioningError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)